@@ -0,0 +1,57 @@
+"""add_file_queue_leases
+
+Revision ID: b7c8d9e0f1a2
+Revises: eaafb16d5789
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c8d9e0f1a2'
+down_revision: Union[str, None] = 'eaafb16d5789'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # file_queue may have been created by create_all rather than a migration
+    from sqlalchemy import inspect
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if 'file_queue' not in inspector.get_table_names(schema='public'):
+        return
+
+    columns = [col['name'] for col in inspector.get_columns('file_queue', schema='public')]
+
+    if 'worker_id' not in columns:
+        op.add_column('file_queue', sa.Column('worker_id', sa.String(100), nullable=True), schema='public')
+    if 'heartbeat_at' not in columns:
+        op.add_column('file_queue', sa.Column('heartbeat_at', sa.DateTime(), nullable=True), schema='public')
+    if 'lease_expires_at' not in columns:
+        op.add_column('file_queue', sa.Column('lease_expires_at', sa.DateTime(), nullable=True), schema='public')
+    if 'attempts' not in columns:
+        op.add_column('file_queue', sa.Column('attempts', sa.Integer(), server_default='0', nullable=False), schema='public')
+
+    indexes = [idx['name'] for idx in inspector.get_indexes('file_queue', schema='public')]
+    if 'ix_file_queue_pending_created_at' not in indexes:
+        # Partial index: claiming only ever looks at pending rows
+        op.create_index(
+            'ix_file_queue_pending_created_at',
+            'file_queue',
+            ['created_at', 'id'],
+            schema='public',
+            postgresql_where=sa.text("status = 'pending'")
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_file_queue_pending_created_at', table_name='file_queue', schema='public')
+    op.drop_column('file_queue', 'attempts', schema='public')
+    op.drop_column('file_queue', 'lease_expires_at', schema='public')
+    op.drop_column('file_queue', 'heartbeat_at', schema='public')
+    op.drop_column('file_queue', 'worker_id', schema='public')
@@ -0,0 +1,56 @@
+"""add_file_queue_scheduling
+
+Revision ID: c3d4e5f6a7b8
+Revises: b7c8d9e0f1a2
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d4e5f6a7b8'
+down_revision: Union[str, None] = 'b7c8d9e0f1a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # file_queue may have been created by create_all rather than a migration
+    from sqlalchemy import inspect
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if 'file_queue' not in inspector.get_table_names(schema='public'):
+        return
+
+    columns = [col['name'] for col in inspector.get_columns('file_queue', schema='public')]
+
+    if 'priority' not in columns:
+        op.add_column('file_queue', sa.Column('priority', sa.Integer(), server_default='0', nullable=False), schema='public')
+    if 'client_key' not in columns:
+        op.add_column('file_queue', sa.Column('client_key', sa.String(100), nullable=True), schema='public')
+    if 'page_count' not in columns:
+        op.add_column('file_queue', sa.Column('page_count', sa.Integer(), nullable=True), schema='public')
+
+    indexes = [idx['name'] for idx in inspector.get_indexes('file_queue', schema='public')]
+    if 'ix_public_file_queue_client_key' not in indexes:
+        op.create_index('ix_public_file_queue_client_key', 'file_queue', ['client_key'], schema='public')
+    if 'ix_file_queue_pending_priority' not in indexes:
+        op.create_index(
+            'ix_file_queue_pending_priority',
+            'file_queue',
+            ['priority', 'created_at'],
+            schema='public',
+            postgresql_where=sa.text("status = 'pending'")
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_file_queue_pending_priority', table_name='file_queue', schema='public')
+    op.drop_index('ix_public_file_queue_client_key', table_name='file_queue', schema='public')
+    op.drop_column('file_queue', 'page_count', schema='public')
+    op.drop_column('file_queue', 'client_key', schema='public')
+    op.drop_column('file_queue', 'priority', schema='public')
@@ -0,0 +1,36 @@
+"""add_file_queue_started_at_index
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e5f6a7b8c9'
+down_revision: Union[str, None] = 'c3d4e5f6a7b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # file_queue may have been created by create_all rather than a migration
+    from sqlalchemy import inspect
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if 'file_queue' not in inspector.get_table_names(schema='public'):
+        return
+
+    # Every claim sums the cost of files started in the fair-share window
+    indexes = [idx['name'] for idx in inspector.get_indexes('file_queue', schema='public')]
+    if 'ix_file_queue_started_at' not in indexes:
+        op.create_index('ix_file_queue_started_at', 'file_queue', ['started_at'], schema='public')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_file_queue_started_at', table_name='file_queue', schema='public')
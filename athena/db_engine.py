@@ -0,0 +1,162 @@
+"""
+Process-wide SQLAlchemy engines for Athena
+
+Engines are created once per (URL, search_path, timeout) and reused by every
+Athena module, so a question checks a connection out of a warm pool instead of
+building an engine, resolving the dialect and opening a new TCP/TLS connection
+for each query. Connections are pre-pinged and recycled, and the pools report
+checkout metrics through get_pool_stats().
+
+Question answering uses get_engine(): connections get the nexbridge search_path
+and a server-side statement timeout at connect time. Loaders that create or
+replace tables (fund_processor, embed_from_db) use get_etl_engine(), which
+keeps the server's default search_path and has no statement timeout, so their
+unqualified DDL never lands in nexbridge.
+"""
+
+import os
+import time
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+DEFAULT_SEARCH_PATH = "nexbridge, public"
+
+POOL_SIZE = int(os.getenv("ATHENA_DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("ATHENA_DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = int(os.getenv("ATHENA_DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("ATHENA_DB_POOL_RECYCLE", "1800"))
+STATEMENT_TIMEOUT_MS = int(os.getenv("ATHENA_DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+
+def pg_connection_string() -> str:
+    host = os.getenv("DB_HOST")
+    port = os.getenv("DB_PORT")
+    db = os.getenv("DB_NAME")
+    user = os.getenv("DB_USER")
+    password = os.getenv("DB_PASSWORD")
+    return f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db}"
+
+
+class _PoolMetrics:
+    """Counters fed by pool events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {"connects": self.connects, "checkouts": self.checkouts,
+                    "checkins": self.checkins, "invalidations": self.invalidations}
+
+
+_EngineKey = Tuple[str, Optional[str], Optional[int]]
+
+
+class EngineRegistry:
+    """One pooled engine per (URL, search_path, statement timeout)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines: Dict[_EngineKey, Engine] = {}
+        self._metrics: Dict[_EngineKey, _PoolMetrics] = {}
+        self._created_at: Dict[_EngineKey, float] = {}
+
+    def get_engine(self, url: Optional[str] = None, search_path: Optional[str] = DEFAULT_SEARCH_PATH,
+                   statement_timeout_ms: Optional[int] = STATEMENT_TIMEOUT_MS) -> Engine:
+        key = (url or pg_connection_string(), search_path, statement_timeout_ms)
+        engine = self._engines.get(key)
+        if engine is not None:
+            return engine
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is None:
+                engine = self._create_engine(*key)
+                self._engines[key] = engine
+        return engine
+
+    def _create_engine(self, url: str, search_path: Optional[str], statement_timeout_ms: Optional[int]) -> Engine:
+        options = []
+        if statement_timeout_ms:
+            options.append(f"-c statement_timeout={statement_timeout_ms}")
+        if search_path:
+            # set at connect time, so queries don't need a SET search_path round trip
+            options.append(f"-c search_path={search_path.replace(' ', '')}")
+        engine = create_engine(
+            url,
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            pool_recycle=POOL_RECYCLE,
+            pool_pre_ping=True,
+            connect_args={"options": " ".join(options)} if options else {},
+        )
+        metrics = _PoolMetrics()
+        event.listen(engine, "connect", lambda *args: metrics.incr("connects"))
+        event.listen(engine, "checkout", lambda *args: metrics.incr("checkouts"))
+        event.listen(engine, "checkin", lambda *args: metrics.incr("checkins"))
+        event.listen(engine, "invalidate", lambda *args: metrics.incr("invalidations"))
+        self._metrics[(url, search_path, statement_timeout_ms)] = metrics
+        self._created_at[(url, search_path, statement_timeout_ms)] = time.time()
+        return engine
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Per-engine pool state and counters (URLs without passwords)"""
+        with self._lock:
+            items = list(self._engines.items())
+        stats = {}
+        for key, engine in items:
+            pool = engine.pool
+            stats[f"{engine.url.render_as_string(hide_password=True)} [search_path={key[1]}, statement_timeout={key[2]}]"] = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "uptime_seconds": round(time.time() - self._created_at[key], 1),
+                **self._metrics[key].as_dict(),
+            }
+        return stats
+
+    def dispose_all(self):
+        """Close every pooled connection (e.g. after a fork or on shutdown)"""
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+            self._metrics.clear()
+            self._created_at.clear()
+
+
+# Global instance
+_global_engine_registry = None
+_global_engine_registry_lock = threading.Lock()
+
+
+def get_engine_registry() -> EngineRegistry:
+    """Get global engine registry instance"""
+    global _global_engine_registry
+    if _global_engine_registry is None:
+        with _global_engine_registry_lock:
+            if _global_engine_registry is None:
+                _global_engine_registry = EngineRegistry()
+    return _global_engine_registry
+
+
+def get_engine(url: Optional[str] = None, search_path: str = DEFAULT_SEARCH_PATH) -> Engine:
+    """Shared engine for Athena queries (DB_* environment variables by default)"""
+    return get_engine_registry().get_engine(url, search_path)
+
+
+def get_etl_engine(url: Optional[str] = None) -> Engine:
+    """Shared engine for bulk loads: default search_path, no statement timeout"""
+    return get_engine_registry().get_engine(url, search_path=None, statement_timeout_ms=None)
@@ -2,21 +2,18 @@ from typing import List, Dict, Optional
 import os
 import json
 from pathlib import Path
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import text
 from .query_cache import get_query_cache
+from .db_engine import get_engine
+from .schema_catalog import get_schema_catalog
 
-
-def _pg_connection_string() -> str:
-    host = os.getenv("DB_HOST")
-    port = os.getenv("DB_PORT")
-    db = os.getenv("DB_NAME")
-    user = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
-    return f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db}"
+# Result caching is opt-in: cached rows would hide data loaded after the first answer
+QUERY_CACHE_ENABLED = os.getenv("ATHENA_QUERY_CACHE", "0") in ("1", "true", "True")
 
 
 def _get_engine():
-    return create_engine(_pg_connection_string(), pool_pre_ping=True)
+    # Shared pooled engine; search_path (nexbridge, public) is set when a connection is opened
+    return get_engine()
 
 
 def _load_table_catalog() -> Dict:
@@ -33,7 +30,7 @@ def _load_table_catalog() -> Dict:
 def execute_query(query: str, use_cache: bool = True) -> List[Dict]:
     """Execute a SQL query and return results with optional caching"""
     try:
-        use_cache = False
+        use_cache = use_cache and QUERY_CACHE_ENABLED
         # Check cache first if enabled
         if use_cache:
             cache = get_query_cache()
@@ -45,10 +42,6 @@ def execute_query(query: str, use_cache: bool = True) -> List[Dict]:
         # Execute query
         engine = _get_engine()
         with engine.connect() as conn:
-            try:
-                conn.execute(text("SET search_path TO nexbridge, public"))
-            except Exception:
-                pass
             result = conn.execute(text(query))
             rows = [dict(row._mapping) for row in result]
             
@@ -68,19 +61,19 @@ def get_schema_info() -> Dict:
     and query patterns from both database and catalog
     """
     try:
-        engine = _get_engine()
-        insp = inspect(engine)
+        schema_catalog = get_schema_catalog()
         schema_info: Dict[str, Dict] = {}
         catalog = _load_table_catalog()
 
         # Only whitelist important tables by schema
         target_tables: List[str] = []
         try:
-            nexbridge_tables = insp.get_table_names(schema="nexbridge")
-            public_tables = insp.get_table_names(schema="public")
+            nexbridge_tables = schema_catalog.get_tables("nexbridge")
+            public_tables = schema_catalog.get_tables("public")
         except Exception:
-            nexbridge_tables = []
-            public_tables = []
+            nexbridge_tables = {}
+            public_tables = {}
+        tables_by_schema = {"nexbridge": nexbridge_tables, "public": public_tables}
 
         # Expected important tables in nexbridge schema
         important_nexbridge = {
@@ -106,15 +99,8 @@ def get_schema_info() -> Dict:
             try:
                 schema, table = qualified.split(".", 1)
                 
-                # Get column info from database
-                columns = []
-                for col in insp.get_columns(table, schema=schema):
-                    col_info = {
-                        "name": col.get("name"),
-                        "type": str(col.get("type")),
-                        "nullable": col.get("nullable", True),
-                    }
-                    columns.append(col_info)
+                # Get column info from the cached schema catalog
+                columns = [dict(col) for col in tables_by_schema[schema][table]]
                 
                 # Get catalog info for this table
                 catalog_table_info = catalog.get("tables", {}).get(qualified, {})
@@ -145,27 +131,10 @@ def get_schema_info() -> Dict:
         return {}
 
 
-def get_column_distinct_values(qualified_table: str, column_name: str, limit: int = 50) -> List[str]:
-    """Get distinct values for a column to help LLM choose correct values"""
-    try:
-        engine = _get_engine()
-        with engine.connect() as conn:
-            try:
-                conn.execute(text("SET search_path TO nexbridge, public"))
-            except Exception:
-                pass
-            
-            query = f"SELECT DISTINCT {column_name} FROM {qualified_table} WHERE {column_name} IS NOT NULL LIMIT {limit}"
-            result = conn.execute(text(query))
-            return [str(row[0]) for row in result]
-    except Exception as e:
-        print(f"Error getting distinct values for {qualified_table}.{column_name}: {str(e)}")
-        return []
-
-
 def get_enhanced_schema_info() -> Dict:
     """Get schema info enhanced with actual data statistics and distinct values"""
     schema_info = get_schema_info()
+    schema_catalog = get_schema_catalog()
     
     # For critical enum columns, add actual distinct values from database
     critical_columns = {
@@ -177,10 +146,9 @@ def get_enhanced_schema_info() -> Dict:
         if table in schema_info:
             schema_info[table]["live_distinct_values"] = {}
             for col in columns:
-                values = get_column_distinct_values(table, col, limit=20)
+                values = schema_catalog.get_distinct_values(table, col, limit=20)
                 if values:
                     schema_info[table]["live_distinct_values"][col] = values
-                    print(f"Loaded {len(values)} distinct values for {table}.{col}")
     
     return schema_info
 
@@ -189,21 +157,18 @@ def get_latest_dates() -> str:
     """Get latest available dates across tables with better formatting"""
     try:
         engine = _get_engine()
-        insp = inspect(engine)
+        schema_catalog = get_schema_catalog()
         latest_date_info = "Latest available dates across tables:\n\n"
         with engine.connect() as conn:
-            try:
-                conn.execute(text("SET search_path TO nexbridge, public"))
-            except Exception:
-                pass
 
             # Build list of qualified tables like in get_schema_info
             try:
-                nexbridge_tables = insp.get_table_names(schema="nexbridge")
-                public_tables = insp.get_table_names(schema="public")
+                nexbridge_tables = schema_catalog.get_tables("nexbridge")
+                public_tables = schema_catalog.get_tables("public")
             except Exception:
-                nexbridge_tables = []
-                public_tables = []
+                nexbridge_tables = {}
+                public_tables = {}
+            tables_by_schema = {"nexbridge": nexbridge_tables, "public": public_tables}
 
             important_nexbridge = {
                 "nav_pack",
@@ -249,7 +214,7 @@ def get_latest_dates() -> str:
                     continue  # Already handled
                 try:
                     schema, table = qualified.split(".", 1)
-                    for col in insp.get_columns(table, schema=schema):
+                    for col in tables_by_schema[schema][table]:
                         col_name = col.get("name", "")
                         if any(t in col_name.lower() for t in ["date", "time", "month", "year"]):
                             try:
@@ -285,10 +250,6 @@ def get_source_id_from_name(fund_name: str) -> Optional[int]:
     try:
         engine = _get_engine()
         with engine.connect() as conn:
-            try:
-                conn.execute(text("SET search_path TO nexbridge, public"))
-            except Exception:
-                pass
             
             # First, try to get source.id from source table by name
             try:
@@ -338,10 +299,6 @@ def get_available_funds() -> List[Dict]:
     try:
         engine = _get_engine()
         with engine.connect() as conn:
-            try:
-                conn.execute(text("SET search_path TO nexbridge, public"))
-            except Exception:
-                pass
             
             # Get funds with data from nav_pack
             query = text("""
@@ -3,17 +3,18 @@ from pathlib import Path
 from typing import Dict, List, Optional
 
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from dotenv import load_dotenv
 
 from .vector_store import store_fund_embeddings, _pg_connection_string
+from .db_engine import get_etl_engine
 
 
 load_dotenv(override=True)
 
 
 def _get_engine():
-    return create_engine(_pg_connection_string(), pool_pre_ping=True)
+    return get_etl_engine(_pg_connection_string())
 
 
 def _load_catalog_tables() -> List[str]:
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def _normalize_text(text: str) -> str:
+    # Same normalization as the query result cache: case and whitespace don't matter
+    return " ".join(text.lower().split())
+
+
+class DeterministicEmbeddings:
+    """
+    Local embedding model for offline runs and tests
+
+    Feature hashing of word unigrams and bigrams into a fixed-size, L2-normalized
+    vector: no network, identical output for identical text, and texts sharing
+    words end up close to each other.
+    """
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+        self.model = f"local-hash-{dimensions}"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        tokens = re.findall(r"\w+", text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            digest = hashlib.md5(feature.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU of query embeddings in memory, backed by one file per entry on disk
+
+    Keys are the model name plus the normalized query text.
+    """
+
+    def __init__(self, cache_dir: str = "data/embedding_cache", max_memory_entries: int = 1024, max_file_entries: int = 10000,
+                 cleanup_interval: int = 100):
+        """
+        Initialize query embedding cache
+
+        Args:
+            cache_dir: Directory to store cache files
+            max_memory_entries: Embeddings kept in memory (least recently used are evicted)
+            max_file_entries: Embeddings kept on disk (oldest are removed on startup and every cleanup_interval writes)
+            cleanup_interval: Number of set() calls between two trims of the disk cache
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_memory_entries = max_memory_entries
+        self.max_file_entries = max_file_entries
+        self.cleanup_interval = cleanup_interval
+        self._writes_since_cleanup = 0
+        self.memory_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._cleanup_old_cache()
+
+    def _get_cache_key(self, model: str, text: str) -> str:
+        return hashlib.md5(f"{model}\n{_normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _get_cache_file(self, cache_key: str) -> Path:
+        return self.cache_dir / f"{cache_key}.json"
+
+    def _cleanup_old_cache(self):
+        """Keep only the newest max_file_entries files"""
+        try:
+            cache_files = sorted(self.cache_dir.glob("*.json"), key=lambda f: f.stat().st_mtime)
+            for cache_file in cache_files[:max(0, len(cache_files) - self.max_file_entries)]:
+                cache_file.unlink(missing_ok=True)
+        except Exception:
+            pass
+
+    def _remember(self, cache_key: str, vector: List[float]):
+        with self._lock:
+            self.memory_cache[cache_key] = vector
+            self.memory_cache.move_to_end(cache_key)
+            while len(self.memory_cache) > self.max_memory_entries:
+                self.memory_cache.popitem(last=False)
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        cache_key = self._get_cache_key(model, text)
+        with self._lock:
+            vector = self.memory_cache.get(cache_key)
+            if vector is not None:
+                self.memory_cache.move_to_end(cache_key)
+                self.hits += 1
+                return vector
+
+        cache_file = self._get_cache_file(cache_key)
+        if cache_file.exists():
+            try:
+                with open(cache_file, "r") as f:
+                    vector = json.load(f)["embedding"]
+                self._remember(cache_key, vector)
+                with self._lock:
+                    self.hits += 1
+                return vector
+            except Exception:
+                # Corrupted cache file, remove it
+                cache_file.unlink(missing_ok=True)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, model: str, text: str, vector: List[float]):
+        cache_key = self._get_cache_key(model, text)
+        self._remember(cache_key, vector)
+        cache_file = self._get_cache_file(cache_key)
+        # Write to a private temp name and rename, so a concurrent get() never reads a partial file
+        tmp_file = cache_file.with_name(f"{cache_file.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+        try:
+            with open(tmp_file, "w") as f:
+                json.dump({"model": model, "text": _normalize_text(text), "embedding": vector}, f)
+            os.replace(tmp_file, cache_file)
+        except Exception:
+            # If file write fails, just continue with memory cache
+            tmp_file.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            self._writes_since_cleanup += 1
+            cleanup = self._writes_since_cleanup >= self.cleanup_interval
+            if cleanup:
+                self._writes_since_cleanup = 0
+        if cleanup:
+            self._cleanup_old_cache()
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        """Get cache statistics"""
+        with self._lock:
+            return {
+                "memory_entries": len(self.memory_cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "max_memory_entries": self.max_memory_entries,
+            }
+
+
+class CachedQueryEmbeddings:
+    """Embeddings wrapper that answers embed_query from the query embedding cache"""
+
+    def __init__(self, embeddings: Any, cache: QueryEmbeddingCache, model: Optional[str] = None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model or getattr(embeddings, "model", "embeddings")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(self.model, text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.set(self.model, text, vector)
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(self.model, text)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self.cache.set(self.model, text, vector)
+        return vector
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+
+# Global cache instance
+_query_embedding_cache: Optional[QueryEmbeddingCache] = None
+_query_embedding_cache_lock = threading.Lock()
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    """Get or create the global query embedding cache instance"""
+    global _query_embedding_cache
+    if _query_embedding_cache is None:
+        with _query_embedding_cache_lock:
+            if _query_embedding_cache is None:
+                max_entries = int(os.getenv("ATHENA_EMBEDDING_CACHE_SIZE", "1024"))
+                _query_embedding_cache = QueryEmbeddingCache(max_memory_entries=max_entries)
+    return _query_embedding_cache
@@ -2,24 +2,17 @@ import os
 from pathlib import Path
 from typing import Dict
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 
 from .vector_store import store_fund_embeddings
+from .db_engine import get_etl_engine
 
 DATA_DIR = Path("data/validusDemo/l1")
 
 
-def _pg_connection_string() -> str:
-    host = os.getenv("DB_HOST")
-    port = os.getenv("DB_PORT")
-    db = os.getenv("DB_NAME")
-    user = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
-    return f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db}"
-
-
 def _get_engine():
-    return create_engine(_pg_connection_string(), pool_pre_ping=True)
+    # Unqualified DDL below must resolve against the default search_path, not nexbridge
+    return get_etl_engine()
 
 
 def get_data() -> Dict[str, pd.DataFrame]:
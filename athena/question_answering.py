@@ -3,6 +3,7 @@ import os
 import json
 
 from openai import AsyncOpenAI
+from utils.llm_governor import get_llm_governor, estimate_tokens, INTERACTIVE
 
 from typing import Dict, List, Optional, Any
 
@@ -1699,20 +1700,26 @@ If previous attempts had errors, analyze the error and generate a corrected quer
 
         # Get response from OpenAI
 
-        completion = await client.chat.completions.create(
-            model=OPENAI_MODEL_NAME,
-            seed=42,
-            temperature=0,
-            response_format={"type": "json_object"},
-            messages=[{
-                "role":
-                "system",
-                "content":
-                "You are an expert PostgreSQL database specialist. You generate accurate, executable SQL queries for financial fund data. You always use correct column names, proper table joins, and handle edge cases like NULL values. When you see an error from a previous attempt, you analyze it carefully and generate a corrected query."
-            }, {
-                "role": "user",
-                "content": prompt
-            }])
+        messages = [{
+            "role":
+            "system",
+            "content":
+            "You are an expert PostgreSQL database specialist. You generate accurate, executable SQL queries for financial fund data. You always use correct column names, proper table joins, and handle edge cases like NULL values. When you see an error from a previous attempt, you analyze it carefully and generate a corrected query."
+        }, {
+            "role": "user",
+            "content": prompt
+        }]
+
+        # Interactive lane: admitted ahead of batch extraction sharing the model budget
+        async with get_llm_governor().reserve_async(
+                OPENAI_MODEL_NAME, estimate_tokens(messages), priority=INTERACTIVE) as reservation:
+            completion = await client.chat.completions.create(
+                model=OPENAI_MODEL_NAME,
+                seed=42,
+                temperature=0,
+                response_format={"type": "json_object"},
+                messages=messages)
+            reservation.reconcile(completion.usage.total_tokens if completion.usage else None)
 
         # Get token usage information
 
@@ -0,0 +1,290 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from .db_engine import get_engine
+
+
+# One query that changes whenever a column of the schema is added, dropped or retyped
+# (structure) or when ANALYZE/autovacuum moves the row-count estimates (rows)
+_FINGERPRINT_SQL = text("""
+    SELECT
+        (SELECT md5(coalesce(string_agg(concat_ws(':', table_name, column_name, data_type,
+                                                  character_maximum_length, numeric_precision,
+                                                  numeric_scale, is_nullable),
+                                        ',' ORDER BY table_name, ordinal_position), ''))
+           FROM information_schema.columns
+          WHERE table_schema = :schema) AS structure_fingerprint,
+        (SELECT md5(coalesce(string_agg(c.relname || ':' || c.reltuples::bigint, ',' ORDER BY c.relname), ''))
+           FROM pg_class c
+           JOIN pg_namespace n ON n.oid = c.relnamespace
+          WHERE n.nspname = :schema AND c.relkind IN ('r', 'p', 'm')) AS rows_fingerprint
+""")
+
+_COLUMNS_SQL = text("""
+    SELECT table_name, column_name, data_type, character_maximum_length,
+           numeric_precision, numeric_scale, is_nullable, udt_name
+      FROM information_schema.columns
+     WHERE table_schema = :schema
+     ORDER BY table_name, ordinal_position
+""")
+
+
+# information_schema spellings that SQLAlchemy's reflected types print differently
+_SQLALCHEMY_TYPE_NAMES = {
+    "character varying": "VARCHAR",
+    "character": "CHAR",
+    "timestamp without time zone": "TIMESTAMP",
+    "timestamp with time zone": "TIMESTAMP",
+    "time without time zone": "TIME",
+    "time with time zone": "TIME",
+    "bit varying": "BIT VARYING",
+}
+
+
+def _format_type(data_type: str, max_length, precision, scale, udt_name: str) -> str:
+    """Column type as str() of the SQLAlchemy reflected type prints it (what the SQL prompts have always shown)"""
+    if data_type == "ARRAY":
+        return f"{udt_name.lstrip('_').upper()}[]"
+    if data_type == "USER-DEFINED":
+        return udt_name.upper()
+    name = _SQLALCHEMY_TYPE_NAMES.get(data_type, data_type.upper())
+    if max_length is not None:
+        return f"{name}({max_length})"
+    if data_type == "numeric" and precision is not None:
+        return f"NUMERIC({precision}, {scale or 0})"
+    return name
+
+
+class SchemaCatalog:
+    """
+    Cached column catalog and distinct-value samples per database schema
+
+    Entries live in memory and on disk and are checked against a fingerprint of
+    the schema at most once per check interval: a structure change rebuilds the
+    columns (one information_schema query instead of per-table reflection), a
+    change in row estimates only refreshes the samples in a background thread.
+    DDL issued by the application invalidates the entry right away.
+    """
+
+    def __init__(self, cache_dir: str = "data/schema_catalog", check_interval: int = 60):
+        """
+        Initialize schema catalog
+
+        Args:
+            cache_dir: Directory to store catalog files
+            check_interval: Seconds between fingerprint checks of a schema
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.check_interval = check_interval
+        self._entries: Dict[str, Dict] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._schema_locks: Dict[str, threading.Lock] = {}
+        self._refreshing = set()
+
+    def _get_catalog_file(self, schema: str) -> Path:
+        return self.cache_dir / f"{schema}.json"
+
+    def _get_schema_lock(self, schema: str) -> threading.Lock:
+        with self._lock:
+            return self._schema_locks.setdefault(schema, threading.Lock())
+
+    def _load(self, schema: str) -> Optional[Dict]:
+        catalog_file = self._get_catalog_file(schema)
+        if not catalog_file.exists():
+            return None
+        try:
+            with open(catalog_file, "r") as f:
+                return json.load(f)
+        except Exception:
+            # Corrupted catalog file, rebuild it
+            return None
+
+    def _save(self, schema: str, entry: Dict):
+        catalog_file = self._get_catalog_file(schema)
+        tmp_file = catalog_file.with_suffix(f".tmp-{os.getpid()}-{threading.get_ident()}")
+        try:
+            with open(tmp_file, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_file, catalog_file)
+        except Exception as e:
+            # If file write fails, just continue with memory catalog
+            print(f"Error saving schema catalog for {schema}: {str(e)}")
+            if tmp_file.exists():
+                tmp_file.unlink()
+
+    def _build_tables(self, schema: str) -> Dict[str, List[Dict]]:
+        tables: Dict[str, List[Dict]] = {}
+        with get_engine().connect() as conn:
+            for row in conn.execute(_COLUMNS_SQL, {"schema": schema}):
+                tables.setdefault(row[0], []).append({
+                    "name": row[1],
+                    "type": _format_type(row[2], row[3], row[4], row[5], row[7]),
+                    "nullable": row[6] == "YES",
+                })
+        return tables
+
+    def _get_entry(self, schema: str) -> Dict:
+        entry = self._entries.get(schema)
+        if entry is not None and time.time() - self._checked_at.get(schema, 0) < self.check_interval:
+            return entry
+
+        with self._get_schema_lock(schema):
+            entry = self._entries.get(schema)
+            if entry is not None and time.time() - self._checked_at.get(schema, 0) < self.check_interval:
+                return entry
+            if entry is None:
+                entry = self._load(schema)
+
+            try:
+                with get_engine().connect() as conn:
+                    row = conn.execute(_FINGERPRINT_SQL, {"schema": schema}).fetchone()
+                structure_fingerprint, rows_fingerprint = row[0], row[1]
+            except Exception as e:
+                print(f"Error fingerprinting schema {schema}: {str(e)}")
+                if entry is None:
+                    raise
+                # Keep serving what we have; retry after the next interval
+                self._entries[schema] = entry
+                self._checked_at[schema] = time.time()
+                return entry
+
+            changed = False
+            if entry is None or entry.get("structure_fingerprint") != structure_fingerprint:
+                previous = entry or {}
+                entry = {
+                    "structure_fingerprint": structure_fingerprint,
+                    "rows_fingerprint": previous.get("rows_fingerprint"),
+                    "tables": self._build_tables(schema),
+                    "samples": previous.get("samples", {}),
+                    "built_at": time.time(),
+                }
+                changed = True
+                print(f"Rebuilt schema catalog for {schema} ({len(entry['tables'])} tables)")
+            if entry.get("rows_fingerprint") != rows_fingerprint:
+                entry["rows_fingerprint"] = rows_fingerprint
+                changed = True
+                self._refresh_samples_in_background(schema, entry)
+
+            self._entries[schema] = entry
+            self._checked_at[schema] = time.time()
+            if changed:
+                self._save(schema, entry)
+            return entry
+
+    def get_tables(self, schema: str) -> Dict[str, List[Dict]]:
+        """Columns ({name, type, nullable}) of every table and view in the schema"""
+        return self._get_entry(schema)["tables"]
+
+    def get_distinct_values(self, qualified_table: str, column_name: str, limit: int = 50) -> List[str]:
+        """
+        Sample distinct values of a column
+
+        Sampled synchronously the first time a column is asked for, afterwards
+        served from the catalog and refreshed in the background when the
+        schema's row estimates change.
+        """
+        schema = qualified_table.split(".", 1)[0]
+        entry = self._get_entry(schema)
+        key = f"{qualified_table}.{column_name}:{limit}"
+        values = entry["samples"].get(key)
+        if values is None:
+            values = _fetch_distinct_values(qualified_table, column_name, limit)
+            if values:
+                self._merge_samples(schema, entry, {key: values})
+        return values
+
+    def _merge_samples(self, schema: str, entry: Dict, samples: Dict[str, List[str]]):
+        """
+        Swap in a new samples dict under the schema lock
+
+        Readers never see a dict being changed (they hold the old or the new
+        one), and the file is written by one thread at a time.
+        """
+        with self._get_schema_lock(schema):
+            # The entry may have been rebuilt since the samples were fetched
+            entry = self._entries.get(schema, entry)
+            entry["samples"] = {**entry["samples"], **samples}
+            self._save(schema, entry)
+
+    def _refresh_samples_in_background(self, schema: str, entry: Dict):
+        with self._lock:
+            if schema in self._refreshing:
+                return
+            self._refreshing.add(schema)
+        threading.Thread(target=self._refresh_samples, args=(schema, entry), daemon=True).start()
+
+    def _refresh_samples(self, schema: str, entry: Dict):
+        try:
+            samples = {}
+            for key in list(entry["samples"]):
+                column_ref, limit = key.rsplit(":", 1)
+                qualified_table, column_name = column_ref.rsplit(".", 1)
+                samples[key] = _fetch_distinct_values(qualified_table, column_name, int(limit))
+            self._merge_samples(schema, entry, samples)
+        except Exception as e:
+            print(f"Error refreshing value samples for {schema}: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(schema)
+
+    def invalidate(self, schema: str):
+        """Force a rebuild of the schema's columns on next use (call after DDL)"""
+        with self._get_schema_lock(schema):
+            entry = self._entries.get(schema) or self._load(schema)
+            self._checked_at.pop(schema, None)
+            if entry is not None:
+                # Keep the samples, they are refreshed once the rebuild sees new row estimates
+                entry["structure_fingerprint"] = None
+                entry["rows_fingerprint"] = None
+                self._entries[schema] = entry
+                self._save(schema, entry)
+
+    def get_catalog_stats(self) -> Dict[str, Dict]:
+        """Get catalog statistics"""
+        return {
+            schema: {
+                "tables": len(entry["tables"]),
+                "samples": len(entry["samples"]),
+                "built_at": entry.get("built_at"),
+                "checked_at": self._checked_at.get(schema),
+            }
+            for schema, entry in list(self._entries.items())
+        }
+
+
+def _fetch_distinct_values(qualified_table: str, column_name: str, limit: int) -> List[str]:
+    try:
+        with get_engine().connect() as conn:
+            query = f"SELECT DISTINCT {column_name} FROM {qualified_table} WHERE {column_name} IS NOT NULL LIMIT {limit}"
+            return [str(row[0]) for row in conn.execute(text(query))]
+    except Exception as e:
+        print(f"Error getting distinct values for {qualified_table}.{column_name}: {str(e)}")
+        return []
+
+
+# Global catalog instance
+_schema_catalog: Optional[SchemaCatalog] = None
+_schema_catalog_lock = threading.Lock()
+
+def get_schema_catalog() -> SchemaCatalog:
+    """Get or create the global schema catalog instance"""
+    global _schema_catalog
+    if _schema_catalog is None:
+        with _schema_catalog_lock:
+            if _schema_catalog is None:
+                check_interval = int(os.getenv("ATHENA_SCHEMA_CHECK_INTERVAL", "60"))
+                _schema_catalog = SchemaCatalog(check_interval=check_interval)
+    return _schema_catalog
+
+
+def invalidate_schema_catalog(schema: str):
+    """DDL hook: the next Athena question re-reads this schema's columns"""
+    get_schema_catalog().invalidate(schema)
@@ -0,0 +1,50 @@
+"""
+Query embedding cache tests: disk trimming and atomic cache files
+
+Usage:
+    python -m pytest athena/test/test_embeddings.py
+"""
+
+from athena import embeddings
+from athena.embeddings import QueryEmbeddingCache
+
+
+def _files(cache_dir):
+    return sorted(path.name for path in cache_dir.iterdir())
+
+
+def test_disk_cache_is_trimmed_every_cleanup_interval_writes(tmp_path):
+    cache = QueryEmbeddingCache(cache_dir=str(tmp_path), max_file_entries=3, cleanup_interval=5)
+
+    for i in range(4):
+        cache.set("model", f"query {i}", [float(i)])
+    # Below the interval nothing is trimmed yet
+    assert len(_files(tmp_path)) == 4
+
+    cache.set("model", "query 4", [4.0])
+
+    assert len(_files(tmp_path)) == 3
+
+
+def test_set_leaves_only_complete_cache_files(tmp_path):
+    cache = QueryEmbeddingCache(cache_dir=str(tmp_path))
+    cache.set("model", "What is the NAV?", [0.5, 0.25])
+
+    [name] = _files(tmp_path)
+    assert name.endswith(".json")
+    # A fresh cache (empty memory) reads the vector back from disk, whatever the spacing and case
+    assert QueryEmbeddingCache(cache_dir=str(tmp_path)).get("model", "what is  the nav?") == [0.5, 0.25]
+
+
+def test_failed_write_keeps_the_memory_entry_and_no_temp_file(tmp_path, monkeypatch):
+    cache = QueryEmbeddingCache(cache_dir=str(tmp_path))
+
+    def failing_replace(source, target):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(embeddings.os, "replace", failing_replace)
+    cache.set("model", "query", [1.0])
+    monkeypatch.undo()
+
+    assert cache.get("model", "query") == [1.0]
+    assert _files(tmp_path) == []
@@ -1,18 +1,25 @@
 from typing import Dict, Optional, List, Tuple
 import os
 import json
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
 import pandas as pd
 from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores.pgvector import PGVector
+from utils.llm_governor import GovernedEmbeddings, INTERACTIVE, BATCH
+from .embeddings import DeterministicEmbeddings, CachedQueryEmbeddings, get_query_embedding_cache
 
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-if not OPENAI_API_KEY:
+# "openai" or "local" (deterministic hashing model, no network; for offline runs and tests)
+EMBEDDING_BACKEND = os.getenv("ATHENA_EMBEDDINGS", "openai")
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+if not OPENAI_API_KEY and EMBEDDING_BACKEND != "local":
     raise ValueError(
         "OPENAI_API_KEY environment variable is not set. Please check your .env file."
     )
@@ -24,8 +31,8 @@ PG_DB = os.getenv("DB_NAME")
 PG_USER = os.getenv("DB_USER")
 PG_PASSWORD = os.getenv("DB_PASSWORD")
 
-# Vector collection name
-COLLECTION_NAME = "aithon_fund_data"
+# Vector collection name (local embeddings get their own collection, the vectors aren't comparable)
+COLLECTION_NAME = "aithon_fund_data" if EMBEDDING_BACKEND != "local" else "aithon_fund_data_local"
 
 # Representative example rows per month (not per-row embeddings)
 EXAMPLE_ROWS_PER_MONTH = 5
@@ -43,6 +50,52 @@ def _pg_connection_string() -> str:
 def _unused_removed_marker() -> None:
     return None
 
+
+def _build_embeddings(priority: int):
+    if EMBEDDING_BACKEND == "local":
+        return DeterministicEmbeddings()
+    return GovernedEmbeddings(OpenAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        api_key=OPENAI_API_KEY,
+    ), priority=priority)
+
+
+_query_embeddings = None
+_vector_stores: Dict[str, PGVector] = {}
+_vector_stores_lock = threading.Lock()
+
+
+def get_query_embeddings():
+    """Long-lived embeddings for questions, answered from the query embedding cache when possible"""
+    global _query_embeddings
+    if _query_embeddings is None:
+        with _vector_stores_lock:
+            if _query_embeddings is None:
+                _query_embeddings = CachedQueryEmbeddings(_build_embeddings(INTERACTIVE), get_query_embedding_cache())
+    return _query_embeddings
+
+
+def get_vector_store(collection_name: str = COLLECTION_NAME) -> PGVector:
+    """
+    Long-lived PGVector store per collection
+
+    Constructing one creates its engine and checks the extension, tables and
+    collection, so searches reuse a single instance (and its connection pool).
+    """
+    vectorstore = _vector_stores.get(collection_name)
+    if vectorstore is None:
+        embeddings = get_query_embeddings()
+        with _vector_stores_lock:
+            vectorstore = _vector_stores.get(collection_name)
+            if vectorstore is None:
+                vectorstore = PGVector(
+                    connection_string=_pg_connection_string(),
+                    collection_name=collection_name,
+                    embedding_function=embeddings,
+                )
+                _vector_stores[collection_name] = vectorstore
+    return vectorstore
+
 _CATALOG_CACHE: Optional[Dict] = None
 
 
@@ -212,10 +265,7 @@ def _select_representative_rows(df: pd.DataFrame, k: int) -> pd.DataFrame:
 def store_fund_embeddings(fund_name: str, fund_data: Dict[str, pd.DataFrame], force_overwrite: bool = False) -> bool:
     try:
         # Build embedding function
-        embeddings = OpenAIEmbeddings(
-            model="text-embedding-3-small",
-            api_key=OPENAI_API_KEY,
-        )
+        embeddings = _build_embeddings(BATCH)
 
         connection_string = _pg_connection_string()
 
@@ -359,16 +409,7 @@ def store_fund_embeddings(fund_name: str, fund_data: Dict[str, pd.DataFrame], fo
 
 def perform_semantic_search(query: str, top_k: int = 5, tables: Optional[List[str]] = None, month: Optional[str] = None, prefer_chunk_types: Optional[List[str]] = None) -> List[Document]:
     try:
-        embeddings = OpenAIEmbeddings(
-            model="text-embedding-3-small",
-            api_key=OPENAI_API_KEY,
-        )
-        connection_string = _pg_connection_string()
-        vectorstore = PGVector(
-            connection_string=connection_string,
-            collection_name=COLLECTION_NAME,
-            embedding_function=embeddings,
-        )
+        vectorstore = get_vector_store()
 
         # Optional metadata filter (works for equality matches)
         filter_meta: Dict[str, str] = {}
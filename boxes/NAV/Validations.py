@@ -1,6 +1,6 @@
 from storage import STORAGE
 from utils.jsonConversionHelper import getLambdaFromString
-import json
+import pandas as pd
 from datetime import datetime, timedelta # dont remove this
 import copy
 
@@ -81,7 +81,7 @@ class L1ValidationNAV():
                     "operation":"replaceOrAppendByKey",
                     "key":["processDate","fundName","sourceA","sourceB","processDateA","processDateB"]
                 },
-                "rows":json.dumps(myRows)
+                "rows":pd.DataFrame(myRows)
             },
             {
                 "dataTypeToSaveAs":"JSONDump",
@@ -3,7 +3,7 @@
 SQLAlchemy ORM Models for User, Client, and Role Management System
 """
 
-from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, UniqueConstraint, Text, text, CheckConstraint, Numeric, Date, Table, JSON
+from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, UniqueConstraint, Index, Text, text, CheckConstraint, Numeric, Date, Table, JSON
 from sqlalchemy.orm import foreign, remote, relationship
 from sqlalchemy.dialects.postgresql import BIT, UUID
 from sqlalchemy.ext.declarative import declarative_base
@@ -891,7 +891,14 @@ class Benchmark(Base):
 class FileQueue(Base):
     """File Queue model for managing file processing queue in FIFO order"""
     __tablename__ = 'file_queue'
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = (
+        # Partial index so workers claiming the oldest pending row never scan finished history
+        Index('ix_file_queue_pending_created_at', 'created_at', 'id', postgresql_where=text("status = 'pending'")),
+        Index('ix_file_queue_pending_priority', 'priority', 'created_at', postgresql_where=text("status = 'pending'")),
+        # Fair-share accounting sums the cost of files started in the recent window
+        Index('ix_file_queue_started_at', 'started_at'),
+        {'schema': 'public'}
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     filename = Column(String(255), nullable=False, index=True, comment='Name of the file')
@@ -908,6 +915,13 @@ class FileQueue(Base):
     updated_at = Column(DateTime, nullable=False, server_default=text('now()'), comment='When the record was last updated')
     started_at = Column(DateTime, nullable=True, comment='When processing started')
     completed_at = Column(DateTime, nullable=True, comment='When processing completed')
+    worker_id = Column(String(100), nullable=True, comment='Worker currently holding the processing lease')
+    heartbeat_at = Column(DateTime, nullable=True, comment='Last heartbeat from the worker holding the lease')
+    lease_expires_at = Column(DateTime, nullable=True, comment='When the processing lease expires unless renewed')
+    attempts = Column(Integer, nullable=False, server_default='0', comment='Number of times the file has been claimed')
+    priority = Column(Integer, nullable=False, server_default='0', comment='Scheduling priority (higher is served first)')
+    client_key = Column(String(100), nullable=True, index=True, comment='Client/tenant used for fair scheduling (defaults to username)')
+    page_count = Column(Integer, nullable=True, comment='Page count used as the job cost estimate')
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert FileQueue instance to dictionary"""
@@ -926,7 +940,14 @@ class FileQueue(Base):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'started_at': self.started_at.isoformat() if self.started_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
-            'error_message': self.error_message
+            'error_message': self.error_message,
+            'worker_id': self.worker_id,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'lease_expires_at': self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            'attempts': self.attempts,
+            'priority': self.priority,
+            'client_key': self.client_key,
+            'page_count': self.page_count
         }
 
 class DatabaseManager:
@@ -33,6 +33,10 @@ class XLSX(FILE):
                         flipped = {v: k for k, v in dataOperation['colsToKeep'].items()}
                         myDF=myDF.rename(columns=flipped)
                         myDF=myDF[list(flipped.values())]
+                    # Stays a JSON string on purpose: the round trip is what turns Excel date cells into
+                    # epoch-ms ints and NaT/None into nulls, which is how existing l0 tables store them.
+                    # Handing over myDF would write datetime64 columns that fail the csv format's dtype
+                    # asserts against those tables and change what l0 readers get back.
                     myDataOperation={
                         "dataTypeToSaveAs":dataOperation['dataTypeToSaveAs'],
                         "opParams":dataOperation['opParams'],
@@ -0,0 +1,432 @@
+import os
+import time
+import uuid
+import random
+import hashlib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+import utils.logger as _logger
+logger=_logger.getLogger('dev')
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+    S3_AVAILABLE=True
+except ImportError:
+    S3_AVAILABLE=False
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE=True
+except ImportError:
+    FCNTL_AVAILABLE=False
+
+# A lock older than this is considered abandoned by a crashed writer and broken
+LOCK_TTL_SECONDS=float(os.getenv('STORAGE_LOCK_TTL','300'))
+LOCK_TIMEOUT_SECONDS=float(os.getenv('STORAGE_LOCK_TIMEOUT','120'))
+
+RANGE_CHUNK_SIZE=256*1024
+
+# What an entry's path can be followed by in the names of its files: table formats (.csv,
+# .csv.migrated, .parquet/ partitions), variableDumps (.arrow, .npy, .pkl) and compressed
+# JSON artifacts (<key>.json + .zst). Anything else next to it is a different entry.
+ENTRY_FILE_SUFFIXES=('.csv','.csv.migrated','.arrow','.npy','.pkl','.zst')
+ENTRY_DIR_SUFFIXES=('.parquet',)
+
+def isEntryMember(aRest: str):
+    """True if a name equal to an entry's path followed by aRest belongs to that entry"""
+    if aRest=='' or aRest.startswith('/') or aRest in ENTRY_FILE_SUFFIXES:
+        return True
+    return any(aRest==s or aRest.startswith(s+'/') for s in ENTRY_DIR_SUFFIXES)
+
+class FileStorage():
+    """
+    Where the layer files live
+
+    STORAGE always works on local paths (getLocalFilePath). A backend decides what
+    those paths are and keeps them in sync with the system of record: reads call
+    fetch/fetchPrefix before opening a path, writes call publish/publishPrefix after
+    the local file is complete. For onPrem both are no-ops.
+
+    Prefix operations cover every file that belongs to one logical entry: the path
+    itself, its extension siblings (<path>.csv, <path>.npy, ...) and anything below
+    <path>/ (partitioned tables, table dumps).
+
+    Entries that are read, modified and written back (states, tables) must be
+    changed under lock(path), which is exclusive across every thread, process and
+    host using the same storage; otherwise concurrent writers lose updates.
+    """
+    isLocal=True
+
+    def getLayerNFolder(self,aClient: str,aLayerName: str):
+        raise NotImplementedError
+
+    def getStateFolder(self,aClient: str):
+        raise NotImplementedError
+
+    def exists(self,aLocalPath: str):
+        """True if the path exists in the backend; it is then readable at aLocalPath"""
+        raise NotImplementedError
+
+    def listDir(self,aLocalDir: str):
+        raise NotImplementedError
+
+    def fetch(self,aLocalPath: str):
+        pass
+
+    def fetchPrefix(self,aLocalPath: str):
+        pass
+
+    def publish(self,aLocalPath: str):
+        pass
+
+    def publishPrefix(self,aLocalPath: str):
+        pass
+
+    def remove(self,aLocalPath: str):
+        if os.path.exists(aLocalPath):
+            os.remove(aLocalPath)
+
+    @contextmanager
+    def lock(self,aLocalPath: str):
+        yield
+
+    def getSize(self,aLocalPath: str):
+        """Size of a file in the backend without fetching it; None if it doesn't exist"""
+        try:
+            return os.path.getsize(aLocalPath)
+        except OSError:
+            return None
+
+    def iterRange(self,aLocalPath: str,aStart: int,aEnd: int,aChunkSize: int=RANGE_CHUNK_SIZE):
+        """Bytes aStart..aEnd (inclusive) of a file, in chunks"""
+        with open(aLocalPath,'rb') as f:
+            f.seek(aStart)
+            myRemaining=aEnd-aStart+1
+            while myRemaining>0:
+                myChunk=f.read(min(aChunkSize,myRemaining))
+                if not myChunk:
+                    break
+                myRemaining-=len(myChunk)
+                yield myChunk
+
+    def readRange(self,aLocalPath: str,aStart: int,aEnd: int):
+        """Bytes aStart..aEnd (inclusive) of a file"""
+        return b''.join(self.iterRange(aLocalPath,aStart,aEnd))
+
+class OnPremFileStorage(FileStorage):
+    """Layers on the API host's disk under <repo>/data/<client>/<layer>"""
+    name='onPrem'
+
+    def __init__(self,aStorageConfig: dict):
+        self.storageConfig=aStorageConfig
+        self.localRoot=str(Path(__file__).resolve().parent/'data')
+
+    def getLayerNFolder(self,aClient: str,aLayerName: str):
+        return os.path.join(self.localRoot,aClient,aLayerName)
+
+    def getStateFolder(self,aClient: str):
+        return os.path.join('data',aClient,'states')
+
+    def exists(self,aLocalPath: str):
+        return os.path.exists(aLocalPath)
+
+    def listDir(self,aLocalDir: str):
+        return os.listdir(aLocalDir)
+
+    @contextmanager
+    def lock(self,aLocalPath: str):
+        """flock on data/_locks/<sha1 of path>.lock: exclusive across threads and worker processes on this host"""
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+        myLockDir=os.path.join(self.localRoot,'_locks')
+        os.makedirs(myLockDir,exist_ok=True)
+        myLockPath=os.path.join(myLockDir,hashlib.sha1(os.path.abspath(aLocalPath).encode('utf-8')).hexdigest()+'.lock')
+        with open(myLockPath,'a') as f:
+            fcntl.flock(f,fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f,fcntl.LOCK_UN)
+
+class S3FileStorage(FileStorage):
+    """
+    Layers in an S3-compatible bucket (AWS S3, MinIO, ...) with a local read-through cache
+
+    Object keys mirror the local layout below the cache root: <prefix><client>/<layer>/...
+    Reads download an object into the cache unless the cached copy still matches
+    the object's ETag, so workers on different hosts share layers without a shared
+    filesystem. Uploads and downloads above s3MultipartThresholdMB are split into
+    parts transferred in parallel.
+
+    Single writes are last-writer-wins per object; read-modify-write cycles take
+    lock(path), a lock object under <prefix>_locks/ created with a conditional
+    PUT (If-None-Match: *), so two stateless workers appending to the same state
+    or table serialize instead of overwriting each other. Locks older than
+    STORAGE_LOCK_TTL seconds are treated as abandoned and broken.
+    """
+    isLocal=False
+    name='s3'
+
+    def __init__(self,aStorageConfig: dict):
+        if not S3_AVAILABLE:
+            raise Exception("boto3 is required for the s3 file storage")
+        self.storageConfig=aStorageConfig
+        self.bucket=aStorageConfig.get('s3Bucket',os.getenv('STORAGE_S3_BUCKET'))
+        if not self.bucket:
+            raise Exception("s3Bucket (or STORAGE_S3_BUCKET) is required for the s3 file storage")
+        self.prefix=aStorageConfig.get('s3Prefix',os.getenv('STORAGE_S3_PREFIX',''))
+        if self.prefix and not self.prefix.endswith('/'):
+            self.prefix+='/'
+        self.localRoot=aStorageConfig.get('localCacheDir',os.getenv('STORAGE_CACHE_DIR',str(Path(__file__).resolve().parent/'data'/'_objectCache')))
+        myMaxConcurrency=int(aStorageConfig.get('s3MaxConcurrency',os.getenv('STORAGE_S3_MAX_CONCURRENCY','10')))
+        myPartSize=int(aStorageConfig.get('s3MultipartThresholdMB',os.getenv('STORAGE_S3_MULTIPART_MB','16')))*1024*1024
+        self.transferConfig=TransferConfig(multipart_threshold=myPartSize,multipart_chunksize=myPartSize,
+            max_concurrency=myMaxConcurrency,use_threads=True)
+        self.client=boto3.client('s3',
+            endpoint_url=aStorageConfig.get('s3EndpointUrl',os.getenv('STORAGE_S3_ENDPOINT_URL')),
+            region_name=aStorageConfig.get('s3Region',os.getenv('STORAGE_S3_REGION')),
+            config=BotoConfig(max_pool_connections=max(myMaxConcurrency,10),retries={'max_attempts':5,'mode':'adaptive'}))
+        # local path -> (ETag, mtime_ns, size) of the cached copy as downloaded/uploaded by this process
+        self._cached={}
+        self._cachedLock=threading.Lock()
+
+    def getLayerNFolder(self,aClient: str,aLayerName: str):
+        return os.path.join(self.localRoot,aClient,aLayerName)
+
+    def getStateFolder(self,aClient: str):
+        return os.path.join(self.localRoot,aClient,'states')
+
+    def _getKey(self,aLocalPath: str):
+        myRelPath=os.path.relpath(os.path.abspath(aLocalPath),os.path.abspath(self.localRoot))
+        if myRelPath.startswith('..'):
+            raise Exception(f"{aLocalPath} is outside the storage cache {self.localRoot}")
+        return self.prefix+myRelPath.replace(os.sep,'/')
+
+    def _getLocalPath(self,aKey: str):
+        return os.path.join(self.localRoot,*aKey[len(self.prefix):].split('/'))
+
+    def _head(self,aKey: str):
+        try:
+            return self.client.head_object(Bucket=self.bucket,Key=aKey)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404','NoSuchKey','NotFound'):
+                return None
+            raise
+
+    def _listObjects(self,aKeyPrefix: str,aDelimiter: str=None):
+        myParams={'Bucket':self.bucket,'Prefix':aKeyPrefix}
+        if aDelimiter:
+            myParams['Delimiter']=aDelimiter
+        for myPage in self.client.get_paginator('list_objects_v2').paginate(**myParams):
+            yield myPage
+
+    def _prefixObjects(self,aLocalPath: str):
+        """{key: ETag} of every object belonging to aLocalPath (itself, its format siblings, children)"""
+        myKey=self._getKey(aLocalPath)
+        myObjects={}
+        for myPage in self._listObjects(myKey):
+            for myObject in myPage.get('Contents',[]):
+                if isEntryMember(myObject['Key'][len(myKey):]):
+                    myObjects[myObject['Key']]=myObject['ETag']
+        return myObjects
+
+    def _isCached(self,aLocalPath: str,aETag: str):
+        with self._cachedLock:
+            myEntry=self._cached.get(aLocalPath)
+        if myEntry is None or myEntry[0]!=aETag:
+            return False
+        try:
+            myStat=os.stat(aLocalPath)
+        except OSError:
+            return False
+        return (myStat.st_mtime_ns,myStat.st_size)==myEntry[1:]
+
+    def _remember(self,aLocalPath: str,aETag: str):
+        myStat=os.stat(aLocalPath)
+        with self._cachedLock:
+            self._cached[aLocalPath]=(aETag,myStat.st_mtime_ns,myStat.st_size)
+
+    def _forget(self,aLocalPath: str):
+        with self._cachedLock:
+            self._cached.pop(aLocalPath,None)
+
+    def _download(self,aKey: str,aETag: str):
+        myLocalPath=self._getLocalPath(aKey)
+        if self._isCached(myLocalPath,aETag):
+            return
+        os.makedirs(os.path.dirname(myLocalPath),exist_ok=True)
+        myTmpPath=myLocalPath+'.tmp-%d-%d'%(os.getpid(),threading.get_ident())
+        try:
+            self.client.download_file(self.bucket,aKey,myTmpPath,Config=self.transferConfig)
+            os.replace(myTmpPath,myLocalPath)
+        finally:
+            if os.path.exists(myTmpPath):
+                os.remove(myTmpPath)
+        self._remember(myLocalPath,aETag)
+
+    def _upload(self,aLocalPath: str):
+        myKey=self._getKey(aLocalPath)
+        self.client.upload_file(aLocalPath,self.bucket,myKey,Config=self.transferConfig)
+        myHead=self._head(myKey)
+        if myHead is not None:
+            self._remember(aLocalPath,myHead['ETag'])
+
+    def _dropLocal(self,aLocalPath: str):
+        self._forget(aLocalPath)
+        if os.path.isfile(aLocalPath):
+            os.remove(aLocalPath)
+
+    def exists(self,aLocalPath: str):
+        if self.fetch(aLocalPath):
+            return True
+        # a "folder" exists if anything is stored below it
+        for myPage in self._listObjects(self._getKey(aLocalPath).rstrip('/')+'/'):
+            if myPage.get('KeyCount',0)>0:
+                os.makedirs(aLocalPath,exist_ok=True)
+                return True
+        return False
+
+    def listDir(self,aLocalDir: str):
+        myKey=self._getKey(aLocalDir).rstrip('/')+'/'
+        myNames=set()
+        for myPage in self._listObjects(myKey,'/'):
+            for myObject in myPage.get('Contents',[]):
+                myNames.add(myObject['Key'][len(myKey):])
+            for myCommonPrefix in myPage.get('CommonPrefixes',[]):
+                myNames.add(myCommonPrefix['Prefix'][len(myKey):].rstrip('/'))
+        myNames.discard('')
+        return sorted(myNames)
+
+    def fetch(self,aLocalPath: str):
+        """Make the cached copy of one object current; returns False (and drops the cached copy) if it doesn't exist"""
+        myKey=self._getKey(aLocalPath)
+        myHead=self._head(myKey)
+        if myHead is None:
+            self._dropLocal(aLocalPath)
+            return False
+        self._download(myKey,myHead['ETag'])
+        return True
+
+    def fetchPrefix(self,aLocalPath: str):
+        myObjects=self._prefixObjects(aLocalPath)
+        for myKey,myETag in myObjects.items():
+            self._download(myKey,myETag)
+        # drop cached files another worker has removed (stale dump siblings, old partitions)
+        myRemote={self._getLocalPath(k) for k in myObjects}
+        for myLocalFile in self._localPrefixFiles(aLocalPath):
+            if myLocalFile not in myRemote:
+                self._dropLocal(myLocalFile)
+
+    def publish(self,aLocalPath: str):
+        self._upload(aLocalPath)
+
+    def publishPrefix(self,aLocalPath: str):
+        """Upload every local file of the entry and delete the objects that no longer exist locally"""
+        myLocalFiles=self._localPrefixFiles(aLocalPath)
+        for myLocalFile in myLocalFiles:
+            self._upload(myLocalFile)
+        myLocalKeys={self._getKey(f) for f in myLocalFiles}
+        myStale=[k for k in self._prefixObjects(aLocalPath) if k not in myLocalKeys]
+        self._deleteKeys(myStale)
+
+    def remove(self,aLocalPath: str):
+        self._deleteKeys([self._getKey(aLocalPath)])
+        self._dropLocal(aLocalPath)
+
+    @contextmanager
+    def lock(self,aLocalPath: str):
+        myLockKey=self.prefix+'_locks/'+self._getKey(aLocalPath)[len(self.prefix):]+'.lock'
+        myOwner=('%s-%d-%d-%s'%(os.uname().nodename if hasattr(os,'uname') else 'host',os.getpid(),threading.get_ident(),uuid.uuid4().hex)).encode('utf-8')
+        myDeadline=time.monotonic()+LOCK_TIMEOUT_SECONDS
+        myDelay=0.05
+        while True:
+            try:
+                self.client.put_object(Bucket=self.bucket,Key=myLockKey,Body=myOwner,IfNoneMatch='*')
+                break
+            except ClientError as e:
+                if e.response['Error']['Code'] not in ('PreconditionFailed','412','ConditionalRequestConflict','409'):
+                    raise
+            myHead=self._head(myLockKey)
+            if myHead is not None and time.time()-myHead['LastModified'].timestamp()>LOCK_TTL_SECONDS:
+                logger.warning('breaking abandoned storage lock %s'%myLockKey)
+                self.client.delete_object(Bucket=self.bucket,Key=myLockKey)
+                continue
+            if time.monotonic()>=myDeadline:
+                raise TimeoutError(f"Could not lock {aLocalPath} within {LOCK_TIMEOUT_SECONDS}s")
+            time.sleep(myDelay*(0.5+random.random()))
+            myDelay=min(myDelay*2,2.0)
+        try:
+            yield
+        finally:
+            # only remove the lock if it is still ours (it may have been broken as abandoned)
+            try:
+                myBody=self.client.get_object(Bucket=self.bucket,Key=myLockKey)['Body'].read()
+                if myBody==myOwner:
+                    self.client.delete_object(Bucket=self.bucket,Key=myLockKey)
+            except ClientError as e:
+                if e.response['Error']['Code'] not in ('404','NoSuchKey','NotFound'):
+                    raise
+
+    def getSize(self,aLocalPath: str):
+        myHead=self._head(self._getKey(aLocalPath))
+        return None if myHead is None else myHead['ContentLength']
+
+    def iterRange(self,aLocalPath: str,aStart: int,aEnd: int,aChunkSize: int=RANGE_CHUNK_SIZE):
+        """Stream a byte range straight from the bucket (one ranged GET, no full download)"""
+        myResponse=self.client.get_object(Bucket=self.bucket,Key=self._getKey(aLocalPath),Range=f'bytes={aStart}-{aEnd}')
+        myBody=myResponse['Body']
+        try:
+            for myChunk in myBody.iter_chunks(aChunkSize):
+                yield myChunk
+        finally:
+            myBody.close()
+
+    def _deleteKeys(self,aKeys: list):
+        for i in range(0,len(aKeys),1000): # DeleteObjects takes at most 1000 keys
+            self.client.delete_objects(Bucket=self.bucket,Delete={'Objects':[{'Key':k} for k in aKeys[i:i+1000]],'Quiet':True})
+
+    @staticmethod
+    def _localPrefixFiles(aLocalPath: str):
+        """Local files that belong to the entry at aLocalPath (temp files excluded)"""
+        myFiles=[]
+        if os.path.isfile(aLocalPath):
+            myFiles.append(aLocalPath)
+        if os.path.isdir(aLocalPath):
+            for myRoot,_,myFileNames in os.walk(aLocalPath):
+                myFiles.extend(os.path.join(myRoot,f) for f in myFileNames)
+        myDir,myName=os.path.split(aLocalPath)
+        if os.path.isdir(myDir):
+            for myEntry in os.listdir(myDir):
+                if myEntry.startswith(myName+'.') and isEntryMember(myEntry[len(myName):]):
+                    myPath=os.path.join(myDir,myEntry)
+                    if os.path.isfile(myPath):
+                        myFiles.append(myPath)
+                    elif os.path.isdir(myPath):
+                        for myRoot,_,myFileNames in os.walk(myPath):
+                            myFiles.extend(os.path.join(myRoot,f) for f in myFileNames)
+        return [f for f in myFiles if '.tmp-' not in os.path.basename(f)]
+
+FILE_STORAGES={
+    'onPrem':OnPremFileStorage,
+    's3':S3FileStorage,
+}
+
+# One backend per distinct config per process, so clients and the cache index are shared across STORAGE instances
+_fileStorages={}
+_fileStoragesLock=threading.Lock()
+
+def getFileStorage(aStorageConfig: dict):
+    """Backend for storageConfig['defaultFileStorage'] (onPrem or s3)"""
+    myStorageName=aStorageConfig['defaultFileStorage']
+    if myStorageName not in FILE_STORAGES:
+        raise Exception(f"Unknown file storage {myStorageName}, expected one of {list(FILE_STORAGES)}")
+    myKey=repr(sorted((k,repr(v)) for k,v in aStorageConfig.items()))
+    with _fileStoragesLock:
+        if myKey not in _fileStorages:
+            _fileStorages[myKey]=FILE_STORAGES[myStorageName](aStorageConfig)
+        return _fileStorages[myKey]
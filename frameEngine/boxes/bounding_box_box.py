@@ -14,6 +14,7 @@ from pdf2image import convert_from_path
 import base64
 import openai
 from openai import OpenAI
+from utils.llm_governor import get_llm_governor, estimate_tokens
 from tenacity import (
     retry,
     stop_after_attempt,
@@ -686,6 +687,21 @@ Core Rules:
         else:
             return "No OCR data available"
     
+    async def _create_completion(self, messages: List[Dict[str, Any]]):
+        """Vision completion admitted through the shared LLM rate governor"""
+        estimated_tokens = estimate_tokens(messages, max_tokens=self.config.max_tokens)
+        async with get_llm_governor().reserve_async(self.config.model_name, estimated_tokens) as reservation:
+            response = self.client.chat.completions.create(
+                model=self.config.model_name,
+                messages=messages,
+                max_tokens=self.config.max_tokens,
+                temperature=self.config.temperature,
+                timeout=self.config.api_timeout,
+                response_format={"type": "json_object"}
+            )
+            reservation.reconcile(response.usage.total_tokens if response.usage else None)
+        return response
+    
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=2, min=4, max=120),
@@ -750,14 +766,7 @@ Core Rules:
             ]
             
             try:
-                response = self.client.chat.completions.create(
-                    model=self.config.model_name,
-                    messages=messages,
-                    max_tokens=self.config.max_tokens,
-                    temperature=self.config.temperature,
-                    timeout=self.config.api_timeout,
-                    response_format={"type": "json_object"}
-                )
+                response = await self._create_completion(messages)
                 
                 # Parse response
                 result_text = response.choices[0].message.content.strip()
@@ -876,14 +885,7 @@ Core Rules:
                 }
             ]
             
-            response = self.client.chat.completions.create(
-                model=self.config.model_name,
-                messages=messages,
-                max_tokens=self.config.max_tokens,
-                temperature=self.config.temperature,
-                timeout=self.config.api_timeout,
-                response_format={"type": "json_object"}
-            )
+            response = await self._create_completion(messages)
             
             # Parse response
             result_text = response.choices[0].message.content.strip()
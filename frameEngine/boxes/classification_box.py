@@ -11,6 +11,7 @@ from pathlib import Path
 
 import openai
 from openai import OpenAI
+from utils.llm_governor import get_llm_governor, estimate_tokens
 import google.generativeai as genai
 from tenacity import (
     retry,
@@ -386,16 +387,21 @@ class ClassificationBox:
             self.metrics.record_api_call("openai")
             prompt = self._build_enhanced_prompt(text_content, filename)
             
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a precise document classification expert. Respond only with the document type name."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=20,
-                temperature=0.0,
-                timeout=30.0
-            )
+            messages = [
+                {"role": "system", "content": "You are a precise document classification expert. Respond only with the document type name."},
+                {"role": "user", "content": prompt}
+            ]
+            
+            # Wait for rate-limit budget instead of discovering the limit through 429s
+            async with get_llm_governor().reserve_async(self.model, estimate_tokens(messages, max_tokens=20)) as reservation:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=20,
+                    temperature=0.0,
+                    timeout=30.0
+                )
+                reservation.reconcile(response.usage.total_tokens if response.usage else None)
             
             classification = response.choices[0].message.content.strip()
             
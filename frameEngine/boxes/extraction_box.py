@@ -14,6 +14,7 @@ from pathlib import Path
 
 import openai
 from openai import OpenAI
+from utils.llm_governor import get_llm_governor, estimate_tokens
 from tenacity import (
     retry,
     stop_after_attempt,
@@ -24,6 +25,7 @@ from tenacity import (
 )
 
 from ..data_model import AithonDocument
+from ..schema_registry import CompiledSchema, get_schema_registry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -161,7 +163,7 @@ class ExtractionBox:
         self.config = config or ExtractionConfig()
         self.client = OpenAI()
         self.extraction_cache = {}
-        self.schema_cache = {}
+        self.schema_registry = get_schema_registry()
         self.metrics = ExtractionMetrics()
         
         # Output directory for raw OpenAI responses
@@ -384,11 +386,8 @@ class ExtractionBox:
         if self.config.enable_caching:
             self.extraction_cache[content_hash] = (time.time(), result)
     
-    def _load_schema(self, document_type: str) -> Dict[str, Any]:
-        """Load and cache schema for document type"""
-        if document_type in self.schema_cache:
-            return self.schema_cache[document_type]
-        
+    def _load_compiled_schema(self, document_type: str) -> CompiledSchema:
+        """Look up the compiled schema for a document type in the shared registry"""
         schema_mapping = {
             "Statement": "statement_schema.json",
             "CapCall": "capcall_schema.json", 
@@ -401,38 +400,42 @@ class ExtractionBox:
             raise ValueError(f"No schema found for document type: {document_type}")
         
         schema_path = self.schema_dir / schema_file
-        if not schema_path.exists():
-            # Try one more time to create/copy schema files
-            logging.warning(f"Schema file {schema_file} not found, attempting recovery...")
-            self._copy_schema_files_if_missing()
-            
-            # Check again after recovery attempt
-            if not schema_path.exists():
-                # Provide detailed debugging information
-                available_files = list(self.schema_dir.glob("*.json")) if self.schema_dir.exists() else []
-                error_msg = (f"Schema file not found after recovery attempts: {schema_path}\n"
-                            f"Schema directory: {self.schema_dir}\n"
-                            f"Schema directory exists: {self.schema_dir.exists()}\n"
-                            f"Available schema files: {[f.name for f in available_files]}\n"
-                            f"Looking for document type: {document_type}\n"
-                            f"Expected schema file: {schema_file}")
-                logging.error(error_msg)
-                raise FileNotFoundError(error_msg)
+        try:
+            return self.schema_registry.get(schema_path)
+        except FileNotFoundError:
+            pass
+        
+        # Try one more time to create/copy schema files
+        logging.warning(f"Schema file {schema_file} not found, attempting recovery...")
+        self._copy_schema_files_if_missing()
         
+        # Check again after recovery attempt
+        if not schema_path.exists():
+            # Provide detailed debugging information
+            available_files = list(self.schema_dir.glob("*.json")) if self.schema_dir.exists() else []
+            error_msg = (f"Schema file not found after recovery attempts: {schema_path}\n"
+                        f"Schema directory: {self.schema_dir}\n"
+                        f"Schema directory exists: {self.schema_dir.exists()}\n"
+                        f"Available schema files: {[f.name for f in available_files]}\n"
+                        f"Looking for document type: {document_type}\n"
+                        f"Expected schema file: {schema_file}")
+            logging.error(error_msg)
+            raise FileNotFoundError(error_msg)
+        
+        return self.schema_registry.get(schema_path)
+    
+    def _load_schema(self, document_type: str) -> Dict[str, Any]:
+        """Load schema for document type (served from the compiled schema registry)"""
         try:
-            with open(schema_path, 'r', encoding='utf-8') as f:
-                schema = json.load(f)
-            
-            # Cache the schema
-            self.schema_cache[document_type] = schema
-            logging.info(f"Loaded and cached schema for {document_type}")
-            return schema
-            
+            return self._load_compiled_schema(document_type).schema
         except json.JSONDecodeError as e:
-            raise ValueError(f"Invalid JSON in schema file {schema_path}: {e}")
+            raise ValueError(f"Invalid JSON in schema file for {document_type}: {e}")
     
     def _validate_schema(self, schema: Dict[str, Any]) -> bool:
         """Validate schema structure"""
+        compiled = self.schema_registry.find(schema)
+        if compiled is not None:
+            return compiled.is_well_formed
         required_fields = ["type", "properties"]
         return all(field in schema for field in required_fields)
     
@@ -461,7 +464,8 @@ class ExtractionBox:
         
         # Estimate tokens for text + schema + prompt overhead
         text_tokens = self._estimate_tokens(text)
-        schema_tokens = self._estimate_tokens(json.dumps(schema))
+        compiled = self.schema_registry.find(schema)
+        schema_tokens = compiled.token_estimate if compiled else self._estimate_tokens(json.dumps(schema))
         prompt_overhead = 1000  # Estimated overhead for instructions
         
         total_tokens = text_tokens + schema_tokens + prompt_overhead
@@ -658,7 +662,8 @@ class ExtractionBox:
         # NO TRUNCATION - we want the full text for accurate extraction
         # The chunking will be handled at a higher level if needed
         
-        schema_str = json.dumps(schema, indent=2)
+        compiled = self.schema_registry.find(schema)
+        schema_str = compiled.prompt_text if compiled else json.dumps(schema, indent=2)
         
         chunk_instruction = ""
         if chunk_info:
@@ -787,16 +792,22 @@ class ExtractionBox:
         try:
             prompt = self._build_extraction_prompt(text, schema, document_type, chunk_info)
             
-            response = self.client.chat.completions.create(
-                model=self.config.model_name,
-                messages=[
-                    {"role": "system", "content": "You are a precise data extraction expert. Return only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=self.config.max_tokens,
-                temperature=self.config.temperature,
-                timeout=self.config.api_timeout
-            )
+            messages = [
+                {"role": "system", "content": "You are a precise data extraction expert. Return only valid JSON."},
+                {"role": "user", "content": prompt}
+            ]
+            
+            # Wait for rate-limit budget instead of discovering the limit through 429s
+            estimated_tokens = estimate_tokens(messages, max_tokens=self.config.max_tokens)
+            async with get_llm_governor().reserve_async(self.config.model_name, estimated_tokens) as reservation:
+                response = self.client.chat.completions.create(
+                    model=self.config.model_name,
+                    messages=messages,
+                    max_tokens=self.config.max_tokens,
+                    temperature=self.config.temperature,
+                    timeout=self.config.api_timeout
+                )
+                reservation.reconcile(response.usage.total_tokens if response.usage else None)
             
             # Record metrics
             usage = response.usage
@@ -1014,31 +1025,16 @@ class ExtractionBox:
         Adds missing optional fields with null values to maintain schema compliance.
         """
         try:
-            # Navigate to the portfolio properties in the schema
-            entities_schema = schema.get("properties", {}).get("entities", {})
-            if not entities_schema:
-                logging.warning("Schema structure: entities not found in properties")
-                return extracted_data
-            
-            items_schema = entities_schema.get("items", {})
-            if not items_schema:
-                logging.warning("Schema structure: items not found in entities")
-                return extracted_data
-            
-            portfolio_schema = items_schema.get("properties", {}).get("portfolio", {})
-            if not portfolio_schema:
-                logging.warning("Schema structure: portfolio not found in items properties")
-                return extracted_data
-            
-            portfolio_items_schema = portfolio_schema.get("items", {})
-            if not portfolio_items_schema:
-                logging.warning("Schema structure: portfolio items not found")
-                return extracted_data
-            
-            portfolio_properties = portfolio_items_schema.get("properties", {})
-            if not portfolio_properties:
-                logging.warning("Schema structure: portfolio properties not found")
-                return extracted_data
+            compiled = self.schema_registry.find(schema)
+            if compiled is not None:
+                portfolio_fields = compiled.portfolio_fields
+                if not portfolio_fields:
+                    logging.warning("Schema structure: portfolio properties not found")
+                    return extracted_data
+            else:
+                portfolio_fields = self._find_portfolio_fields(schema)
+                if not portfolio_fields:
+                    return extracted_data
             
             # Navigate through extracted data structure
             entities = extracted_data.get("entities", [])
@@ -1056,7 +1052,7 @@ class ExtractionBox:
                     "PageNumber": None
                 }
             
-            total_fields_in_schema = len(portfolio_properties)
+            total_fields_in_schema = len(portfolio_fields)
             fields_added_count = 0
             fields_already_present = 0
             
@@ -1075,7 +1071,7 @@ class ExtractionBox:
                         continue
                     
                     # Check each field in schema properties
-                    for field_name in portfolio_properties.keys():
+                    for field_name in portfolio_fields:
                         # Skip if field already exists
                         if field_name in portfolio_item:
                             fields_already_present += 1
@@ -1097,6 +1093,39 @@ class ExtractionBox:
             logging.error(f"Error ensuring all schema fields: {e}", exc_info=True)
             return extracted_data
     
+    def _find_portfolio_fields(self, schema: Dict[str, Any]) -> List[str]:
+        """Walk an uncompiled schema down to the portfolio item field names"""
+        try:
+            # Navigate to the portfolio properties in the schema
+            entities_schema = schema.get("properties", {}).get("entities", {})
+            if not entities_schema:
+                logging.warning("Schema structure: entities not found in properties")
+                return []
+            
+            items_schema = entities_schema.get("items", {})
+            if not items_schema:
+                logging.warning("Schema structure: items not found in entities")
+                return []
+            
+            portfolio_schema = items_schema.get("properties", {}).get("portfolio", {})
+            if not portfolio_schema:
+                logging.warning("Schema structure: portfolio not found in items properties")
+                return []
+            
+            portfolio_items_schema = portfolio_schema.get("items", {})
+            if not portfolio_items_schema:
+                logging.warning("Schema structure: portfolio items not found")
+                return []
+            
+            portfolio_properties = portfolio_items_schema.get("properties", {})
+            if not portfolio_properties:
+                logging.warning("Schema structure: portfolio properties not found")
+            return list(portfolio_properties.keys())
+            
+        except Exception as e:
+            logging.error(f"Error reading portfolio fields from schema: {e}", exc_info=True)
+            return []
+    
     def _validate_and_correct_numeric_sums(self, extracted_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Validate and correct numeric sums by recalculating from VerbatimText.
@@ -1210,17 +1239,23 @@ class ExtractionBox:
                 errors.append("Extracted data is not a dictionary")
                 return False, errors
             
+            # Required fields and property types are precomputed by the schema registry
+            compiled = self.schema_registry.find(schema)
+            if compiled is not None:
+                required_fields = compiled.required_fields
+                property_types = compiled.property_types
+            else:
+                required_fields = schema.get("required", [])
+                property_types = {name: spec.get("type") for name, spec in schema.get("properties", {}).items()}
+            
             # Check required fields
-            required_fields = schema.get("required", [])
             for field in required_fields:
                 if field not in data or data[field] is None:
                     errors.append(f"Required field '{field}' is missing or null")
             
             # Type validation for properties
-            properties = schema.get("properties", {})
-            for field, field_schema in properties.items():
+            for field, expected_type in property_types.items():
                 if field in data and data[field] is not None:
-                    expected_type = field_schema.get("type")
                     value = data[field]
                     
                     if expected_type == "string" and not isinstance(value, str):
@@ -370,9 +370,13 @@
 import fitz  # PyMuPDF
 import pytesseract
 import logging
-from PIL import Image
+import math
+import time
+from dataclasses import dataclass, field
+from PIL import Image, ImageFilter
 from pdf2image import convert_from_path
-from typing import List
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
 import pandas as pd
 import os
 from dotenv import load_dotenv
@@ -385,13 +389,45 @@ load_dotenv()
 # Configure logging
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
 
+@dataclass
+class OCRConfig:
+    """Configuration for OCR rendering and adaptive re-OCR"""
+    
+    # Adaptive mode: fast low-DPI pass, then re-OCR of low-confidence regions only.
+    # Opt-in (OCR_ADAPTIVE_MODE=true): the default stays the fixed 300 DPI pass
+    adaptive_mode: bool = field(default_factory=lambda: os.getenv("OCR_ADAPTIVE_MODE", "false").lower() == "true")
+    
+    # Fixed-DPI (legacy) settings
+    dpi: int = 300
+    
+    # First pass settings
+    base_dpi: int = 200
+    base_tesseract_config: str = "--oem 1 --psm 6"
+    
+    # Re-OCR settings
+    high_dpi: int = 400
+    high_tesseract_config: str = "--oem 1 --psm 6"
+    low_confidence_threshold: float = 60.0
+    region_padding_px: int = 6
+    max_reocr_area_ratio: float = 0.6  # Above this, the whole page is re-OCRed at high DPI
+    
+    # Cleanup applied before re-OCR
+    max_deskew_angle: float = 3.0
+    deskew_step: float = 0.5
+    denoise_filter_size: int = 3
+    
+    # Word coordinates are reported in pixels at this DPI (matches the fixed-DPI output)
+    output_coordinate_dpi: int = 300
+
 class OCRBox:
     """
     Performs OCR on the document, handling both text-based and image-based PDFs.
     It extracts page text and detailed word-level bounding box information.
     """
 
-    def __init__(self):
+    def __init__(self, config: Optional[OCRConfig] = None):
+        self.config = config or OCRConfig()
+        
         # Configure Tesseract path - cross-platform support
         # On Linux, tesseract is usually installed via package manager and in PATH
         # On Windows, we need to find it or use TESSERACT_CMD env var
@@ -532,6 +568,13 @@ class OCRBox:
         return False
 
     def _perform_ocr(self, doc_payload: AithonDocument):
+        """Performs OCR using the adaptive pipeline when enabled, otherwise fixed-DPI OCR."""
+        if self.config.adaptive_mode:
+            self._perform_adaptive_ocr(doc_payload)
+        else:
+            self._perform_fixed_dpi_ocr(doc_payload)
+
+    def _perform_fixed_dpi_ocr(self, doc_payload: AithonDocument):
         """Performs full OCR by converting PDF to images and using Tesseract."""
         logging.info(f"Performing full OCR on {doc_payload.original_filename}...")
         doc_payload.is_scanned = True
@@ -541,7 +584,7 @@ class OCRBox:
             # Convert PDF to a list of PIL images
             # If poppler_path is None, pdf2image will use system PATH (works on Linux)
             convert_kwargs = {
-                "dpi": 300,
+                "dpi": self.config.dpi,
                 "output_folder": self.temp_dir,
             }
             if self.poppler_path is not None:
@@ -590,6 +633,229 @@ class OCRBox:
                     os.remove(os.path.join(self.temp_dir, item))
 
 
+    # ------------------------------------------------------------------
+    # Adaptive OCR
+    # ------------------------------------------------------------------
+
+    def _render_page(self, pdf_page, dpi: int, clip=None) -> Image.Image:
+        """Render a PDF page (or a clipped region of it) to a grayscale image in memory."""
+        pixmap = pdf_page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, clip=clip, alpha=False)
+        return Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+
+    def _binarize(self, image: Image.Image) -> Image.Image:
+        """Fast global binarization using Otsu's threshold."""
+        pixels = np.asarray(image, dtype=np.uint8)
+        histogram = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+        total = pixels.size
+        if total == 0:
+            return image
+        
+        weight_bg = np.cumsum(histogram)
+        weight_fg = total - weight_bg
+        cumulative_mean = np.cumsum(histogram * np.arange(256))
+        mean_bg = cumulative_mean / np.maximum(weight_bg, 1)
+        mean_fg = (cumulative_mean[-1] - cumulative_mean) / np.maximum(weight_fg, 1)
+        between_class_variance = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        threshold = int(np.argmax(between_class_variance))
+        
+        return Image.fromarray(np.where(pixels > threshold, 255, 0).astype(np.uint8))
+
+    def _estimate_skew_angle(self, binary: Image.Image) -> float:
+        """Estimate skew by maximizing the variance of the horizontal projection profile."""
+        max_angle = self.config.max_deskew_angle
+        step = self.config.deskew_step
+        if max_angle <= 0 or step <= 0:
+            return 0.0
+        
+        # Work on a downscaled copy - the profile peak is stable under scaling
+        preview = binary
+        if preview.width > 800:
+            ratio = 800 / preview.width
+            preview = preview.resize((800, max(1, int(preview.height * ratio))))
+        
+        best_angle, best_score = 0.0, -1.0
+        for angle in np.arange(-max_angle, max_angle + step / 2, step):
+            rotated = preview.rotate(float(angle), expand=False, fillcolor=255)
+            ink_per_row = (np.asarray(rotated) < 128).sum(axis=1)
+            score = float(np.var(ink_per_row))
+            if score > best_score:
+                best_angle, best_score = float(angle), score
+        return best_angle
+
+    def _clean_region(self, image: Image.Image) -> Tuple[Image.Image, float]:
+        """Denoise, binarize and deskew an image before re-OCR."""
+        if self.config.denoise_filter_size > 1:
+            image = image.filter(ImageFilter.MedianFilter(self.config.denoise_filter_size))
+        binary = self._binarize(image)
+        angle = self._estimate_skew_angle(binary)
+        if angle:
+            binary = binary.rotate(angle, expand=False, fillcolor=255)
+        return binary, angle
+
+    def _ocr_words(self, image: Image.Image, tesseract_config: str) -> pd.DataFrame:
+        """Run Tesseract and return confident word rows."""
+        page_data = pytesseract.image_to_data(image, config=tesseract_config, output_type=pytesseract.Output.DATAFRAME)
+        page_data = page_data[page_data.conf != -1]
+        page_data = page_data[page_data["text"].notna()]
+        page_data = page_data.assign(text=page_data["text"].astype(str).str.strip())
+        return page_data[page_data["text"] != ""].reset_index(drop=True)
+
+    def _low_confidence_regions(self, words: pd.DataFrame, image_size: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+        """Group low-confidence words into padded line regions, merging vertically overlapping ones."""
+        low_conf = words[words.conf < self.config.low_confidence_threshold]
+        if low_conf.empty:
+            return []
+        
+        width, height = image_size
+        pad = self.config.region_padding_px
+        line_keys = ["block_num", "par_num", "line_num"]
+        low_lines = set(map(tuple, low_conf[line_keys].drop_duplicates().values.tolist()))
+        
+        regions = []
+        for key, line_words in words.groupby(line_keys):
+            if tuple(key) not in low_lines:
+                continue
+            left = max(0, int(line_words.left.min()) - pad)
+            top = max(0, int(line_words.top.min()) - pad)
+            right = min(width, int((line_words.left + line_words.width).max()) + pad)
+            bottom = min(height, int((line_words.top + line_words.height).max()) + pad)
+            regions.append((left, top, right, bottom))
+        
+        regions.sort(key=lambda r: (r[1], r[0]))
+        merged = []
+        for region in regions:
+            if merged and region[1] <= merged[-1][3] and region[0] <= merged[-1][2] and region[2] >= merged[-1][0]:
+                last = merged[-1]
+                merged[-1] = (min(last[0], region[0]), min(last[1], region[1]), max(last[2], region[2]), max(last[3], region[3]))
+            else:
+                merged.append(region)
+        return merged
+
+    def _reocr_region(self, pdf_page, region: Tuple[int, int, int, int]) -> pd.DataFrame:
+        """Re-render a base-DPI pixel region at high DPI, clean it and OCR it again.
+        Returned word coordinates are in base-DPI pixels."""
+        base_dpi, high_dpi = self.config.base_dpi, self.config.high_dpi
+        to_points = 72.0 / base_dpi
+        clip = fitz.Rect(region[0] * to_points, region[1] * to_points, region[2] * to_points, region[3] * to_points)
+        if pdf_page.rotation:
+            clip = clip * pdf_page.derotation_matrix
+        
+        image = self._render_page(pdf_page, high_dpi, clip=clip)
+        cleaned, angle = self._clean_region(image)
+        words = self._ocr_words(cleaned, self.config.high_tesseract_config)
+        if words.empty:
+            return words
+        
+        # Undo the deskew rotation on word centers, then scale back into base-DPI page space
+        scale = base_dpi / high_dpi
+        center_x, center_y = cleaned.width / 2, cleaned.height / 2
+        word_cx = words.left + words.width / 2 - center_x
+        word_cy = words.top + words.height / 2 - center_y
+        radians = math.radians(angle)
+        original_cx = word_cx * math.cos(radians) - word_cy * math.sin(radians) + center_x
+        original_cy = word_cx * math.sin(radians) + word_cy * math.cos(radians) + center_y
+        
+        words = words.copy()
+        words["width"] = words.width * scale
+        words["height"] = words.height * scale
+        words["left"] = region[0] + original_cx * scale - words.width / 2
+        words["top"] = region[1] + original_cy * scale - words.height / 2
+        return words
+
+    def _merge_region_words(self, words: pd.DataFrame, region: Tuple[int, int, int, int], region_words: pd.DataFrame) -> Tuple[pd.DataFrame, bool]:
+        """Replace the words inside a region with the re-OCR result when it is more confident."""
+        centers_x = words.left + words.width / 2
+        centers_y = words.top + words.height / 2
+        inside = (centers_x >= region[0]) & (centers_x <= region[2]) & (centers_y >= region[1]) & (centers_y <= region[3])
+        if region_words.empty or (inside.any() and region_words.conf.mean() <= words.loc[inside, "conf"].mean()):
+            return words, False
+        
+        inside = inside.to_numpy()
+        positions = np.arange(len(words))
+        insert_at = int(np.argmax(inside)) if inside.any() else len(words)
+        before = words[(positions < insert_at) & ~inside]
+        after = words[(positions >= insert_at) & ~inside]
+        return pd.concat([before, region_words, after], ignore_index=True), True
+
+    def _adaptive_ocr_page(self, pdf_page) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """OCR one page: fast low-DPI pass, then targeted high-DPI re-OCR of weak regions."""
+        image = self._render_page(pdf_page, self.config.base_dpi)
+        words = self._ocr_words(self._binarize(image), self.config.base_tesseract_config)
+        stats = {"base_confidence": float(words.conf.mean()) if not words.empty else 0.0,
+                 "reocr_regions": 0, "reocr_replaced": 0, "full_page_reocr": False}
+        
+        regions = self._low_confidence_regions(words, image.size)
+        page_area = max(image.width * image.height, 1)
+        region_area = sum((r[2] - r[0]) * (r[3] - r[1]) for r in regions)
+        if words.empty or region_area / page_area > self.config.max_reocr_area_ratio:
+            regions = [(0, 0, image.width, image.height)]
+            stats["full_page_reocr"] = True
+        
+        for region in regions:
+            region_words = self._reocr_region(pdf_page, region)
+            words, replaced = self._merge_region_words(words, region, region_words)
+            stats["reocr_regions"] += 1
+            stats["reocr_replaced"] += int(replaced)
+        
+        stats["final_confidence"] = float(words.conf.mean()) if not words.empty else 0.0
+        
+        # Report coordinates in the same pixel space as fixed-DPI OCR
+        scale = self.config.output_coordinate_dpi / self.config.base_dpi
+        for column in ("left", "top", "width", "height"):
+            words[column] = (words[column] * scale).round().astype(int)
+        return words, stats
+
+    def _perform_adaptive_ocr(self, doc_payload: AithonDocument):
+        """Performs adaptive OCR page by page, rendering in memory with PyMuPDF."""
+        logging.info(f"Performing adaptive OCR on {doc_payload.original_filename}...")
+        doc_payload.is_scanned = True
+        all_pages_text = []
+        page_stats = []
+        start_time = time.time()
+
+        try:
+            pdf_document = fitz.open(doc_payload.source_path)
+            try:
+                for page_index in range(len(pdf_document)):
+                    page_num = page_index + 1
+                    logging.info(f"Processing page {page_num}/{len(pdf_document)}")
+                    
+                    words, stats = self._adaptive_ocr_page(pdf_document.load_page(page_index))
+                    page_stats.append(stats)
+                    
+                    words_info = words[['left', 'top', 'width', 'height', 'text']].assign(
+                        confidence=words.conf.astype(float)).to_dict('records')
+                    page_text = " ".join(words["text"])
+                    all_pages_text.append(page_text)
+                    
+                    doc_payload.pages.append(Page(
+                        page_number=page_num,
+                        text=page_text,
+                        raw_text=page_text,
+                        words=words_info
+                    ))
+            finally:
+                pdf_document.close()
+
+            doc_payload.raw_text = "\n".join(all_pages_text)
+            doc_payload.metadata["ocr_stats"] = {
+                "mode": "adaptive",
+                "base_dpi": self.config.base_dpi,
+                "high_dpi": self.config.high_dpi,
+                "pages": len(page_stats),
+                "reocr_regions": sum(s["reocr_regions"] for s in page_stats),
+                "reocr_replaced": sum(s["reocr_replaced"] for s in page_stats),
+                "full_page_reocr_pages": sum(int(s["full_page_reocr"]) for s in page_stats),
+                "average_base_confidence": float(np.mean([s["base_confidence"] for s in page_stats])) if page_stats else 0.0,
+                "average_final_confidence": float(np.mean([s["final_confidence"] for s in page_stats])) if page_stats else 0.0,
+                "processing_time": time.time() - start_time
+            }
+
+        except Exception as e:
+            logging.error(f"An error occurred during adaptive OCR for {doc_payload.original_filename}: {e}")
+            doc_payload.error_message = f"OCR failed: {e}"
+            doc_payload.pipeline_status = "Failed_OCR"
+
     def __call__(self, doc_payload: AithonDocument) -> AithonDocument:
         """
         Processes the document through the OCR box.
@@ -4,6 +4,7 @@ import json
 import hashlib
 from pathlib import Path
 from uuid import UUID
+from jsonArtifacts import removeCompressedArtifact
 
 from ..data_model import AithonDocument
 
@@ -350,6 +351,8 @@ class OutputBox:
             # Write the frontend-focused JSON
             with open(backend_output_path, 'w', encoding='utf-8') as f:
                 json.dump(frontend_output, f, ensure_ascii=False, indent=2, default=self._uuid_serializer)
+            # A .json.zst from an earlier run of this hash would otherwise still be served
+            removeCompressedArtifact(str(backend_output_path))
             
             logging.info(f"✅ Backend output saved to: {backend_output_path}")
             
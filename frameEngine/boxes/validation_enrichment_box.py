@@ -14,6 +14,7 @@ from rapidfuzz import process, fuzz
 import numpy as np
 
 from ..data_model import AithonDocument
+from ..schema_registry import get_schema_registry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -125,53 +126,22 @@ class ValidationEnrichmentBox:
 
     def __init__(self, config: Optional[ValidationConfig] = None):
         self.config = config or ValidationConfig()
+        self.schema_registry = get_schema_registry()
 
     def _load_schema(self, document_type: str) -> Dict[str, Any]:
-        """Load JSON schema for validation"""
-        # Use robust path resolution for Docker containers
-        possible_paths = [
-            # Docker container path
-            Path("/app/frameEngine/schemas"),
-            # Local development path
-            Path("frameEngine/schemas"),
-            # Relative to current file
-            Path(__file__).parent.parent / "schemas"
-        ]
-        
-        schema_dir = None
-        for path in possible_paths:
-            if path.exists():
-                schema_dir = path
-                logging.info(f"Found schema directory: {schema_dir}")
-                break
-        
-        if not schema_dir:
-            logging.error(f"Schema directory not found. Tried: {[str(p) for p in possible_paths]}")
-            raise FileNotFoundError(f"Schema directory not found. Tried: {[str(p) for p in possible_paths]}")
-        
+        """Load JSON schema for validation from the compiled schema registry"""
         # Handle schema file naming variations
-        possible_names = [
+        possible_names = (
             f"{document_type.lower()}_schema.json",
             f"{document_type.lower()}s_schema.json",
             f"{document_type}_schema.json"
-        ]
-        
-        for name in possible_names:
-            schema_file = schema_dir / name
-            if schema_file.exists():
-                try:
-                    logging.info(f"Loading schema file: {schema_file}")
-                    with open(schema_file, 'r') as f:
-                        schema = json.load(f)
-                        logging.info(f"Successfully loaded schema for document type '{document_type}'")
-                        return schema
-                except Exception as e:
-                    logging.error(f"Error loading schema {schema_file}: {e}")
+        )
         
-        # List available schema files for debugging
-        available_files = list(schema_dir.glob("*.json")) if schema_dir else []
-        logging.error(f"Schema file not found for document type '{document_type}'. Available files: {[f.name for f in available_files]}")
-        raise FileNotFoundError(f"Schema file not found for document type '{document_type}'")
+        try:
+            return self.schema_registry.get_for_document_type(document_type, possible_names).schema
+        except FileNotFoundError as e:
+            logging.error(str(e))
+            raise
 
     def _categorize_validation_error(self, error: ValidationError) -> ValidationSeverity:
         """Categorize validation errors by severity"""
@@ -201,8 +171,9 @@ class ValidationEnrichmentBox:
         start_time = time.time()
         
         try:
-            # Create validator
-            validator = jsonschema.Draft7Validator(schema)
+            # Reuse the compiled validator when the schema came from the registry
+            compiled = self.schema_registry.find(schema)
+            validator = compiled.validator if compiled else jsonschema.Draft7Validator(schema)
             
             # Collect all errors
             errors = []
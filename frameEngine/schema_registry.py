@@ -0,0 +1,246 @@
+"""
+Compiled Schema Registry for Aithon Framework
+
+Loads each document schema once, compiles it into a reusable validator and
+precomputes the field metadata the boxes need, so per-document schema handling
+is a dictionary lookup instead of file I/O and tree traversal. The schema dicts
+handed out are read-only, so no caller can change what every other document
+is validated against.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import jsonschema
+
+
+# Candidate schema directories, in resolution order
+SCHEMA_DIR_CANDIDATES = [
+    Path(__file__).parent / "schemas",
+    Path("/app/frameEngine/schemas"),
+    Path("frameEngine/schemas"),
+]
+
+def _read_only(*args, **kwargs):
+    raise TypeError("Schemas from the schema registry are read-only; copy them to modify")
+
+
+class ReadOnlyDict(dict):
+    """dict that refuses mutation (still a dict for json.dumps, jsonschema and isinstance checks)"""
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+
+class SchemaView(ReadOnlyDict):
+    """Read-only schema as handed out by the registry; `path` is the schema file it was loaded from"""
+    __slots__ = ("path",)
+
+    def __init__(self, schema: Dict[str, Any], path: Optional[Path] = None):
+        super().__init__(schema)
+        self.path = path
+
+    def __reduce__(self):
+        return (type(self), (dict(self), self.path))
+
+
+def _freeze(value: Any) -> Any:
+    """Deep read-only copy: dicts become ReadOnlyDict, lists become tuples"""
+    if isinstance(value, dict):
+        return ReadOnlyDict({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+@dataclass
+class CompiledSchema:
+    """A loaded schema together with its compiled validator and field metadata"""
+    path: Path
+    schema: SchemaView
+    validator: jsonschema.Draft7Validator
+    mtime_ns: int
+    size: int
+
+    # Top-level metadata
+    property_types: Dict[str, Any] = field(default_factory=dict)
+    required_fields: Tuple[str, ...] = ()
+    is_well_formed: bool = False
+
+    # Portfolio-level metadata (entities[].portfolio[] schemas)
+    portfolio_fields: List[str] = field(default_factory=list)
+
+    # Prompt helpers
+    prompt_text: str = ""
+    token_estimate: int = 0
+
+
+def _portfolio_properties(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Navigate entities -> items -> properties -> portfolio -> items"""
+    entities_schema = schema.get("properties", {}).get("entities", {})
+    items_schema = entities_schema.get("items", {}) if isinstance(entities_schema, dict) else {}
+    portfolio_schema = items_schema.get("properties", {}).get("portfolio", {}) if isinstance(items_schema, dict) else {}
+    portfolio_items = portfolio_schema.get("items", {}) if isinstance(portfolio_schema, dict) else {}
+    if not isinstance(portfolio_items, dict):
+        return {}
+    return portfolio_items.get("properties", {}) or {}
+
+
+def compile_schema(path: Path) -> CompiledSchema:
+    """Load a schema file and precompute everything derived from it"""
+    stat = path.stat()
+    with open(path, 'r', encoding='utf-8') as f:
+        schema = json.load(f)
+
+    validator_cls = jsonschema.validators.validator_for(schema, default=jsonschema.Draft7Validator)
+    try:
+        validator_cls.check_schema(schema)
+    except jsonschema.SchemaError as e:
+        logging.warning(f"Schema {path.name} does not fully conform to its metaschema: {e.message}")
+    validator = validator_cls(schema)
+
+    properties = schema.get("properties", {}) or {}
+    portfolio_props = _portfolio_properties(schema)
+
+    prompt_text = json.dumps(schema, indent=2)
+
+    return CompiledSchema(
+        path=path,
+        schema=SchemaView({key: _freeze(value) for key, value in schema.items()}, path),
+        validator=validator,
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+        property_types={name: (spec.get("type") if isinstance(spec, dict) else None)
+                        for name, spec in properties.items()},
+        required_fields=tuple(schema.get("required", []) or []),
+        is_well_formed=all(key in schema for key in ("type", "properties")),
+        portfolio_fields=list(portfolio_props.keys()),
+        prompt_text=prompt_text,
+        # Rough approximation: 1 token ≈ 4 characters (matches ExtractionBox._estimate_tokens)
+        token_estimate=len(json.dumps(schema)) // 4,
+    )
+
+
+class SchemaRegistry:
+    """
+    Process-wide cache of compiled schemas keyed by file path.
+
+    Entries are revalidated against the file's mtime/size at most once every
+    `check_interval` seconds; between checks a lookup never touches the disk.
+    """
+
+    def __init__(self, schema_dir: Optional[Path] = None, check_interval: float = 5.0):
+        self._schema_dir = Path(schema_dir) if schema_dir else None
+        self.check_interval = check_interval
+        self._entries: Dict[Path, CompiledSchema] = {}
+        self._last_checked: Dict[Path, float] = {}
+        self._name_index: Dict[Tuple[str, Tuple[str, ...]], Path] = {}
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "loads": 0, "reloads": 0}
+
+    @property
+    def schema_dir(self) -> Path:
+        """Resolve the schema directory once"""
+        if self._schema_dir is None:
+            for candidate in SCHEMA_DIR_CANDIDATES:
+                if candidate.exists():
+                    self._schema_dir = candidate.absolute()
+                    break
+            else:
+                raise FileNotFoundError(
+                    f"Schema directory not found. Tried: {[str(p) for p in SCHEMA_DIR_CANDIDATES]}")
+            logging.info(f"Schema registry using directory: {self._schema_dir}")
+        return self._schema_dir
+
+    def set_schema_dir(self, schema_dir: Path):
+        """Point the registry at a different directory and drop all cached entries"""
+        with self._lock:
+            self._schema_dir = Path(schema_dir).absolute()
+            self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._last_checked.clear()
+            self._name_index.clear()
+
+    def get(self, path: Path) -> CompiledSchema:
+        """Return the compiled schema for a file, reloading it if it changed on disk"""
+        path = Path(path).absolute()
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and now - self._last_checked.get(path, 0.0) < self.check_interval:
+                self.stats["hits"] += 1
+                return entry
+
+            stat = os.stat(path)
+            self._last_checked[path] = now
+            if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                self.stats["hits"] += 1
+                return entry
+
+            compiled = compile_schema(path)
+            self._entries[path] = compiled
+            self.stats["reloads" if entry is not None else "loads"] += 1
+            logging.info(f"{'Reloaded' if entry is not None else 'Compiled'} schema {path.name}")
+            return compiled
+
+    def find(self, schema: Dict[str, Any]) -> Optional[CompiledSchema]:
+        """
+        Return the compiled entry for a schema previously handed out by `get`
+
+        Looked up by the schema's file path; a schema from before a reload of
+        that file (or any other dict) returns None.
+        """
+        path = getattr(schema, "path", None)
+        if path is None:
+            return None
+        with self._lock:
+            compiled = self._entries.get(path)
+        return compiled if compiled is not None and compiled.schema is schema else None
+
+    def resolve(self, document_type: str, candidate_names: Tuple[str, ...]) -> Path:
+        """Return the first existing schema file among `candidate_names`, memoized per document type"""
+        key = (document_type, tuple(candidate_names))
+        with self._lock:
+            path = self._name_index.get(key)
+            if path is not None and path in self._entries:
+                return path
+            for name in candidate_names:
+                candidate = self.schema_dir / name
+                if candidate.exists():
+                    self._name_index[key] = candidate.absolute()
+                    return self._name_index[key]
+        available_files = [f.name for f in self.schema_dir.glob("*.json")]
+        raise FileNotFoundError(
+            f"Schema file not found for document type '{document_type}'. "
+            f"Tried: {list(candidate_names)}. Available files: {available_files}")
+
+    def get_for_document_type(self, document_type: str, candidate_names: Tuple[str, ...]) -> CompiledSchema:
+        return self.get(self.resolve(document_type, candidate_names))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "cached_schemas": len(self._entries)}
+
+
+# Global instance
+_global_schema_registry = None
+
+
+def get_schema_registry() -> SchemaRegistry:
+    """Get global schema registry instance"""
+    global _global_schema_registry
+    if _global_schema_registry is None:
+        _global_schema_registry = SchemaRegistry()
+    return _global_schema_registry
@@ -1,7 +1,8 @@
 
 from frontendUtils.renders.frame.frameDummyActions import uploadFile,clearState
-from frontendUtils.renders.frame.fileGetters import getPdfData, getJsonData
+from frontendUtils.renders.frame.fileGetters import getPdfData, getPdfPageImage, getJsonData
 from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
 
 async def takeFrameAction(params:dict):
     querySubType=params['query'].get('_subType',None)
@@ -23,12 +24,14 @@ async def takeFrameAction(params:dict):
         raise HTTPException(status_code=400, detail=f"fileType {fileType} is invalid")
     
     myFunc=myFuncMap[fileType]
-    return myFunc(params)
+    # getters do blocking file I/O (and page rendering), keep it off the event loop
+    return await run_in_threadpool(myFunc,params)
 
 async def fileGetterFuncs():
     return {
         'getFile':{
             'pdf':getPdfData,
+            'pdfPage':getPdfPageImage,
             'json':getJsonData,
         },
         'uploadFile':{
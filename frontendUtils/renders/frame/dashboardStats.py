@@ -4,19 +4,20 @@ import sys
 import json
 
 from storage import STORAGE
+from utils.fileMetaStore import get_file_meta_store
 # print(STORAGE)
 
 storage = STORAGE('frameDemo', {'defaultFileStorage': 'onPrem'})
 
 def _load_all_file_meta():
-    return storage.getJSONDump('ldummy', '', 'allFileMeta')
+    return get_file_meta_store().all()
 
 def _load_l2_state():
     return storage.getState("l2")
 
 
 def _load_ldummy_json_dump():
-    return storage.getJSONDump("ldummy","", "allFileMeta")
+    return get_file_meta_store().all()
 
 def _apply_filters(files_dict, params):
     """
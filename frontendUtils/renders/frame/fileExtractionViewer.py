@@ -1,7 +1,8 @@
 from frontendUtils.renders.utils.nestedTable import getNestedTableFromRenderStructure
 from fastapi import HTTPException
 from storage import STORAGE
-from utils.statusSync import sync_file_statuses
+from utils.statusSync import repair_file_statuses_if_due
+from utils.fileMetaStore import get_file_meta_store
 from utils.profanityFilter import filter_profanity_in_data
 
 def getAllFilesTabs(params:dict):
@@ -19,13 +20,13 @@ def getAllFilesTable(params:dict):
     l2State=myStorage.getState('l2')
     myRows=[]
 
-    # Sync real-time status from queue before loading data
+    # Statuses follow queue events; occasionally repair anything they missed
     try:
-        sync_file_statuses()
+        repair_file_statuses_if_due()
     except Exception as e:
         print(f"Warning: Status sync failed: {e}")
 
-    allMeta=myStorage.getJSONDump('ldummy',[],'allFileMeta')
+    allMeta=get_file_meta_store().all()
 
     for fileName, fileData in allMeta.items():
         if isinstance(fileData, dict):
@@ -1,7 +1,10 @@
 from storage import STORAGE
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from fastapi import HTTPException
 import json
+from jsonArtifacts import isCompressedForTransfer, readCompressedBytes
+from frontendUtils.renders.frame.rangeFileResponse import rangeFileResponse
+from frontendUtils.renders.frame.pdfPageImages import getPageImagePath, snapPageImageWidth, PAGE_IMAGE_DEFAULT_WIDTH
 
 def getPdfData(params:dict):
     myStorage=_getStorage()
@@ -11,13 +14,36 @@ def getPdfData(params:dict):
     
     myLocalPath=myStorage.getLocalFilePath('l1',[myQuery['pdfHash'],'rawFile.pdf'])
 
-    if not myStorage.fileExists(myLocalPath):
+    # size only: with an object store backend the ranges are read from the bucket, not a downloaded copy
+    mySize=myStorage.fileStorage.getSize(myLocalPath)
+    if mySize is None:
         raise HTTPException(status_code=400, detail="pdfHash is invalid")
     
-    return FileResponse(myLocalPath,
-        headers={
-            "Content-Disposition": 'inline"'
-        })
+    # l1 folders are content-addressed, so the hash is a strong ETag for rawFile.pdf
+    return rangeFileResponse(myLocalPath,params.get('headers'),f'"{myQuery["pdfHash"]}"','application/pdf',
+        {"Content-Disposition": 'inline'},myStorage.fileStorage,mySize)
+
+def getPdfPageImage(params:dict):
+    myStorage=_getStorage()
+    myQuery=params['query']
+    if 'pdfHash' not in myQuery:
+        raise HTTPException(status_code=400, detail="pdfHash is required")
+    try:
+        myPage=int(myQuery.get('page',1))
+        myWidth=snapPageImageWidth(myQuery.get('width',PAGE_IMAGE_DEFAULT_WIDTH))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="page and width must be integers")
+
+    if not myStorage.fileExists(myStorage.getLocalFilePath('l1',[myQuery['pdfHash'],'rawFile.pdf'])):
+        raise HTTPException(status_code=400, detail="pdfHash is invalid")
+
+    try:
+        myImagePath=getPageImagePath(myStorage,myQuery['pdfHash'],myPage,myWidth)
+    except IndexError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return rangeFileResponse(myImagePath,params.get('headers'),f'"{myQuery["pdfHash"]}-p{myPage}-w{myWidth}"','image/png',
+        {"Content-Disposition": 'inline'})
 
 def getJsonData(params:dict):
     myStorage=_getStorage()
@@ -25,16 +51,25 @@ def getJsonData(params:dict):
     if 'jsonHash' not in myQuery:
         raise HTTPException(status_code=400, detail="jsonHash is required")
     
-    myLocalPath=myStorage.getLocalFilePath('l1',[myQuery['jsonHash'],'forFrontend.json'])
+    myLocalPath=myStorage.getJSONDumpPath('l1',[myQuery['jsonHash']],'forFrontend')
 
-    if not myStorage.fileExists(myLocalPath):
+    if myLocalPath is None:
         raise HTTPException(status_code=400, detail="jsonHash is invalid")
     
-    return FileResponse(myLocalPath,
-        headers={
-            "Content-Disposition": 'inline"',
-            "Content-Type": "application/json"
-        })
+    if myLocalPath.endswith('.json'):
+        return FileResponse(myLocalPath,
+            headers={
+                "Content-Disposition": 'inline"',
+                "Content-Type": "application/json"
+            })
+
+    # compressed artifact: hand the stored zstd frame to clients that can decode it
+    myHeaders={"Content-Disposition": 'inline"', "Vary": "Accept-Encoding"}
+    myAcceptEncoding=(params.get('headers') or {}).get('accept-encoding','')
+    if 'zstd' in myAcceptEncoding.lower() and isCompressedForTransfer(myLocalPath):
+        return FileResponse(myLocalPath,media_type="application/json",
+            headers={**myHeaders,"Content-Encoding": "zstd"})
+    return Response(readCompressedBytes(myLocalPath),media_type="application/json",headers=myHeaders)
 
 def _getClient():
     return 'frameDemo' # check for perms here?
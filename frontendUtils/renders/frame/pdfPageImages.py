@@ -0,0 +1,59 @@
+import os
+import uuid
+import threading
+
+# Widths are snapped up to a step so the cache holds a handful of sizes per page
+PAGE_IMAGE_DEFAULT_WIDTH=200
+PAGE_IMAGE_WIDTH_STEP=100
+PAGE_IMAGE_MAX_WIDTH=2000
+
+_renderLocks={}
+_renderLocksGuard=threading.Lock()
+
+def snapPageImageWidth(aWidth: int):
+    myWidth=min(max(int(aWidth),1),PAGE_IMAGE_MAX_WIDTH)
+    return -(-myWidth//PAGE_IMAGE_WIDTH_STEP)*PAGE_IMAGE_WIDTH_STEP
+
+def getPageImagePath(aStorage,aPdfHash: str,aPage: int,aWidth: int):
+    """
+    PNG of one page of l1/<aPdfHash>/rawFile.pdf, rendered on first request
+
+    Images are cached next to the PDF as l1/<hash>/pageImages/page<N>-w<W>.png.
+    The hash folder is content-addressed, so a cached image never goes stale.
+    aPage is 1-based. Raises IndexError for a page the PDF doesn't have.
+    """
+    myImagePath=aStorage.getLocalFilePath('l1',[aPdfHash,'pageImages',f'page{aPage}-w{aWidth}.png'])
+    if os.path.exists(myImagePath):
+        return myImagePath
+
+    # one render per image even when the viewer asks for it several times at once
+    with _renderLocksGuard:
+        myLock=_renderLocks.setdefault(myImagePath,threading.Lock())
+    try:
+        with myLock:
+            if not os.path.exists(myImagePath):
+                _renderPage(aStorage.getLocalFilePath('l1',[aPdfHash,'rawFile.pdf']),aPage,aWidth,myImagePath)
+    finally:
+        # also after a failed render (e.g. IndexError for a bad page), or every bad request would leave a lock behind
+        with _renderLocksGuard:
+            _renderLocks.pop(myImagePath,None)
+    return myImagePath
+
+def _renderPage(aPdfPath: str,aPage: int,aWidth: int,aImagePath: str):
+    import fitz
+    with fitz.open(aPdfPath) as myDoc:
+        if aPage<1 or aPage>myDoc.page_count:
+            raise IndexError(f"page {aPage} is out of range 1-{myDoc.page_count}")
+        myPage=myDoc[aPage-1]
+        myZoom=aWidth/myPage.rect.width
+        myPixmap=myPage.get_pixmap(matrix=fitz.Matrix(myZoom,myZoom),alpha=False)
+
+    os.makedirs(os.path.dirname(aImagePath),exist_ok=True)
+    myTempPath=f'{aImagePath}.tmp-{uuid.uuid4().hex}'
+    try:
+        myPixmap.save(myTempPath,output='png')
+        os.replace(myTempPath,aImagePath)
+    except BaseException:
+        if os.path.exists(myTempPath):
+            os.remove(myTempPath)
+        raise
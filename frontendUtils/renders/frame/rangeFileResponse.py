@@ -0,0 +1,103 @@
+import os
+import re
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+# Files under l1/<hash>/ never change for a given hash, so they can be cached for good
+IMMUTABLE_CACHE_CONTROL='private, max-age=31536000, immutable'
+
+READ_CHUNK_SIZE=256*1024
+
+_RANGE_PATTERN=re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def rangeFileResponse(aPath: str,aRequestHeaders: dict,aETag: str,aMediaType: str,aExtraHeaders: dict=None,
+                      aFileStorage=None,aSize: int=None):
+    """
+    Serve a file honoring conditional and Range requests
+
+    aETag must be a strong validator for the file content (for l1 files the content
+    hash). If-None-Match answers 304; a single Range answers 206 with just those
+    bytes, so a viewer can fetch a linearized PDF progressively. Multi-range and
+    If-Range mismatches fall back to the full file, as RFC 9110 allows.
+
+    With a non-local aFileStorage (and the file's aSize) the bytes are streamed
+    from the backend with ranged reads instead of a fetched local copy, so a
+    viewer's first page doesn't wait for the whole object to download.
+    """
+    myRequestHeaders={k.lower():v for k,v in (aRequestHeaders or {}).items()}
+    myHeaders={
+        'ETag':aETag,
+        'Accept-Ranges':'bytes',
+        'Cache-Control':IMMUTABLE_CACHE_CONTROL,
+        **(aExtraHeaders or {})
+    }
+
+    if _etagMatches(myRequestHeaders.get('if-none-match'),aETag):
+        return Response(status_code=304,headers=myHeaders)
+
+    myRemote=aFileStorage is not None and not aFileStorage.isLocal
+    mySize=aSize if aSize is not None else os.path.getsize(aPath)
+
+    def fullResponse():
+        if not myRemote:
+            return FileResponse(aPath,media_type=aMediaType,headers=myHeaders)
+        myHeaders['Content-Length']=str(mySize)
+        return StreamingResponse(aFileStorage.iterRange(aPath,0,mySize-1,READ_CHUNK_SIZE) if mySize else iter([b'']),
+            media_type=aMediaType,headers=myHeaders)
+
+    myRange=myRequestHeaders.get('range')
+    myIfRange=myRequestHeaders.get('if-range')
+    if myRange is None or (myIfRange is not None and myIfRange.strip()!=aETag):
+        return fullResponse()
+
+    myByteRange=_parseRange(myRange,mySize)
+    if myByteRange is None:
+        return fullResponse()
+    if myByteRange is False:
+        raise HTTPException(status_code=416,detail="Requested range not satisfiable",
+            headers={'Content-Range':f'bytes */{mySize}'})
+
+    myStart,myEnd=myByteRange
+    myHeaders['Content-Range']=f'bytes {myStart}-{myEnd}/{mySize}'
+    myHeaders['Content-Length']=str(myEnd-myStart+1)
+    myChunks=aFileStorage.iterRange(aPath,myStart,myEnd,READ_CHUNK_SIZE) if myRemote else _iterFileRange(aPath,myStart,myEnd)
+    return StreamingResponse(myChunks,status_code=206,
+        media_type=aMediaType,headers=myHeaders)
+
+def _etagMatches(aIfNoneMatch: str,aETag: str):
+    if not aIfNoneMatch:
+        return False
+    myTags=[t.strip() for t in aIfNoneMatch.split(',')]
+    # weak comparison is what If-None-Match asks for
+    return '*' in myTags or aETag in [t[2:] if t.startswith('W/') else t for t in myTags]
+
+def _parseRange(aRange: str,aSize: int):
+    """(start, end) inclusive; None to ignore the header (malformed or multi-range); False if unsatisfiable"""
+    myMatch=_RANGE_PATTERN.match(aRange.strip())
+    if myMatch is None:
+        return None
+    myFirst,myLast=myMatch.groups()
+    if myFirst=='' and myLast=='':
+        return None
+    if myFirst=='':
+        # suffix range: the last N bytes
+        mySuffix=int(myLast)
+        if mySuffix==0 or aSize==0:
+            return False
+        return max(aSize-mySuffix,0),aSize-1
+    myStart=int(myFirst)
+    myEnd=aSize-1 if myLast=='' else min(int(myLast),aSize-1)
+    if myStart>=aSize or myStart>myEnd:
+        return False
+    return myStart,myEnd
+
+def _iterFileRange(aPath: str,aStart: int,aEnd: int):
+    with open(aPath,'rb') as f:
+        f.seek(aStart)
+        myRemaining=aEnd-aStart+1
+        while myRemaining>0:
+            myChunk=f.read(min(READ_CHUNK_SIZE,myRemaining))
+            if not myChunk:
+                break
+            myRemaining-=len(myChunk)
+            yield myChunk
@@ -0,0 +1,212 @@
+import os
+import json
+import threading
+import utils.logger as _logger
+logger=_logger.getLogger('dev')
+
+try:
+    import zstandard as zstd
+    ZSTD_AVAILABLE=True
+except ImportError:
+    ZSTD_AVAILABLE=False
+
+# <name>.json is stored as <name>.json.zst (compact JSON, one zstd frame)
+COMPRESSED_SUFFIX='.zst'
+COMPRESSION_LEVEL=int(os.getenv('JSON_ARTIFACT_ZSTD_LEVEL','9'))
+
+# Small files compress poorly on their own, so they use a dictionary trained on the
+# layer's JSON. Larger ones are compressed without it: those are the ones served to
+# the browser as-is (Content-Encoding: zstd), and a browser can't use our dictionary.
+DICTIONARY_MAX_FILE_SIZE=64*1024
+DICTIONARY_SIZE=112*1024
+DICTIONARY_PREFIX='_jsonDictionary-'
+DICTIONARY_SUFFIX='.zdict'
+
+_dictionaries={}
+_dictionariesLock=threading.Lock()
+
+def isCompressionEnabled(aStorageConfig: dict):
+    """storageConfig['compressJSONDumps'] or STORAGE_COMPRESS_JSON (opt-in: not every JSON writer goes through STORAGE yet)"""
+    myEnabled=aStorageConfig.get('compressJSONDumps',os.getenv('STORAGE_COMPRESS_JSON','0') in ('1','true','True'))
+    if myEnabled and not ZSTD_AVAILABLE:
+        logger.warning('zstandard is not installed, JSON dumps are written uncompressed')
+        return False
+    return bool(myEnabled)
+
+def getCompressedPath(aFilePath: str):
+    return aFilePath+COMPRESSED_SUFFIX
+
+def findJSONArtifact(aFilePath: str):
+    """
+    Path holding the content of <name>.json (compressed or plain), or None
+
+    When both exist the newer one wins: a writer outside STORAGE that rewrote the
+    plain file (e.g. a reprocessed document) must not be shadowed by an old .zst.
+    """
+    myCompressedPath=getCompressedPath(aFilePath)
+    try:
+        myCompressedMtime=os.stat(myCompressedPath).st_mtime_ns
+    except OSError:
+        return aFilePath if os.path.exists(aFilePath) else None
+    try:
+        myPlainMtime=os.stat(aFilePath).st_mtime_ns
+    except OSError:
+        return myCompressedPath
+    return aFilePath if myPlainMtime>myCompressedMtime else myCompressedPath
+
+def removeCompressedArtifact(aFilePath: str):
+    """Drop <name>.json.zst after <name>.json was written directly, so readers can't get the old content"""
+    myCompressedPath=getCompressedPath(aFilePath)
+    if os.path.exists(myCompressedPath):
+        os.remove(myCompressedPath)
+
+def isCompressedForTransfer(aCompressedPath: str):
+    """True if the file is a plain zstd frame a browser can decode (no dictionary)"""
+    with open(aCompressedPath,'rb') as f:
+        myHeader=f.read(18) # magic + the largest frame header
+    return zstd.get_frame_parameters(myHeader).dict_id==0
+
+def _getDictionaryPath(aLayerFolder: str,aDictId: int):
+    return os.path.join(aLayerFolder,'%s%d%s'%(DICTIONARY_PREFIX,aDictId,DICTIONARY_SUFFIX))
+
+def _loadDictionary(aDictPath: str):
+    with _dictionariesLock:
+        myDict=_dictionaries.get(aDictPath)
+    if myDict is None:
+        with open(aDictPath,'rb') as f:
+            myDict=zstd.ZstdCompressionDict(f.read())
+        with _dictionariesLock:
+            _dictionaries[aDictPath]=myDict
+    return myDict
+
+def getCurrentDictionary(aLayerFolder: str):
+    """Newest trained dictionary of a layer (dictionaries are never replaced: files keep pointing at theirs by id)"""
+    if aLayerFolder is None or not os.path.isdir(aLayerFolder):
+        return None
+    myDictFiles=[f for f in os.listdir(aLayerFolder) if f.startswith(DICTIONARY_PREFIX) and f.endswith(DICTIONARY_SUFFIX)]
+    if not myDictFiles:
+        return None
+    myNewest=max(myDictFiles,key=lambda f: os.path.getmtime(os.path.join(aLayerFolder,f)))
+    return _loadDictionary(os.path.join(aLayerFolder,myNewest))
+
+def writeJSONArtifact(aFilePath: str,aData,aLayerFolder: str=None):
+    """
+    Write aData as <aFilePath>.zst (atomically) and drop a plain aFilePath left from before
+
+    aLayerFolder is where the layer's dictionaries live; small documents are
+    compressed with the newest one. Returns the path written.
+    """
+    myRaw=json.dumps(aData,separators=(',',':'),ensure_ascii=False).encode('utf-8')
+    myDict=getCurrentDictionary(aLayerFolder) if len(myRaw)<=DICTIONARY_MAX_FILE_SIZE else None
+    myCompressor=zstd.ZstdCompressor(level=COMPRESSION_LEVEL,dict_data=myDict,write_content_size=True)
+    myCompressedPath=getCompressedPath(aFilePath)
+    myTmpPath=myCompressedPath+'.tmp-%d-%d'%(os.getpid(),threading.get_ident())
+    try:
+        with open(myTmpPath,'wb') as f:
+            f.write(myCompressor.compress(myRaw))
+        os.replace(myTmpPath,myCompressedPath)
+    finally:
+        if os.path.exists(myTmpPath):
+            os.remove(myTmpPath)
+    if os.path.exists(aFilePath):
+        os.remove(aFilePath)
+    return myCompressedPath
+
+def readCompressedBytes(aCompressedPath: str):
+    """Decompressed content of a .json.zst file"""
+    with open(aCompressedPath,'rb') as f:
+        myData=f.read()
+    myDictId=zstd.get_frame_parameters(myData).dict_id
+    myDict=None
+    if myDictId:
+        myDict=_loadDictionary(_findDictionaryPath(aCompressedPath,myDictId))
+    return zstd.ZstdDecompressor(dict_data=myDict).decompress(myData)
+
+def _findDictionaryPath(aCompressedPath: str,aDictId: int):
+    """The dictionary a file was written with, from the nearest parent folder that has it"""
+    myFolder=os.path.dirname(os.path.abspath(aCompressedPath))
+    while True:
+        myDictPath=_getDictionaryPath(myFolder,aDictId)
+        if os.path.exists(myDictPath):
+            return myDictPath
+        myParent=os.path.dirname(myFolder)
+        if myParent==myFolder:
+            raise FileNotFoundError(f"zstd dictionary {aDictId} for {aCompressedPath} not found")
+        myFolder=myParent
+
+def readJSONArtifact(aFilePath: str):
+    """Load <name>.json from its compressed or plain file"""
+    myPath=findJSONArtifact(aFilePath)
+    if myPath is None:
+        raise FileNotFoundError(aFilePath)
+    if myPath==aFilePath:
+        with open(myPath,'r') as f:
+            return json.load(f)
+    return json.loads(readCompressedBytes(myPath))
+
+def trainDictionary(aLayerFolder: str,aMaxSamples: int=2000):
+    """Train a dictionary on the layer's small JSON documents (plain or compressed); returns its path"""
+    mySamples=[]
+    for myRoot,_,myFileNames in os.walk(aLayerFolder):
+        for myFileName in myFileNames:
+            if len(mySamples)>=aMaxSamples:
+                break
+            myPath=os.path.join(myRoot,myFileName)
+            try:
+                if myFileName.endswith('.json'):
+                    with open(myPath,'r') as f:
+                        myData=json.load(f)
+                elif myFileName.endswith('.json'+COMPRESSED_SUFFIX):
+                    myData=json.loads(readCompressedBytes(myPath))
+                else:
+                    continue
+            except (OSError,ValueError) as e:
+                logger.info('skipping %s for dictionary training: %s'%(myPath,str(e)))
+                continue
+            myRaw=json.dumps(myData,separators=(',',':'),ensure_ascii=False).encode('utf-8')
+            if len(myRaw)<=DICTIONARY_MAX_FILE_SIZE:
+                mySamples.append(myRaw)
+    if len(mySamples)<10:
+        raise Exception(f"Need at least 10 small JSON documents in {aLayerFolder} to train a dictionary, found {len(mySamples)}")
+    myDict=zstd.train_dictionary(DICTIONARY_SIZE,mySamples)
+    myDictPath=_getDictionaryPath(aLayerFolder,myDict.dict_id())
+    with open(myDictPath,'wb') as f:
+        f.write(myDict.as_bytes())
+    logger.info('trained zstd dictionary %s on %d documents'%(myDictPath,len(mySamples)))
+    return myDictPath
+
+def compressJSONFile(aFilePath: str,aLayerFolder: str=None):
+    """Replace a plain .json written by code outside STORAGE with its .json.zst; returns the new path"""
+    with open(aFilePath,'r') as f:
+        myData=json.load(f)
+    return writeJSONArtifact(aFilePath,myData,aLayerFolder)
+
+def compressLayer(aLayerFolder: str):
+    """Convert every plain .json in a layer to .json.zst; returns (files, bytes before, bytes after)"""
+    myCount,myBefore,myAfter=0,0,0
+    for myRoot,_,myFileNames in os.walk(aLayerFolder):
+        for myFileName in myFileNames:
+            if not myFileName.endswith('.json'):
+                continue
+            myPath=os.path.join(myRoot,myFileName)
+            mySize=os.path.getsize(myPath)
+            try:
+                myCompressedPath=compressJSONFile(myPath,aLayerFolder)
+            except (OSError,ValueError) as e:
+                logger.info('skipping %s: %s'%(myPath,str(e)))
+                continue
+            myBefore+=mySize
+            myAfter+=os.path.getsize(myCompressedPath)
+            myCount+=1
+    return myCount,myBefore,myAfter
+
+if __name__=='__main__':
+    import sys
+    if len(sys.argv)==3 and sys.argv[1] in ('train','compress'):
+        if sys.argv[1]=='train':
+            print(trainDictionary(sys.argv[2]))
+        else:
+            myCount,myBefore,myAfter=compressLayer(sys.argv[2])
+            print(f"compressed {myCount} files: {myBefore} -> {myAfter} bytes")
+    else:
+        print("Usage: python jsonArtifacts.py train|compress <layerFolder>")
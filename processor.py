@@ -10,8 +10,7 @@ def processBox(aUBI:str,aClient:str,aSLABox:dict,aTaskConfig:dict,aRunDate:str,a
     myBox.setConfig(myConfig,aStorage)
     myResult=myBox.process()
     if myResult['status']=='success':
-        for myDataOp in myResult['dataOps']:
-            aStorage.doDataOperation(myDataOp)
+        aStorage.doDataOperations(myResult['dataOps'])
 
     if myResult['status'] in ['success','skipped']:
         boxesPostProcess=aSLABox.get('boxesPostProcess',[])
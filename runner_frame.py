@@ -10,11 +10,22 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 aithon_frame_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frameEngine')
 sys.path.append(aithon_frame_path)
 
-# Queue system
-QUEUE_FILE = Path("queue/queue.json")
+# Queue system (SQLite-backed; legacy queue/queue.json is imported on first use)
+from utils.localQueue import get_local_queue
+from utils.fileMetaStore import get_file_meta_store
+from utils.statusSync import enable_event_sync
+from jsonArtifacts import isCompressionEnabled, compressJSONFile, readJSONArtifact
+
+# File statuses follow the queue transitions this process makes
+enable_event_sync()
+
 UPLOAD_DIR = Path("data/frameDemo/l0")
 LAST_SCAN_FILE = Path("queue/last_scan.json")
 
+# Full directory rescan interval when upload events are available (safety net for missed events)
+SAFETY_SCAN_INTERVAL = int(os.getenv("RUNNER_SAFETY_SCAN_INTERVAL", "60"))
+STUCK_RESET_INTERVAL = 60
+
 # Global variable to hold the orchestrator instance
 orchestrator = None
 
@@ -49,11 +60,8 @@ def initialize_orchestrator():
         raise e
 
 def init_queue():
-    """Initialize queue file"""
-    QUEUE_FILE.parent.mkdir(exist_ok=True)
-    if not QUEUE_FILE.exists():
-        with open(QUEUE_FILE, 'w') as f:
-            json.dump([], f)
+    """Initialize queue storage"""
+    get_local_queue()
 
 def get_last_scan_time():
     """Get the last scan time"""
@@ -73,29 +81,12 @@ def update_last_scan_time():
         json.dump({"last_scan_time": time.time()}, f)
 
 def get_next_file_from_queue():
-    """Get next pending file from queue"""
-    if not QUEUE_FILE.exists():
-        return None
-    
+    """Get next pending file from queue (atomically marked as processing)"""
     try:
-        with open(QUEUE_FILE, 'r') as f:
-            queue = json.load(f)
-    except:
+        return get_local_queue().claim_next()
+    except Exception as e:
+        print(f"⚠️  Failed to read queue: {e}")
         return None
-    
-    # Find first pending file
-    for i, item in enumerate(queue):
-        if item.get("status") == "pending":
-            # Mark as processing
-            queue[i]["status"] = "processing"
-            queue[i]["processing_started_at"] = time.time()
-            
-            # Save updated queue
-            with open(QUEUE_FILE, 'w') as f:
-                json.dump(queue, f, indent=2)
-            
-            return item
-    return None
 
 def get_file_hash(file_path: str):
     """Calculate SHA256 hash of file"""
@@ -112,67 +103,56 @@ def get_file_hash(file_path: str):
 def get_file_completion_status(filename: str, file_path: str = None):
     """Check if file is already completed - ENHANCED with hash comparison"""
     
-    # Check allFileMeta.json FIRST (for fresh uploads)
-    allmeta_path = Path("data/frameDemo/ldummy/allFileMeta.json")
-    if allmeta_path.exists():
-        try:
-            with open(allmeta_path, 'r') as f:
-                allmeta = json.load(f)
-            
-            if filename in allmeta:
-                meta_status = allmeta[filename].get("status", "")
-                stored_hash = allmeta[filename].get("fileHash", "")
-                
-                # If file path provided, compare hashes
-                if file_path and stored_hash:
-                    current_hash = get_file_hash(file_path)
-                    if current_hash and current_hash != stored_hash:
-                        return {
-                            "exists_in_queue": False,
-                            "exists_in_meta": True,
-                            "status": "content_changed",
-                            "is_completed": False,
-                            "should_skip": False,
-                            "source": "meta_hash_diff",
-                            "hash_changed": True
-                        }
-                
-                return {
-                    "exists_in_queue": False,
-                    "exists_in_meta": True,
-                    "status": meta_status,
-                    "is_completed": meta_status == "Processed",
-                    "should_skip": meta_status == "Processed",
-                    "source": "meta",
-                    "hash_match": True if file_path and stored_hash and get_file_hash(file_path) == stored_hash else None
-                }
-        except:
-            pass
-    
-    # Check queue.json as secondary source (for files not in meta)
-    if QUEUE_FILE.exists():
-        try:
-            with open(QUEUE_FILE, 'r') as f:
-                queue = json.load(f)
+    # Check the file metadata store FIRST (for fresh uploads)
+    try:
+        file_meta = get_file_meta_store().get(filename)
+        
+        if file_meta is not None:
+            meta_status = file_meta.get("status") or ""
+            stored_hash = file_meta.get("fileHash") or ""
             
-            # Find latest entry for this file
-            latest_entry = None
-            for item in queue:
-                if item["filename"] == filename:
-                    if latest_entry is None or item.get("timestamp", 0) > latest_entry.get("timestamp", 0):
-                        latest_entry = item
+            # If file path provided, compare hashes
+            if file_path and stored_hash:
+                current_hash = get_file_hash(file_path)
+                if current_hash and current_hash != stored_hash:
+                    return {
+                        "exists_in_queue": False,
+                        "exists_in_meta": True,
+                        "status": "content_changed",
+                        "is_completed": False,
+                        "should_skip": False,
+                        "source": "meta_hash_diff",
+                        "hash_changed": True
+                    }
             
-            if latest_entry:
-                status = latest_entry.get("status", "")
-                return {
-                    "exists_in_queue": True,
-                    "status": status,
-                    "is_completed": status == "completed",
-                    "should_skip": status in ["completed", "pending", "processing"],
-                    "source": "queue"
-                }
-        except:
-            pass
+            return {
+                "exists_in_queue": False,
+                "exists_in_meta": True,
+                "status": meta_status,
+                "is_completed": meta_status == "Processed",
+                "should_skip": meta_status == "Processed",
+                "source": "meta",
+                "hash_match": True if file_path and stored_hash and get_file_hash(file_path) == stored_hash else None
+            }
+    except:
+        pass
+    
+    # Check the queue as secondary source (for files not in meta)
+    try:
+        # Find latest entry for this file
+        latest_entry = get_local_queue().latest_entry(filename)
+        
+        if latest_entry:
+            status = latest_entry.get("status", "")
+            return {
+                "exists_in_queue": True,
+                "status": status,
+                "is_completed": status == "completed",
+                "should_skip": status in ["completed", "pending", "processing"],
+                "source": "queue"
+            }
+    except:
+        pass
     
     # File not found anywhere - should be added to queue
     return {
@@ -195,62 +175,20 @@ def add_file_to_queue(file_path: str, filename: str):
         # File is already completed or in queue
         return False
     
-    # Load existing queue
-    with open(QUEUE_FILE, 'r') as f:
-        queue = json.load(f)
-    
     # Add new file
-    queue_entry = {
-        "file_path": file_path,
-        "filename": filename,
-        "timestamp": time.time(),
-        "status": "pending"
-    }
-    
-    queue.append(queue_entry)
-    
-    # Save updated queue
-    with open(QUEUE_FILE, 'w') as f:
-        json.dump(queue, f, indent=2)
+    get_local_queue().enqueue(file_path, filename)
     
     return True
 
 def mark_file_completed(filename: str, status: str = "completed", error_message: str = None):
     """Mark file as completed in queue"""
-    if not QUEUE_FILE.exists():
-        return
-    
-    with open(QUEUE_FILE, 'r') as f:
-        queue = json.load(f)
-    
-    # Find and update file status
-    for item in queue:
-        if item["filename"] == filename and item["status"] == "processing":
-            item["status"] = status
-            item["completed_at"] = time.time()
-            if error_message:
-                item["error_message"] = error_message
-            break
-    
-    # Save updated queue
-    with open(QUEUE_FILE, 'w') as f:
-        json.dump(queue, f, indent=2)
+    get_local_queue().mark_completed(filename, status, error_message)
 
 def update_file_meta_with_classification(filename: str, backend_output_path: Path):
-    """Update allFileMeta.json with AI-classified document type"""
+    """Update the file metadata store with AI-classified document type"""
     try:
-        # Initialize storage to access allFileMeta.json
-        from storage import STORAGE
-        
-        myStorageConfig = {
-            'defaultFileStorage': 'onPrem',
-        }
-        client = 'frameDemo'
-        myStorage = STORAGE(client, myStorageConfig)
-        
         # Read forFrontend.json to get AI classification
-        with open(backend_output_path, 'r') as f:
-            frontend_data = json.load(f)
+        frontend_data = readJSONArtifact(str(backend_output_path))
         
         # Extract the AI-classified document type
         ai_document_type = frontend_data.get("document_details", {}).get("file_type", "Unknown")
@@ -265,21 +203,14 @@ def update_file_meta_with_classification(filename: str, backend_output_path: Pat
         }
         user_friendly_type = file_type_mapping.get(ai_document_type, ai_document_type)
         
-        # Get existing allFileMeta.json
-        try:
-            existing_meta = myStorage.getJSONDump('ldummy', '', 'allFileMeta')
-            if not isinstance(existing_meta, dict):
-                existing_meta = {}
-        except Exception as e:
-            existing_meta = {}
-        
-        # Update or add the file to allFileMeta
-        if filename in existing_meta:
+        # Update or add the file in the metadata store (single-row write)
+        fileMetaStore = get_file_meta_store()
+        existing_meta = fileMetaStore.get(filename)
+        if existing_meta is not None:
             # Update existing file
-            old_type = existing_meta[filename].get("fileType", "Unknown")
-            old_status = existing_meta[filename].get("status", "Unknown")
-            existing_meta[filename]["fileType"] = user_friendly_type
-            existing_meta[filename]["status"] = "Processed"
+            old_type = existing_meta.get("fileType") or "Unknown"
+            old_status = existing_meta.get("status") or "Unknown"
+            fileMetaStore.update(filename, fileType=user_friendly_type, status="Processed")
             print(f"📝 Updated: {filename} ({old_type} → {user_friendly_type}, {old_status} → Processed)")
         else:
             # Add new file that was processed by runner
@@ -294,55 +225,23 @@ def update_file_meta_with_classification(filename: str, backend_output_path: Pat
             else:
                 file_hash = "unknown"
             
-            existing_meta[filename] = {
+            fileMetaStore.put(filename, {
                 "fileHash": file_hash,
                 "fileType": user_friendly_type,
                 "status": "Processed",
                 "fileName": filename
-            }
+            })
             print(f"📝 Added new file: {filename} (Type: {user_friendly_type}, Status: Processed)")
-        
-        # Save updated allFileMeta.json
-        myMetaOp = {
-            "dataTypeToSaveAs": "JSONDump",
-            "opParams": {
-                "layerName": "ldummy",
-                "folderArray": [],
-                "operation": "replace"
-            },
-            "data": existing_meta,
-            "key": "allFileMeta"
-        }
-        myStorage.doDataOperation(myMetaOp)
             
     except Exception as e:
-        print(f"⚠️  Failed to update allFileMeta.json: {e}")
+        print(f"⚠️  Failed to update file metadata: {e}")
 
 def reset_stuck_processing_files():
     """Reset files that have been stuck in processing for too long"""
-    if not QUEUE_FILE.exists():
-        return
-    
-    current_time = time.time()
     timeout = 600  # 10 minutes timeout
     
-    with open(QUEUE_FILE, 'r') as f:
-        queue = json.load(f)
-    
-    updated = False
-    for item in queue:
-        if (item.get("status") == "processing" and 
-            "processing_started_at" in item and 
-            current_time - item["processing_started_at"] > timeout):
-            
-            print(f"⚠️  Resetting stuck file: {item['filename']}")
-            item["status"] = "pending"
-            item.pop("processing_started_at", None)
-            updated = True
-    
-    if updated:
-        with open(QUEUE_FILE, 'w') as f:
-            json.dump(queue, f, indent=2)
+    for filename in get_local_queue().reset_stuck(timeout):
+        print(f"⚠️  Resetting stuck file: {filename}")
 
 def process_file_with_orchestrator(file_path: str, filename: str):   
     return True
@@ -368,10 +267,6 @@ def process_file_with_orchestrator(file_path: str, filename: str):
         # Initialize orchestrator if not already done
         current_orchestrator = initialize_orchestrator()
         
-        # Sync status before processing starts
-        from utils.statusSync import sync_file_statuses
-        sync_file_statuses()
-        
         print(f"🔄 Starting orchestrator pipeline...")
         
         # Change to aithon_frame_RC directory so schemas are found
@@ -383,8 +278,6 @@ def process_file_with_orchestrator(file_path: str, filename: str):
         finally:
             # Always restore original directory
             os.chdir(original_cwd)
-            # Sync status after processing completes
-            sync_file_statuses()
         
         if result.get("success"):
             # Look for output JSON - use same directory as OutputBox
@@ -398,7 +291,7 @@ def process_file_with_orchestrator(file_path: str, filename: str):
                 print(f"✅ Processing completed successfully")
                 print(f"📊 Traditional output saved to: {output_path}")
                 
-                # Check for backend output (forfronted.json) and update allFileMeta.json
+                # Check for backend output (forfronted.json) and update the file metadata store
                 try:
                     # Calculate file hash using the same file that was processed (dest_path)
                     # This ensures hash consistency with OutputBox calculations
@@ -423,9 +316,13 @@ def process_file_with_orchestrator(file_path: str, filename: str):
                     if backend_output_path.exists():
                         print(f"✅ Backend output found and verified!")
                         
-                        # Update allFileMeta.json with AI-classified document type
+                        # Update the file metadata store with AI-classified document type
                         update_file_meta_with_classification(filename, backend_output_path)
                         
+                        # Store it as .json.zst (served to the viewer with Content-Encoding: zstd)
+                        if isCompressionEnabled({}):
+                            compressJSONFile(str(backend_output_path), str(backend_base_dir))
+                        
                     else:
                         print(f"⚠️  Backend output not found at: {backend_output_path}")
                         # List what files are actually in the directory for debugging
@@ -476,23 +373,32 @@ def scan_for_new_uploads():
         file_mod_time = file_path.stat().st_mtime
         
         # If file was modified after last scan, it's new
-        if file_mod_time > last_scan_time:
-            filename = file_path.name
-            status_info = get_file_completion_status(filename, str(file_path))
-            
-            if not status_info["should_skip"]:
-                # Add to queue using smart logic
-                if add_file_to_queue(str(file_path), filename):
-                    new_files.append(file_path)
-                    if status_info.get("hash_changed"):
-                        print(f"📤 New file with updated content queued: {filename}")
-                    else:
-                        print(f"📤 New file detected and queued: {filename}")
-                else:
-                    print(f"⚠️  New file detected but failed to queue: {filename}")
+        if file_mod_time > last_scan_time and queue_uploaded_file(file_path):
+            new_files.append(file_path)
     
     return new_files
 
+def queue_uploaded_file(file_path: Path) -> bool:
+    """Queue a single uploaded file unless it is already completed or queued"""
+    if not file_path.exists():
+        return False
+    
+    filename = file_path.name
+    status_info = get_file_completion_status(filename, str(file_path))
+    if status_info["should_skip"]:
+        return False
+    
+    # Add to queue using smart logic
+    if add_file_to_queue(str(file_path), filename):
+        if status_info.get("hash_changed"):
+            print(f"📤 New file with updated content queued: {filename}")
+        else:
+            print(f"📤 New file detected and queued: {filename}")
+        return True
+    
+    print(f"⚠️  New file detected but failed to queue: {filename}")
+    return False
+
 def add_existing_files_to_queue():
     """SMART VERSION: Only add files that are not already completed"""
     if not UPLOAD_DIR.exists():
@@ -558,8 +464,13 @@ def main():
     print("🛑 Press Ctrl+C to stop monitoring")
     print("-" * 50)
     
+    # Upload events wake the loop immediately; the periodic scan only catches missed events
+    from utils.uploadWatcher import UploadWatcher
+    watcher = UploadWatcher(UPLOAD_DIR)
+    scan_interval = SAFETY_SCAN_INTERVAL if watcher.available else 10
+    
     last_scan_time = 0
-    scan_interval = 10  # Check for new files every 10 seconds
+    last_reset_time = time.time()
     
     while True:
         current_time = time.time()
@@ -589,7 +500,8 @@ def main():
             continue
         
         # Step 2: Scan for new uploads (but only every scan_interval seconds)
-        if current_time - last_scan_time >= scan_interval:
+        if current_time - last_scan_time >= scan_interval or watcher.overflowed:
+            watcher.overflowed = False
             new_files = scan_for_new_uploads()
             last_scan_time = current_time  # Update scan time regardless
             if new_files:
@@ -599,11 +511,14 @@ def main():
                 continue
         
         # Step 3: Reset stuck files periodically (every 60 seconds)
-        if int(current_time) % 60 == 0:
+        if current_time - last_reset_time >= STUCK_RESET_INTERVAL:
             reset_stuck_processing_files()
+            last_reset_time = current_time
         
-        # Step 4: No new work, wait quietly
-        time.sleep(1)  # Short sleep for responsiveness
+        # Step 4: No new work, block until an upload lands or the next scan/reset is due
+        timeout = min(last_scan_time + scan_interval, last_reset_time + STUCK_RESET_INTERVAL) - time.time()
+        for file_path in watcher.wait(timeout):
+            queue_uploaded_file(file_path)
 
 def run_processing_session():
     """
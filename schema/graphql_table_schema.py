@@ -10,6 +10,7 @@ from typing import List, Optional
 from strawberry.types import Info
 from sqlalchemy import text, func
 from database_models import get_database_manager, DataModelMaster, DataModelDetails, Client
+from athena.schema_catalog import invalidate_schema_catalog
 from datetime import datetime
 import logging
 
@@ -690,6 +691,8 @@ def _updateTableFromDataModel(intdatamodelid: int, session, schema_name: str, ol
                     logger.warning(f"Failed to alter column {col_name} default: {e}")
         
         session.commit()
+        if sql_statements:
+            invalidate_schema_catalog(schema_name)
         
         if sql_statements:
             return True, f"Successfully updated table {schema_name}.{table_name}", sql_statements
@@ -783,6 +786,7 @@ def _createTableFromDataModel(intdatamodelid: int, session, schema_name: str = '
         # Execute CREATE TABLE
         session.execute(text(create_sql))
         session.commit()
+        invalidate_schema_catalog(schema_name)
         
         logger.info(f"Successfully created table: {schema_name}.{table_name}")
         return True, f"Successfully created table {schema_name}.{table_name} for model '{model_name}'", create_sql
@@ -0,0 +1,48 @@
+"""
+Local S3 stand-in for the s3 file storage backend
+
+Starts an in-process moto S3 server, creates the bucket and prints the
+environment variables that point STORAGE at it. Useful to exercise the s3
+backend (conditional lock objects, ranged reads) without a cloud account.
+A MinIO container works the same way through STORAGE_S3_ENDPOINT_URL.
+
+    pip install "moto[server]"
+    python scripts/s3_standin.py --port 5005 --bucket frame-dev
+"""
+import argparse
+import time
+
+import boto3
+from moto.server import ThreadedMotoServer
+
+
+def main():
+    myParser = argparse.ArgumentParser(description="Run a local S3 stand-in for the s3 file storage")
+    myParser.add_argument("--host", default="127.0.0.1")
+    myParser.add_argument("--port", type=int, default=5005)
+    myParser.add_argument("--bucket", default="frame-dev")
+    myArgs = myParser.parse_args()
+
+    myServer = ThreadedMotoServer(ip_address=myArgs.host, port=myArgs.port)
+    myServer.start()
+    myEndpoint = f"http://{myArgs.host}:{myArgs.port}"
+    boto3.client("s3", endpoint_url=myEndpoint, region_name="us-east-1",
+                 aws_access_key_id="test", aws_secret_access_key="test").create_bucket(Bucket=myArgs.bucket)
+
+    print("S3 stand-in running, use it with:")
+    print(f"  export STORAGE_S3_ENDPOINT_URL={myEndpoint}")
+    print(f"  export STORAGE_S3_BUCKET={myArgs.bucket}")
+    print("  export STORAGE_S3_REGION=us-east-1")
+    print("  export AWS_ACCESS_KEY_ID=test AWS_SECRET_ACCESS_KEY=test")
+    print("and set defaultFileStorage to 's3' in the storage config. Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        myServer.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -106,6 +106,8 @@ import time
 # Import NAV validation utilities
 from utils.navValidationUtils import getNAVValidationData
 from utils.file_config_reader import readFileConfigs, getDocumentTypes, getDocumentById, createDocumentType, deleteDocumentType
+from utils.fileMetaStore import get_file_meta_store
+from utils.tableCache import get_table_cache
 
 # Import file processing utilities
 from runner_frame import process_file_with_orchestrator
@@ -113,6 +115,10 @@ from runner_frame import process_file_with_orchestrator
 # Import file queue service
 from server.APIServerUtils.file_queue_service import FileQueueService
 from server.APIServerUtils.rabbitmq_service import RabbitMQService
+from server.APIServerUtils.upload_ingest import (IngestedFile, UPLOAD_CHUNK_SIZE, ingest_upload, ingest_upload_batch,
+                                                is_plain_filename, link_into_layer, sniff_file)
+from server.APIServerUtils.upload_sessions import UploadSessionError, get_upload_session_store
+from starlette.concurrency import run_in_threadpool
 from server.APIServerUtils.queue_processor import start_queue_processor, stop_queue_processor
 
 # Import schema middleware
@@ -351,6 +357,8 @@ if environment == "dev":
         allow_credentials=True,
         allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
         allow_headers=["*"],
+        # the PDF viewer reads these to stream by range; resumable uploads resume from Upload-Offset
+        expose_headers=["Accept-Ranges", "Content-Range", "Content-Length", "ETag", "Upload-Offset"],
     )
 
 # Add whitelist middleware
@@ -631,6 +639,7 @@ async def root(__username: str = Depends(authenticate_user)):
 async def getFrontEndResponse(request: Request, *, __username: str = Depends(authenticate_user)):
     params={
         'query':dict(request.query_params),
+        'headers':dict(request.headers),
         'username':__username
     }
     myResponse=await server.APIServerUtils.frontend.getResponse(params)
@@ -657,6 +666,23 @@ async def shutdown_event():
 def health_check():
     return JSONResponse(content={"status": "ok"})
 
+@app.get("/health/storage-cache", tags=["Health"])
+def storage_cache_stats():
+    """Hit rate, size and eviction counters of the in-process STORAGE read cache"""
+    return JSONResponse(content=get_table_cache().get_stats())
+
+@app.get("/health/db-pool", tags=["Health"])
+def db_pool_stats(*, __username: str = Depends(authenticate_user)):
+    """Connection pool state and checkout counters of the shared Athena database engines"""
+    from athena.db_engine import get_engine_registry
+    return JSONResponse(content=get_engine_registry().get_pool_stats())
+
+@app.get("/health/schema-catalog", tags=["Health"])
+def schema_catalog_stats(*, __username: str = Depends(authenticate_user)):
+    """Tables and value samples cached per schema by the Athena schema catalog, with build/check times"""
+    from athena.schema_catalog import get_schema_catalog
+    return JSONResponse(content=get_schema_catalog().get_catalog_stats())
+
 @app.get("/test-profanity-filter", tags=["Testing"])
 async def test_profanity_filter():
     """Test endpoint to verify profanity filtering is working"""
@@ -1403,6 +1429,244 @@ async def get_validation_cache_info(*, __username: str = Depends(authenticate_us
         )
 
 # Upload file API for dashboard file uploads and details 
+def _guess_file_type(filename: str) -> str:
+    """Display file type from the file name (AI classification replaces it after processing)"""
+    filename_lower = filename.lower()
+    if "statement" in filename_lower:
+        return "Fund Statement"
+    elif "capcall" in filename_lower or "capital_call" in filename_lower:
+        return "Capital Call Notice"
+    elif "distribution" in filename_lower:
+        return "Distribution Notice"
+    elif "factsheet" in filename_lower:
+        return "Fund Fact Sheet"
+    elif "ppm" in filename_lower:
+        return "Private Placement Memorandum"
+    elif "k1" in filename_lower:
+        return "K1"
+    elif filename_lower.endswith('.pdf'):
+        return "PDF Document"
+    elif filename_lower.endswith('.txt'):
+        return "Text Document"
+    elif filename_lower.endswith(('.csv', '.xlsx', '.xls')):
+        return "Spreadsheet"
+    elif filename_lower.endswith('.json'):
+        return "JSON Document"
+    else:
+        return "Document"
+
+def _describe_ingested_file(ingested: IngestedFile) -> Dict[str, Any]:
+    """l1 fileMetaData for an ingested file"""
+    from PyPDF2 import PdfReader
+    from utils.unclassified import getISO8601FromPDFDate
+
+    myMetaData = {
+        'typeName': ingested.mime_type,
+        'fileHash': ingested.sha256,
+        'fileOriginalName': ingested.filename,
+        'fileOriginalPath': ingested.path,
+        "typeSpecificParams": {}
+    }
+    
+    if myMetaData['typeName'] == 'application/pdf':
+        try:
+            reader = PdfReader(ingested.path)
+            myMetaData['typeSpecificParams']['numPages'] = len(reader.pages)
+            myMetaData['typeSpecificParams']['EXIF'] = {}
+            if reader.metadata is not None:
+                for key, value in reader.metadata.items():
+                    if key in ['/CreationDate', '/ModDate']:
+                        myMetaData['typeSpecificParams']['EXIF'][key] = getISO8601FromPDFDate(value)
+                    else:
+                        myMetaData['typeSpecificParams']['EXIF'][key] = value
+        except Exception as e:
+            myMetaData['typeSpecificParams']['error'] = f"Could not read PDF metadata: {str(e)}"
+    return myMetaData
+
+def _place_in_l1(myStorage, ingested: IngestedFile) -> Optional[Dict[str, Any]]:
+    """Create l1/<hash>/ (fileMetaData + rawFile linked to the l0 file) unless it exists; returns the l1 metadata"""
+    if myStorage.fileExists(myStorage.getLocalFilePath('l1', ingested.sha256)):
+        try:
+            return myStorage.getJSONDump('l1', [ingested.sha256], 'fileMetaData')
+        except Exception:
+            return None
+
+    myMetaData = _describe_ingested_file(ingested)
+    hash_dir = myStorage.getDir('l1', [ingested.sha256])
+    myMetaDataOp = {
+        "dataTypeToSaveAs": "JSONDump",
+        "opParams": {
+            "layerName": "l1",
+            "folderArray": [ingested.sha256],
+            "operation": "replace"
+        },
+        "data": myMetaData,
+        "key": "fileMetaData"
+    }
+    myStorage.doDataOperation(myMetaDataOp)
+    
+    # Place file in l1 layer with proper extension (hardlink/reflink, no second write of the data)
+    file_extension = os.path.splitext(ingested.filename)[1] or '.pdf'
+    raw_file_path = os.path.join(hash_dir, f'rawFile{file_extension}')
+    link_into_layer(ingested.path, raw_file_path)
+    myStorage.publishLocalFile(raw_file_path)
+    return myMetaData
+
+def _create_document_entries(uploads: List[Dict[str, Any]], folder: str, storage_type: str, source: str,
+                             file_classification: str, username: str) -> List[tuple]:
+    """
+    Insert the Document rows for a batch of uploads in one session
+
+    Each upload is {'ingested', 'file_type', 'metaData'}. Returns (document_id, doc_id)
+    per upload, (None, None) for all of them if the insert fails.
+    """
+    try:
+        new_documents = []
+        for upload in uploads:
+            ingested = upload['ingested']
+            myMetaData = upload['metaData']
+            # Prepare metadata for document
+            document_metadata = {
+                "fileHash": ingested.sha256,
+                "fileOriginalName": ingested.filename,
+                "fileOriginalPath": ingested.path,
+                "folder": folder,
+                "storage_type": storage_type,
+                "source": source,
+                "file_classification": file_classification
+            }
+            
+            # Add metadata from myMetaData if it exists
+            if myMetaData:
+                document_metadata.update({
+                    "typeName": myMetaData.get('typeName'),
+                    "typeSpecificParams": myMetaData.get('typeSpecificParams', {})
+                })
+            
+            new_documents.append(Document(
+                name=ingested.filename,
+                type=upload['file_type'],
+                path=ingested.path,
+                size=ingested.size,
+                status='pending',
+                created_by=username,
+                document_metadata=document_metadata
+            ))
+        
+        # Create document entries in database
+        db_manager = get_database_manager()
+        session = db_manager.get_session()
+        
+        try:
+            session.add_all(new_documents)
+            session.commit()
+            
+            result = []
+            for new_document in new_documents:
+                logger.info(f"Created document entry in database: ID={new_document.id}, doc_id={new_document.doc_id}, filename={new_document.name}")
+                result.append((new_document.id, str(new_document.doc_id)))
+            return result
+            
+        except Exception as db_error:
+            session.rollback()
+            logger.warning(f"Failed to create document entries in database: {db_error}. File upload will continue.")
+        finally:
+            session.close()
+            
+    except Exception as e:
+        # Log error but don't fail the upload
+        logger.warning(f"Error creating document entries: {e}. File upload will continue.")
+    return [(None, None)] * len(uploads)
+
+def _register_uploaded_batch(myStorage, ingested_files: List[IngestedFile], folder: str, storage_type: str,
+                             source: str, file_classification: str, username: str) -> List[Dict[str, Any]]:
+    """
+    Everything after the bytes are on disk, for a whole batch at once
+
+    One state write, one l1 entry per distinct content hash, one metadata
+    transaction, one Document session and one queue transaction, however many
+    files are in the batch. Returns the per-file response dicts in order.
+    """
+    if not ingested_files:
+        return []
+    # The upload landed in the local l0 folder; make it visible to workers on other hosts
+    for ingested in ingested_files:
+        myStorage.publishLocalFile(ingested.path)
+    myDataOp = {
+        "dataTypeToSaveAs": "statusUpdate",
+        "opParams": {
+            "layerName": "l2",
+            "trackerName": "processedFiles", 
+            "operation": "replaceOrAppendByKey",
+            "key": [ingested.filename for ingested in ingested_files]
+        }
+    }
+    myStorage.doDataOperations([myDataOp])
+    
+    # Always process the file for l1 layer if not already processed (once per content hash)
+    myMetaDataByHash = {}
+    for ingested in ingested_files:
+        if ingested.sha256 not in myMetaDataByHash:
+            myMetaDataByHash[ingested.sha256] = _place_in_l1(myStorage, ingested)
+    
+    # Always update the file metadata store regardless of whether file was already in l1
+    uploads = [{"ingested": ingested, "file_type": _guess_file_type(ingested.filename),
+                "metaData": myMetaDataByHash[ingested.sha256]} for ingested in ingested_files]
+    get_file_meta_store().put_many({
+        upload["ingested"].filename: {
+            "fileHash": upload["ingested"].sha256,
+            "fileType": upload["file_type"],
+            "status": "Processed",
+            "fileName": upload["ingested"].filename
+        } for upload in uploads
+    })
+    
+    document_ids = _create_document_entries(uploads, folder, storage_type, source, file_classification, username)
+    
+    # Add files to processing queue instead of processing immediately
+    queue_service = RabbitMQService()
+    try:
+        queue_entries = queue_service.add_files_to_queue([{
+            "filename": ingested.filename,
+            "file_path": ingested.path,
+            "file_hash": ingested.sha256,
+            "folder": folder,
+            "storage_type": storage_type,
+            "source": source,
+            "file_classification": file_classification,
+            "username": username
+        } for ingested in ingested_files])
+    finally:
+        queue_service.close()
+    
+    responses = []
+    for ingested, queue_entry, (document_id, doc_id) in zip(ingested_files, queue_entries, document_ids):
+        response_data = {
+            "response": True,
+            "filename": ingested.filename,
+            "message": f"Successfully uploaded {ingested.filename} and added to processing queue. Call /start_processing to process queued files.",
+            "file_size": ingested.size,
+            "file_path": ingested.path,
+            "file_hash": ingested.sha256,
+            "username": username,
+            "queue_id": queue_entry.get('id'),
+            "queue_status": queue_entry.get('status'),
+            "note": "File is queued and will be processed when /start_processing endpoint is called"
+        }
+        
+        # Add document ID if created successfully
+        if document_id:
+            response_data["document_id"] = document_id
+            response_data["doc_id"] = doc_id
+        responses.append(response_data)
+    return responses
+
+def _register_uploaded_file(myStorage, ingested: IngestedFile, folder: str, storage_type: str, source: str,
+                            file_classification: str, username: str) -> Dict[str, Any]:
+    """Everything after the bytes are on disk: state, l1, file metadata, Document row and queue entry"""
+    return _register_uploaded_batch(myStorage, [ingested], folder, storage_type, source,
+                                    file_classification, username)[0]
+
 @app.post("/upload_files", description="Upload files to frameDemo/l0 folder", tags=["file-upload"])
 async def upload_files(
     file: UploadFile = File(...),
@@ -1414,9 +1678,6 @@ async def upload_files(
 ):
     try:
         from storage import STORAGE
-        from utils.unclassified import getFileHash, getISO8601FromPDFDate
-        import filetype
-        from PyPDF2 import PdfReader
         
         myStorageConfig = {
             'defaultFileStorage': 'onPrem',
@@ -1425,250 +1686,163 @@ async def upload_files(
         myStorage = STORAGE(client, myStorageConfig)
         
         target_dir = myStorage.getLayerNFolder('l0')
-        os.makedirs(target_dir, exist_ok=True)
         
         if file.filename is None:
             raise HTTPException(status_code=400, detail="Filename is required")
-        file_path = os.path.join(target_dir, file.filename)      
-              
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        myDataOp = {
-            "dataTypeToSaveAs": "statusUpdate",
-            "opParams": {
-                "layerName": "l2",
-                "trackerName": "processedFiles", 
-                "operation": "replaceOrAppendByKey",
-                "key": [file.filename]
-            }
-        }
-        myStorage.doDataOperation(myDataOp)
+        if not is_plain_filename(file.filename):
+            raise HTTPException(status_code=400, detail="A plain file name is required")
         
-        myHash = getFileHash(file_path)
+        # Single pass: stream to l0 (atomic rename) while hashing and sniffing, off the event loop
+        ingested = await ingest_upload(file, target_dir)
         
-        # Always process the file for l1 layer if not already processed
-        if myHash not in myStorage.getAllLayerNFiles('l1'):
-            fileKind = filetype.guess(file_path)
-            
-            # Handle cases where filetype can't determine the type
-            if fileKind is None:
-                file_extension = os.path.splitext(file.filename)[1].lower()
-                if file_extension == '.txt':
-                    mime_type = 'text/plain'
-                elif file_extension == '.csv':
-                    mime_type = 'text/csv'
-                elif file_extension == '.json':
-                    mime_type = 'application/json'
-                elif file_extension == '.xlsx':
-                    mime_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                elif file_extension == '.xls':
-                    mime_type = 'application/vnd.ms-excel'
-                else:
-                    mime_type = 'application/octet-stream'
-            else:
-                mime_type = fileKind.mime
-            
-            myMetaData = {
-                'typeName': mime_type,
-                'fileHash': myHash,
-                'fileOriginalName': file.filename,
-                'fileOriginalPath': file_path,
-                "typeSpecificParams": {}
-            }
-            
-            if myMetaData['typeName'] == 'application/pdf':
-                try:
-                    reader = PdfReader(file_path)
-                    myMetaData['typeSpecificParams']['numPages'] = len(reader.pages)
-                    myMetaData['typeSpecificParams']['EXIF'] = {}
-                    if reader.metadata is not None:
-                        for key, value in reader.metadata.items():
-                            if key in ['/CreationDate', '/ModDate']:
-                                myMetaData['typeSpecificParams']['EXIF'][key] = getISO8601FromPDFDate(value)
-                            else:
-                                myMetaData['typeSpecificParams']['EXIF'][key] = value
-                except Exception as e:
-                    myMetaData['typeSpecificParams']['error'] = f"Could not read PDF metadata: {str(e)}"
-            
-            hash_dir = myStorage.getDir('l1', [myHash])
-            
-            myMetaDataOp = {
-                "dataTypeToSaveAs": "JSONDump",
-                "opParams": {
-                    "layerName": "l1",
-                    "folderArray": [myHash],
-                    "operation": "replace"
-                },
-                "data": myMetaData,
-                "key": "fileMetaData"
-            }
-            myStorage.doDataOperation(myMetaDataOp)
-            
-            # Copy file to l1 layer with proper extension
-            file_extension = os.path.splitext(file.filename)[1] or '.pdf'
-            raw_file_path = os.path.join(hash_dir, f'rawFile{file_extension}')
-            shutil.copy2(file_path, raw_file_path)
+        # The remaining steps do blocking file/database/broker I/O, keep them off the event loop too
+        response_data = await run_in_threadpool(_register_uploaded_file, myStorage, ingested, folder,
+                                                storage_type, source, file_classification, __username)
+        return JSONResponse(content=response_data)
         
-        # Always update ldummy layer regardless of whether file was already in l1
-        try:
-            existing_ldummy = myStorage.getJSONDump('ldummy', '', 'allFileMeta')
-            if not isinstance(existing_ldummy, dict):
-                existing_ldummy = {}
-        except:
-            existing_ldummy = {}
-        
-        # Determine file type based on filename and MIME type (AI classification will be updated later after processing)
-        filename_lower = file.filename.lower()
-        if "statement" in filename_lower:
-            file_type = "Fund Statement"
-        elif "capcall" in filename_lower or "capital_call" in filename_lower:
-            file_type = "Capital Call Notice" 
-        elif "distribution" in filename_lower:
-            file_type = "Distribution Notice"
-        elif "factsheet" in filename_lower:
-            file_type = "Fund Fact Sheet"
-        elif "ppm" in filename_lower:
-            file_type = "Private Placement Memorandum"
-        elif "k1" in filename_lower:
-            file_type = "K1"
-        elif file.filename.lower().endswith('.pdf'):
-            file_type = "PDF Document"
-        elif file.filename.lower().endswith('.txt'):
-            file_type = "Text Document"
-        elif file.filename.lower().endswith(('.csv', '.xlsx', '.xls')):
-            file_type = "Spreadsheet"
-        elif file.filename.lower().endswith('.json'):
-            file_type = "JSON Document"
-        else:
-            file_type = "Document"
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+@app.post("/upload_files/batch", description="Upload several files to frameDemo/l0 and queue them in one batch", tags=["file-upload"])
+async def upload_files_batch(
+    files: List[UploadFile] = File(...),
+    folder: str = Form("l0"),
+    storage_type: str = Form("local"), 
+    source: str = Form("api"),
+    file_classification: str = Form(""),
+    *, __username: str = Depends(authenticate_user)
+):
+    try:
+        from storage import STORAGE
         
-        existing_ldummy[file.filename] = {
-            "fileHash": myHash,
-            "fileType": file_type,
-            "status": "Processed",
-            "fileName": file.filename
+        myStorageConfig = {
+            'defaultFileStorage': 'onPrem',
         }
+        client = 'frameDemo'
+        myStorage = STORAGE(client, myStorageConfig)
         
-        myLdummyOp = {
-            "dataTypeToSaveAs": "JSONDump",
-            "opParams": {
-                "layerName": "ldummy",
-                "folderArray": [],
-                "operation": "replace"
-            },
-            "data": existing_ldummy,
-            "key": "allFileMeta"
-        }
-        myStorage.doDataOperation(myLdummyOp)
+        target_dir = myStorage.getLayerNFolder('l0')
         
-        # Create document entry in database
-        document_id = None
-        doc_id = None
+        if any(file.filename is None for file in files):
+            raise HTTPException(status_code=400, detail="Filename is required")
+        if not all(is_plain_filename(file.filename) for file in files):
+            raise HTTPException(status_code=400, detail="A plain file name is required")
+        # Same name twice would land on the same l0 path, the second upload silently replacing the first
+        duplicates = sorted({file.filename for file in files if sum(f.filename == file.filename for f in files) > 1})
+        if duplicates:
+            raise HTTPException(status_code=400, detail=f"Duplicate filenames in batch: {', '.join(duplicates)}")
         
-        # Get metadata - it may have been created above, or we need to retrieve it from l1
-        # Try to get metadata from l1 layer (works whether file was just processed or already existed)
-        myMetaData = None
-        try:
-            myMetaData = myStorage.getJSONDump('l1', [myHash], 'fileMetaData')
-        except:
-            # If metadata doesn't exist, we'll create document without it
-            myMetaData = None
+        # Nothing lands in l0 unless every file of the batch was received
+        ingested_files = await ingest_upload_batch(files, target_dir)
         
-        try:
-            # Get file size if not provided
-            file_size = file.size
-            if file_size is None and os.path.exists(file_path):
-                file_size = os.path.getsize(file_path)
-            
-            # Prepare metadata for document
-            document_metadata = {
-                "fileHash": myHash,
-                "fileOriginalName": file.filename,
-                "fileOriginalPath": file_path,
-                "folder": folder,
-                "storage_type": storage_type,
-                "source": source,
-                "file_classification": file_classification
-            }
-            
-            # Add metadata from myMetaData if it exists
-            if myMetaData:
-                document_metadata.update({
-                    "typeName": myMetaData.get('typeName'),
-                    "typeSpecificParams": myMetaData.get('typeSpecificParams', {})
-                })
-            
-            # Create document entry in database
-            db_manager = get_database_manager()
-            session = db_manager.get_session()
-            
-            try:
-                new_document = Document(
-                    name=file.filename,
-                    type=file_type,
-                    path=file_path,
-                    size=file_size,
-                    status='pending',
-                    created_by=__username,
-                    document_metadata=document_metadata
-                )
-                
-                session.add(new_document)
-                session.commit()
-                session.refresh(new_document)
-                
-                document_id = new_document.id
-                doc_id = str(new_document.doc_id)
-                
-                logger.info(f"Created document entry in database: ID={document_id}, doc_id={doc_id}, filename={file.filename}")
-                
-            except Exception as db_error:
-                session.rollback()
-                logger.warning(f"Failed to create document entry in database: {db_error}. File upload will continue.")
-            finally:
-                session.close()
-                
-        except Exception as e:
-            # Log error but don't fail the upload
-            logger.warning(f"Error creating document entry: {e}. File upload will continue.")
+        # One state write, metadata transaction, Document session and queue transaction for the batch
+        responses = await run_in_threadpool(_register_uploaded_batch, myStorage, ingested_files, folder,
+                                            storage_type, source, file_classification, __username)
+        return JSONResponse(content={"response": True, "count": len(responses), "files": responses})
         
-        # Add file to processing queue instead of processing immediately
-        queue_service = RabbitMQService()
-        try:
-            queue_entry = queue_service.add_file_to_queue(
-                filename=file.filename,
-                file_path=file_path,
-                file_hash=myHash,
-                folder=folder,
-                storage_type=storage_type,
-                source=source,
-                file_classification=file_classification,
-                username=__username
-            )
-        finally:
-            queue_service.close()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+def _upload_session_error(e: UploadSessionError) -> HTTPException:
+    headers = {"Upload-Offset": str(e.offset)} if e.offset is not None else None
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
+@app.post("/upload_sessions", description="Start a resumable upload; send the bytes with PATCH /upload_sessions/{upload_id}", tags=["file-upload"])
+async def create_upload_session(
+    filename: str = Body(..., embed=True),
+    size: int = Body(..., embed=True),
+    *, __username: str = Depends(authenticate_user)
+):
+    try:
+        session = await run_in_threadpool(get_upload_session_store().create, filename, size, __username)
+    except UploadSessionError as e:
+        raise _upload_session_error(e)
+    return JSONResponse(status_code=201, content=session, headers={"Upload-Offset": str(session["offset"])})
+
+@app.get("/upload_sessions/{upload_id}", description="Bytes received so far for a resumable upload (resume from Upload-Offset)", tags=["file-upload"])
+async def get_upload_session(upload_id: str, *, __username: str = Depends(authenticate_user)):
+    try:
+        session = await run_in_threadpool(get_upload_session_store().status, upload_id, __username)
+    except UploadSessionError as e:
+        raise _upload_session_error(e)
+    return JSONResponse(content=session, headers={"Upload-Offset": str(session["offset"])})
+
+@app.patch("/upload_sessions/{upload_id}", description="Append the request body to a resumable upload at the Upload-Offset header", tags=["file-upload"])
+async def append_upload_session(upload_id: str, request: Request, *, __username: str = Depends(authenticate_user)):
+    try:
+        offset = int(request.headers["Upload-Offset"])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Upload-Offset header is required")
+    
+    # Persist in UPLOAD_CHUNK_SIZE pieces so a dropped connection keeps everything written before it
+    store = get_upload_session_store()
+    buffer = bytearray()
+    try:
+        async for chunk in request.stream():
+            buffer.extend(chunk)
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                offset = await run_in_threadpool(store.append, upload_id, offset, bytes(buffer), __username)
+                buffer.clear()
+        if buffer:
+            offset = await run_in_threadpool(store.append, upload_id, offset, bytes(buffer), __username)
+    except UploadSessionError as e:
+        raise _upload_session_error(e)
+    return JSONResponse(content={"upload_id": upload_id, "offset": offset}, headers={"Upload-Offset": str(offset)})
+
+@app.delete("/upload_sessions/{upload_id}", description="Abort a resumable upload and drop its received bytes", tags=["file-upload"])
+async def delete_upload_session(upload_id: str, *, __username: str = Depends(authenticate_user)):
+    try:
+        await run_in_threadpool(get_upload_session_store().abort, upload_id, __username)
+    except UploadSessionError as e:
+        raise _upload_session_error(e)
+    return JSONResponse(content={"response": True, "upload_id": upload_id})
+
+@app.post("/upload_sessions/commit", description="Move completed resumable uploads into l0 and queue them as one batch", tags=["file-upload"])
+async def commit_upload_sessions(
+    upload_ids: List[str] = Body(..., embed=True),
+    folder: str = Body("l0", embed=True),
+    storage_type: str = Body("local", embed=True),
+    source: str = Body("api", embed=True),
+    file_classification: str = Body("", embed=True),
+    *, __username: str = Depends(authenticate_user)
+):
+    try:
+        from storage import STORAGE
         
-        response_data = {
-            "response": True,
-            "filename": file.filename,
-            "message": f"Successfully uploaded {file.filename} and added to processing queue. Call /start_processing to process queued files.",
-            "file_size": file_size,
-            "file_path": file_path,
-            "file_hash": myHash,
-            "username": __username,
-            "queue_id": queue_entry.get('id'),
-            "queue_status": queue_entry.get('status'),
-            "note": "File is queued and will be processed when /start_processing endpoint is called"
+        myStorageConfig = {
+            'defaultFileStorage': 'onPrem',
         }
+        client = 'frameDemo'
+        myStorage = STORAGE(client, myStorageConfig)
         
-        # Add document ID if created successfully
-        if document_id:
-            response_data["document_id"] = document_id
-            response_data["doc_id"] = doc_id
-        
-        return JSONResponse(content=response_data)
-        
+        target_dir = myStorage.getLayerNFolder('l0')
+        store = get_upload_session_store()
+        
+        # Check every session first so an incomplete one doesn't leave the batch half-committed
+        filenames = set()
+        for upload_id in dict.fromkeys(upload_ids):
+            session = await run_in_threadpool(store.status, upload_id, __username)
+            if not session["complete"]:
+                raise UploadSessionError(f"Upload {upload_id} is incomplete ({session['offset']}/{session['size']} bytes)",
+                                         409, session["offset"])
+            if session["filename"] in filenames:
+                raise HTTPException(status_code=400, detail=f"Duplicate filename in batch: {session['filename']}")
+            filenames.add(session["filename"])
+        ingested_files = [await run_in_threadpool(store.finalize, upload_id, target_dir, __username)
+                          for upload_id in dict.fromkeys(upload_ids)]
+        
+        responses = await run_in_threadpool(_register_uploaded_batch, myStorage, ingested_files, folder,
+                                            storage_type, source, file_classification, __username)
+        return JSONResponse(content={"response": True, "count": len(responses), "files": responses})
+        
+    except UploadSessionError as e:
+        raise _upload_session_error(e)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
@@ -1689,72 +1863,38 @@ async def get_queue_status(*, __username: str = Depends(authenticate_user)):
 def _process_queue_background():
     """
     Background function to process files from the queue.
-    Runs in a separate thread to avoid blocking the API.
+    Runs in a separate thread to avoid blocking the API. Messages are pushed by
+    RabbitMQ (basic_consume) to a bounded worker pool until the queue is drained.
     """
     from server.APIServerUtils.rabbitmq_service import RabbitMQService
+    from server.APIServerUtils.queue_processor import _interpret_result
     from runner_frame import process_file_with_orchestrator
     
     queue_service = RabbitMQService()
-    processed_count = 0
-    failed_count = 0
     
     logger.info("Background queue processing started")
     
-    try:
-        # Process files until queue is empty
-        while True:
-            # Get next file from queue (FIFO)
-            queue_entry = queue_service.get_next_file_from_queue()
-            
-            if not queue_entry:
-                # No more files in queue
-                break
-            
-            delivery_tag = queue_entry.get('_delivery_tag')
-            file_path = queue_entry['file_path']
-            filename = queue_entry['filename']
-            
-            logger.info(f"Processing file from queue: {filename}")
-            
-            try:
-                # Process the file (runs in this thread, no event loop conflicts)
-                result = process_file_with_orchestrator(file_path, filename)
-                
-                # Determine success based on result
-                if isinstance(result, dict):
-                    success = result.get('status') == 'completed'
-                    error_message = result.get('message') if not success else None
-                elif result is True:
-                    success = True
-                    error_message = None
-                elif result is False or result is None:
-                    success = False
-                    error_message = "Processing returned False or None"
-                else:
-                    logger.warning(f"Unexpected return type from process_file_with_orchestrator: {type(result)}")
-                    success = bool(result)
-                    error_message = None if success else "Processing returned unexpected result"
-                
-                # Acknowledge message (remove from queue on success, requeue on failure)
-                if delivery_tag:
-                    queue_service.acknowledge_message(delivery_tag, success=success)
-                
-                if success:
-                    processed_count += 1
-                    logger.info(f"Successfully processed file: {filename}")
-                else:
-                    failed_count += 1
-                    logger.warning(f"Failed to process file: {filename} - {error_message}")
-            
-            except Exception as e:
-                # Requeue message on exception
-                error_message = str(e)
-                if delivery_tag:
-                    queue_service.acknowledge_message(delivery_tag, success=False)
-                failed_count += 1
-                logger.error(f"Error processing file {filename}: {e}")
+    def process_message(queue_entry):
+        file_path = queue_entry['file_path']
+        filename = queue_entry['filename']
         
-        logger.info(f"Background queue processing completed. Processed: {processed_count}, Failed: {failed_count}")
+        logger.info(f"Processing file from queue: {filename}")
+        
+        # Process the file (runs on a worker thread, no event loop conflicts)
+        result = process_file_with_orchestrator(file_path, filename)
+        success, error_message = _interpret_result(result)
+        
+        if success:
+            logger.info(f"Successfully processed file: {filename}")
+        else:
+            logger.warning(f"Failed to process file: {filename} - {error_message}")
+        return success, error_message
+    
+    try:
+        # Failed files are retried, then moved to the dead-letter queue
+        stats = queue_service.consume(process_message, stop_when_empty=True)
+        logger.info(f"Background queue processing completed. Processed: {stats['processed']}, "
+                    f"Retried: {stats['requeued']}, Dead-lettered: {stats['dead_lettered']}")
     
     except Exception as e:
         logger.error(f"Error in background queue processing: {e}")
@@ -1817,14 +1957,111 @@ async def start_processing(__username: str = Depends(authenticate_user)):
   
 
 
+RECONCILE_WORKERS = int(os.getenv("RECONCILE_WORKERS", str(min(8, (os.cpu_count() or 1) + 4))))
+
+def _try_call(func):
+    """Wrap func so executor.map returns exceptions as results instead of raising the first one"""
+    def wrapper(*args):
+        try:
+            return func(*args)
+        except Exception as e:
+            return e
+    return wrapper
+
+def _reconcile_l0(myStorage, fileMetaStore) -> Dict[str, int]:
+    """
+    Bring l1 and the file metadata store in line with l0
+
+    l0 and l1 are each listed once. A file whose size and mtime match its stored
+    record (and whose l1 entry exists) keeps the stored hash; only new or changed
+    files are read, and those reads plus the l1 placement of unseen hashes run on
+    a bounded worker pool. All metadata changes are written in one transaction
+    at the end.
+    """
+    l0_dir = myStorage.getDir('l0')
+    l1_hashes = set(myStorage.getAllLayerNFiles('l1'))
+    known_records = fileMetaStore.all()
+    
+    l0_entries = {}
+    with os.scandir(l0_dir) as it:
+        for entry in it:
+            # Dot files are in-flight uploads (ingest temp files) or tooling leftovers
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            st = entry.stat()
+            l0_entries[entry.name] = (entry.path, st.st_size, st.st_mtime_ns)
+    
+    hashes = {}
+    to_hash = []
+    for filename, (file_path, size, mtime_ns) in l0_entries.items():
+        record = known_records.get(filename)
+        if (record and record.get("fileHash") in l1_hashes and record.get("fileSize") == size
+                and record.get("fileMtimeNs") == mtime_ns):
+            hashes[filename] = record["fileHash"]
+        else:
+            to_hash.append(file_path)
+    
+    updated_records = {}
+    failed_count = 0
+    with ThreadPoolExecutor(max_workers=RECONCILE_WORKERS, thread_name_prefix="reconcile") as executor:
+        # Hash and sniff new/changed files (one read each)
+        ingested_by_name = {}
+        for file_path, result in zip(to_hash, executor.map(_try_call(sniff_file), to_hash)):
+            filename = os.path.basename(file_path)
+            if isinstance(result, Exception):
+                failed_count += 1
+                updated_records[filename] = {"fileHash": None, "fileType": "Error", "status": "Failed",
+                                             "fileName": filename, "error": str(result)}
+                continue
+            ingested_by_name[filename] = result
+            hashes[filename] = result.sha256
+        
+        # Place each hash that isn't in l1 yet exactly once, even if several l0 files share it
+        to_place = {}
+        for ingested in ingested_by_name.values():
+            if ingested.sha256 not in l1_hashes:
+                to_place.setdefault(ingested.sha256, ingested)
+        placing = list(to_place.values())
+        place_results = dict(zip((ingested.sha256 for ingested in placing),
+                                 executor.map(_try_call(lambda ingested: _place_in_l1(myStorage, ingested)), placing)))
+    
+    processed_count = 0
+    skipped_count = 0
+    for filename, myHash in hashes.items():
+        _, size, mtime_ns = l0_entries[filename]
+        record = known_records.get(filename)
+        place_result = place_results.get(myHash)
+        if isinstance(place_result, Exception):
+            failed_count += 1
+            new_record = {"fileHash": myHash, "fileType": "Error", "status": "Failed",
+                          "fileName": filename, "error": str(place_result)}
+        elif myHash in place_results:
+            processed_count += 1
+            new_record = {"fileHash": myHash, "fileType": _guess_file_type(filename),
+                          "status": "Processed", "fileName": filename}
+        else:
+            skipped_count += 1
+            if record and record.get("fileHash") == myHash:
+                # Already reconciled: keep type/status set by processing
+                new_record = dict(record)
+            else:
+                new_record = {"fileHash": myHash, "fileType": "Pending", "status": "Pending", "fileName": filename}
+        new_record["fileSize"] = size
+        new_record["fileMtimeNs"] = mtime_ns
+        if new_record != record:
+            updated_records[filename] = new_record
+    
+    if updated_records:
+        fileMetaStore.put_many(updated_records)
+    
+    return {"processed_count": processed_count, "skipped_count": skipped_count,
+            "failed_count": failed_count, "hashed_count": len(to_hash), "updated_count": len(updated_records)}
+
 @app.post("/process_existing_files", description="Process all existing files in l0 directory and add them to ldummy layer", tags=["file-processing"])
 async def process_existing_files(*, __username: str = Depends(authenticate_user)):
     """Process all existing files in l0 directory and add them to ldummy layer"""
     try:
         from storage import STORAGE
-        from utils.unclassified import getFileHash, getISO8601FromPDFDate
-        import filetype
-        from PyPDF2 import PdfReader
         
         myStorageConfig = {
             'defaultFileStorage': 'onPrem',
@@ -1832,167 +2069,14 @@ async def process_existing_files(*, __username: str = Depends(authenticate_user)
         client = 'frameDemo'
         myStorage = STORAGE(client, myStorageConfig)
         
-        # Get all files in l0 directory
-        l0_files = myStorage.getAllLayerNFiles('l0')
-        
-        # Get existing ldummy data
-        try:
-            existing_ldummy = myStorage.getJSONDump('ldummy', '', 'allFileMeta')
-            if not isinstance(existing_ldummy, dict):
-                existing_ldummy = {}
-        except:
-            existing_ldummy = {}
-        
-        processed_count = 0
-        skipped_count = 0
-        
-        for filename in l0_files:
-            file_path = myStorage.getLocalFilePath('l0', filename)
-            myHash = getFileHash(file_path)            
-
-            # Add to ldummy with initial status (will be updated after processing)
-            existing_ldummy[filename] = {
-                "fileHash": myHash,
-                "fileType": "Pending",
-                "status": "Pending",
-                "fileName": filename
-            }
-
-            # Check if file is already in l1 (processed)
-            if myHash in myStorage.getAllLayerNFiles('l1'):
-                skipped_count += 1
-                continue
-
-            
-            # Process the file
-            try:
-                fileKind = filetype.guess(file_path)
-                
-                # Handle cases where filetype can't determine the type
-                if fileKind is None:
-                    file_extension = os.path.splitext(filename)[1].lower()
-                    if file_extension == '.txt':
-                        mime_type = 'text/plain'
-                    elif file_extension == '.csv':
-                        mime_type = 'text/csv'
-                    elif file_extension == '.json':
-                        mime_type = 'application/json'
-                    elif file_extension == '.xlsx':
-                        mime_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                    elif file_extension == '.xls':
-                        mime_type = 'application/vnd.ms-excel'
-                    else:
-                        mime_type = 'application/octet-stream'
-                else:
-                    mime_type = fileKind.mime
-                
-                myMetaData = {
-                    'typeName': mime_type,
-                    'fileHash': myHash,
-                    'fileOriginalName': filename,
-                    'fileOriginalPath': file_path,
-                    'typeSpecificParams': {}
-                }
-                
-                if myMetaData['typeName'] == 'application/pdf':
-                    try:
-                        reader = PdfReader(file_path)
-                        myMetaData['typeSpecificParams']['numPages'] = len(reader.pages)
-                        myMetaData['typeSpecificParams']['EXIF'] = {}
-                        if reader.metadata is not None:
-                            for key, value in reader.metadata.items():
-                                if key in ['/CreationDate', '/ModDate']:
-                                    myMetaData['typeSpecificParams']['EXIF'][key] = getISO8601FromPDFDate(value)
-                                else:
-                                    myMetaData['typeSpecificParams']['EXIF'][key] = value
-                    except Exception as e:
-                        myMetaData['typeSpecificParams']['error'] = f"Could not read PDF metadata: {str(e)}"
-                
-                # Create l1 directory and save metadata
-                hash_dir = myStorage.getDir('l1', [myHash])
-                
-                myMetaDataOp = {
-                    "dataTypeToSaveAs": "JSONDump",
-                    "opParams": {
-                        "layerName": "l1",
-                        "folderArray": [myHash],
-                        "operation": "replace"
-                    },
-                    "data": myMetaData,
-                    "key": "fileMetaData"
-                }
-                myStorage.doDataOperation(myMetaDataOp)
-                
-                # Copy file to l1 layer with proper extension
-                file_extension = os.path.splitext(filename)[1] or '.pdf'
-                raw_file_path = os.path.join(hash_dir, f'rawFile{file_extension}')
-                shutil.copy2(file_path, raw_file_path)
-                
-                # Determine file type based on filename
-                filename_lower = filename.lower()
-                if "statement" in filename_lower:
-                    file_type = "Fund Statement"
-                elif "capcall" in filename_lower or "capital_call" in filename_lower:
-                    file_type = "Capital Call Notice" 
-                elif "distribution" in filename_lower:
-                    file_type = "Distribution Notice"
-                elif "factsheet" in filename_lower:
-                    file_type = "Fund Fact Sheet"
-                elif "ppm" in filename_lower:
-                    file_type = "Private Placement Memorandum"
-                elif "k1" in filename_lower:
-                    file_type = "K1"
-                elif filename.lower().endswith('.pdf'):
-                    file_type = "PDF Document"
-                elif filename.lower().endswith('.txt'):
-                    file_type = "Text Document"
-                elif filename.lower().endswith(('.csv', '.xlsx', '.xls')):
-                    file_type = "Spreadsheet"
-                elif filename.lower().endswith('.json'):
-                    file_type = "JSON Document"
-                else:
-                    file_type = "Document"
-                
-                # Add to ldummy
-                existing_ldummy[filename] = {
-                    "fileHash": myHash,
-                    "fileType": file_type,
-                    "status": "Processed",
-                    "fileName": filename
-                }
-                
-                processed_count += 1
-                
-            except Exception as e:
-                # Add to ldummy with error status
-                existing_ldummy[filename] = {
-                    "fileHash": myHash,
-                    "fileType": "Error",
-                    "status": "Failed",
-                    "fileName": filename,
-                    "error": str(e)
-                }
-        
-        # Save updated ldummy data
-        if processed_count > 0:
-            myLdummyOp = {
-                "dataTypeToSaveAs": "JSONDump",
-                "opParams": {
-                    "layerName": "ldummy",
-                    "folderArray": [],
-                    "operation": "replace"
-                },
-                "data": existing_ldummy,
-                "key": "allFileMeta"
-            }
-            myStorage.doDataOperation(myLdummyOp)
+        fileMetaStore = get_file_meta_store()
+        stats = await run_in_threadpool(_reconcile_l0, myStorage, fileMetaStore)
         
         return JSONResponse(content={
             "response": True,
-            "message": f"Processed {processed_count} files, skipped {skipped_count} files",
-            "processed_count": processed_count,
-            "skipped_count": skipped_count,
-            "total_files_in_ldummy": len(existing_ldummy),
+            "message": f"Processed {stats['processed_count']} files, skipped {stats['skipped_count']} files",
+            **stats,
+            "total_files_in_ldummy": fileMetaStore.count(),
             "username": __username
         })
         
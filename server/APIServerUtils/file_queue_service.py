@@ -1,24 +1,80 @@
 #!/usr/bin/env python3
 """
-File Queue Service for managing file processing queue in FIFO order
+File Queue Service for managing the file processing queue
+
+Claims are scheduled by priority first, then weighted fair queuing across
+clients: each candidate gets a virtual finish time of (pages the client was
+served in the recent window + pages queued ahead of it) / client weight, so a
+bulk drop from one client cannot starve another client's urgent document.
+Pending files age into higher priority, and when the queue is long each
+client's short jobs are served before its long ones.
 """
 
 import logging
-from typing import Optional, Dict, Any
-from datetime import datetime
+import os
+import select
+import time
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, or_, func, select as sql_select, update, case, text, DateTime
 from database_models import DatabaseManager, FileQueue
 
 logger = logging.getLogger(__name__)
 
+# Lease defaults - a worker must heartbeat within the lease or its file is reclaimed
+DEFAULT_LEASE_SECONDS = int(os.getenv("FILE_QUEUE_LEASE_SECONDS", "120"))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("FILE_QUEUE_MAX_ATTEMPTS", "3"))
+
+# Scheduling defaults
+DEFAULT_JOB_PAGES = int(os.getenv("FILE_QUEUE_DEFAULT_JOB_PAGES", "10"))  # cost of files with unknown page count
+SHORT_JOB_THRESHOLD = int(os.getenv("FILE_QUEUE_SHORT_JOB_THRESHOLD", "50"))  # pending files before short jobs go first
+FAIR_WINDOW_MINUTES = int(os.getenv("FILE_QUEUE_FAIR_WINDOW_MINUTES", "60"))  # history counted towards a client's share
+AGING_MINUTES = int(os.getenv("FILE_QUEUE_AGING_MINUTES", "15"))  # waiting time that earns one priority level
+CANDIDATES_PER_CLIENT = 2
+
+def _parse_client_weights(value: str) -> Dict[str, float]:
+    """Parse FILE_QUEUE_CLIENT_WEIGHTS, e.g. "acme=2,globex=0.5" """
+    weights = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        client, _, weight = item.partition('=')
+        try:
+            weights[client.strip()] = max(float(weight), 0.01)
+        except ValueError:
+            logger.warning(f"Ignoring invalid client weight '{item}'")
+    return weights
+
+# Postgres NOTIFY channel used to wake idle workers when a file is enqueued
+QUEUE_NOTIFY_CHANNEL = os.getenv("FILE_QUEUE_NOTIFY_CHANNEL", "file_queue_new")
+
 class FileQueueService:
     """Service for managing file processing queue"""
     
-    def __init__(self):
-        """Initialize the queue service with database manager"""
+    def __init__(
+        self,
+        lease_seconds: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        client_weights: Optional[Dict[str, float]] = None
+    ):
+        """
+        Initialize the queue service with database manager
+        
+        Args:
+            lease_seconds: Seconds a claimed file stays leased without a heartbeat
+            max_attempts: Claims after which an expired file is marked failed instead of requeued
+            client_weights: Fair-share weight per client (default: FILE_QUEUE_CLIENT_WEIGHTS env, else 1.0)
+        """
         self.db_manager = DatabaseManager()
         self.SessionLocal = self.db_manager.SessionLocal
+        self.lease_seconds = lease_seconds or DEFAULT_LEASE_SECONDS
+        self.max_attempts = max_attempts or DEFAULT_MAX_ATTEMPTS
+        self.client_weights = client_weights if client_weights is not None else _parse_client_weights(os.getenv("FILE_QUEUE_CLIENT_WEIGHTS", ""))
+    
+    def _utcnow(self):
+        """Current UTC time - the database clock on PostgreSQL so leases ignore worker clock skew"""
+        if self.db_manager.engine.dialect.name == 'postgresql':
+            return func.timezone('UTC', func.now(), type_=DateTime)
+        return datetime.utcnow()
     
     def add_file_to_queue(
         self,
@@ -29,7 +85,10 @@ class FileQueueService:
         storage_type: str = "local",
         source: str = "api",
         file_classification: str = "",
-        username: str = ""
+        username: str = "",
+        priority: int = 0,
+        client_key: Optional[str] = None,
+        page_count: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Add a file to the processing queue
@@ -43,6 +102,9 @@ class FileQueueService:
             source: Source of upload (default: api)
             file_classification: File classification (optional)
             username: Username who uploaded the file
+            priority: Scheduling priority, higher is served first (default: 0)
+            client_key: Client used for fair scheduling (default: username, then source)
+            page_count: Page count used as job cost (default: read from the PDF when local)
             
         Returns:
             Dictionary with queue entry details
@@ -71,10 +133,18 @@ class FileQueueService:
                 source=source,
                 file_classification=file_classification,
                 username=username,
-                status='pending'
+                status='pending',
+                priority=priority,
+                client_key=client_key or username or source,
+                page_count=page_count if page_count is not None else self._estimate_page_count(file_path)
             )
             
             db.add(queue_entry)
+            db.flush()
+            
+            # Delivered to listening workers when the transaction commits
+            self._notify_new_file(db, queue_entry.id)
+            
             db.commit()
             db.refresh(queue_entry)
             
@@ -88,31 +158,187 @@ class FileQueueService:
         finally:
             db.close()
     
-    def get_next_file_from_queue(self) -> Optional[Dict[str, Any]]:
+    @staticmethod
+    def _estimate_page_count(file_path: str) -> Optional[int]:
+        """Page count of a local PDF, or None when it cannot be read"""
+        if not file_path or not file_path.lower().endswith('.pdf') or not os.path.exists(file_path):
+            return None
+        try:
+            from PyPDF2 import PdfReader
+            return len(PdfReader(file_path).pages)
+        except Exception as e:
+            logger.debug(f"Could not read page count of {file_path}: {e}")
+            return None
+    
+    @staticmethod
+    def _client_expr():
+        """Client a row is scheduled under (rows queued before client_key existed fall back to username/source)"""
+        return func.coalesce(func.nullif(FileQueue.client_key, ''), func.nullif(FileQueue.username, ''), FileQueue.source)
+    
+    def _db_localtime(self, db: Session) -> datetime:
+        """Database clock in the same (naive, session) time zone as the server_default created_at"""
+        if self.db_manager.engine.dialect.name == 'postgresql':
+            return db.execute(sql_select(func.localtimestamp())).scalar()
+        return datetime.now()
+    
+    def _plan_candidates(self, db: Session, exclude_ids: Optional[set] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """
-        Get the next file from the queue in FIFO order (oldest pending first)
+        Order pending files by scheduling preference
+        
+        Only the first CANDIDATES_PER_CLIENT files of each client are considered -
+        a client's later files can never be picked before its earlier ones.
+        
+        Args:
+            exclude_ids: Files to plan past (already being claimed by other workers)
+        
+        Returns:
+            (candidates in claim order, per-client scheduling state)
+        """
+        client = self._client_expr().label('client')
+        cost = func.coalesce(FileQueue.page_count, DEFAULT_JOB_PAGES)
+        
+        pending_by_client = dict(
+            db.execute(
+                sql_select(client, func.count(FileQueue.id))
+                .where(FileQueue.status == 'pending')
+                .group_by(client)
+            ).all()
+        )
+        pending_total = sum(pending_by_client.values())
+        short_jobs_first = pending_total >= SHORT_JOB_THRESHOLD
+        
+        order_by = [FileQueue.priority.desc()]
+        if short_jobs_first:
+            order_by.append(cost.asc())
+        order_by += [FileQueue.created_at.asc(), FileQueue.id.asc()]
+        pending = [FileQueue.status == 'pending']
+        if exclude_ids:
+            pending.append(FileQueue.id.notin_(exclude_ids))
+        ranked = (
+            sql_select(
+                FileQueue.id, FileQueue.filename, FileQueue.priority, FileQueue.created_at,
+                client, cost.label('cost'),
+                func.row_number().over(partition_by=self._client_expr(), order_by=order_by).label('client_rank')
+            )
+            .where(and_(*pending))
+            .subquery()
+        )
+        rows = db.execute(
+            sql_select(ranked).where(ranked.c.client_rank <= CANDIDATES_PER_CLIENT).order_by(ranked.c.client, ranked.c.client_rank)
+        ).all()
+        
+        window_start = self._utcnow() - timedelta(minutes=FAIR_WINDOW_MINUTES)
+        served_by_client = dict(
+            db.execute(
+                sql_select(client, func.sum(cost))
+                .where(FileQueue.started_at >= window_start)
+                .group_by(client)
+            ).all()
+        )
+        
+        now = self._db_localtime(db)
+        queued_ahead: Dict[str, int] = {}
+        candidates = []
+        for row in rows:
+            weight = self.client_weights.get(row.client, 1.0)
+            queued_ahead[row.client] = queued_ahead.get(row.client, 0) + int(row.cost)
+            waited_minutes = max((now - row.created_at).total_seconds() / 60, 0) if row.created_at else 0
+            candidates.append({
+                'id': row.id,
+                'filename': row.filename,
+                'client': row.client,
+                'priority': row.priority,
+                'effective_priority': row.priority + int(waited_minutes // AGING_MINUTES),
+                'cost': int(row.cost),
+                'virtual_finish': round((int(served_by_client.get(row.client) or 0) + queued_ahead[row.client]) / weight, 2),
+                'created_at': row.created_at.isoformat() if row.created_at else None
+            })
+        candidates.sort(key=lambda c: (-c['effective_priority'], c['virtual_finish'], c['created_at'] or '', c['id']))
+        
+        clients = {
+            name: {
+                'pending': count,
+                'served_pages': int(served_by_client.get(name) or 0),
+                'weight': self.client_weights.get(name, 1.0)
+            }
+            for name, count in pending_by_client.items()
+        }
+        return candidates, {'pending': pending_total, 'short_jobs_first': short_jobs_first, 'clients': clients}
+    
+    def _notify_new_file(self, db: Session, queue_id: int):
+        """Wake idle workers via NOTIFY (no-op on non-PostgreSQL databases)"""
+        if self.db_manager.engine.dialect.name != 'postgresql':
+            return
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": QUEUE_NOTIFY_CHANNEL, "payload": str(queue_id)})
+    
+    def get_next_file_from_queue(self, worker_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Atomically claim the next file chosen by the scheduler
+        
+        The best candidate not locked by another worker is locked with FOR UPDATE
+        SKIP LOCKED and flipped to 'processing' in the same UPDATE ... RETURNING
+        statement, so concurrent workers never receive the same file and never
+        block on each other. When every planned candidate was taken by other
+        workers, the scheduler plans again past them, so with many workers and
+        one client's bulk drop every worker still gets a file.
+        
+        Args:
+            worker_id: Identifier of the claiming worker (stored with the lease)
         
         Returns:
             Dictionary with file details or None if queue is empty
         """
         db: Session = self.SessionLocal()
         try:
-            # Get the oldest pending file (FIFO)
-            queue_entry = db.query(FileQueue).filter(
-                FileQueue.status == 'pending'
-            ).order_by(FileQueue.created_at.asc()).first()
-            
-            if not queue_entry:
-                return None
+            taken_ids: set = set()
+            while True:
+                candidates, _ = self._plan_candidates(db, exclude_ids=taken_ids)
+                if not candidates:
+                    db.rollback()
+                    return None
+                
+                # Claim in plan order, skipping candidates another worker is claiming right now
+                candidate_rank = case({c['id']: index for index, c in enumerate(candidates)}, value=FileQueue.id)
+                next_pending_id = (
+                    sql_select(FileQueue.id)
+                    .where(and_(FileQueue.id.in_([c['id'] for c in candidates]), FileQueue.status == 'pending'))
+                    .order_by(candidate_rank)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                    .scalar_subquery()
+                )
+                
+                now = self._utcnow()
+                claim = (
+                    update(FileQueue)
+                    .where(FileQueue.id == next_pending_id)
+                    .values(
+                        status='processing',
+                        started_at=now,
+                        heartbeat_at=now,
+                        lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                        worker_id=worker_id,
+                        attempts=FileQueue.attempts + 1,
+                        updated_at=now
+                    )
+                    .returning(FileQueue)
+                    .execution_options(synchronize_session=False)
+                )
+                
+                queue_entry = db.execute(claim).scalars().first()
+                if queue_entry:
+                    break
+                # All planned candidates were taken by other workers: plan past them
+                taken_ids.update(c['id'] for c in candidates)
             
-            # Mark as processing
-            queue_entry.status = 'processing'
-            queue_entry.started_at = datetime.utcnow()
+            result = queue_entry.to_dict()
             db.commit()
-            db.refresh(queue_entry)
             
-            logger.info(f"Retrieved file {queue_entry.filename} from queue (ID: {queue_entry.id})")
-            return queue_entry.to_dict()
+            decision = next((c for c in candidates if c['id'] == result['id']), {})
+            logger.info(f"Claimed file {result['filename']} from queue (ID: {result['id']}, worker: {worker_id}, "
+                        f"client: {decision.get('client')}, priority: {decision.get('effective_priority')}, "
+                        f"virtual finish: {decision.get('virtual_finish')})")
+            return result
             
         except Exception as e:
             db.rollback()
@@ -121,7 +347,49 @@ class FileQueueService:
         finally:
             db.close()
     
-    def mark_file_completed(self, queue_id: int, success: bool = True, error_message: Optional[str] = None):
+    def heartbeat(self, queue_id: int, worker_id: Optional[str] = None) -> bool:
+        """
+        Extend the lease on a file being processed
+        
+        Args:
+            queue_id: ID of the queue entry
+            worker_id: Worker that claimed the file
+            
+        Returns:
+            False if the lease was lost (reclaimed by another worker or already finished)
+        """
+        db: Session = self.SessionLocal()
+        try:
+            now = self._utcnow()
+            stmt = (
+                update(FileQueue)
+                .where(and_(
+                    FileQueue.id == queue_id,
+                    FileQueue.status == 'processing',
+                    FileQueue.worker_id.is_(None) if worker_id is None else FileQueue.worker_id == worker_id
+                ))
+                .values(
+                    heartbeat_at=now,
+                    lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                    updated_at=now
+                )
+                .execution_options(synchronize_session=False)
+            )
+            renewed = db.execute(stmt).rowcount > 0
+            db.commit()
+            
+            if not renewed:
+                logger.warning(f"Lease lost for queue entry {queue_id} (worker: {worker_id})")
+            return renewed
+            
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error renewing lease for queue entry {queue_id}: {e}")
+            raise
+        finally:
+            db.close()
+    
+    def mark_file_completed(self, queue_id: int, success: bool = True, error_message: Optional[str] = None, worker_id: Optional[str] = None):
         """
         Mark a file as completed or failed in the queue
         
@@ -129,6 +397,7 @@ class FileQueueService:
             queue_id: ID of the queue entry
             success: True if processing succeeded, False if failed
             error_message: Error message if processing failed
+            worker_id: When given, the update only applies if this worker still holds the lease
         """
         db: Session = self.SessionLocal()
         try:
@@ -138,8 +407,13 @@ class FileQueueService:
                 logger.warning(f"Queue entry with ID {queue_id} not found")
                 return
             
+            if worker_id is not None and queue_entry.worker_id != worker_id:
+                logger.warning(f"Not marking file {queue_entry.filename} (ID: {queue_id}): lease is held by {queue_entry.worker_id}, not {worker_id}")
+                return
+            
             queue_entry.status = 'completed' if success else 'failed'
             queue_entry.completed_at = datetime.utcnow()
+            queue_entry.lease_expires_at = None
             if error_message:
                 queue_entry.error_message = error_message
             
@@ -153,46 +427,84 @@ class FileQueueService:
         finally:
             db.close()
     
-    def reset_stuck_files(self, timeout_minutes: int = 30):
+    def reclaim_expired_leases(self, legacy_timeout_minutes: int = 30) -> int:
         """
-        Reset files that have been in 'processing' status for too long
-        (likely due to a crashed or interrupted process)
+        Requeue files whose worker stopped heartbeating
+        
+        Files that already used up max_attempts are marked failed instead, so a
+        document that crashes its worker cannot loop forever. Rows claimed before
+        leases existed (no lease_expires_at) fall back to the started_at timeout.
         
         Args:
-            timeout_minutes: Minutes after which a processing file is considered stuck
+            legacy_timeout_minutes: Timeout for processing rows without a lease
+            
+        Returns:
+            Number of files requeued or failed
         """
         db: Session = self.SessionLocal()
         try:
-            from datetime import timedelta
-            timeout_threshold = datetime.utcnow() - timedelta(minutes=timeout_minutes)
-            
-            stuck_files = db.query(FileQueue).filter(
-                and_(
-                    FileQueue.status == 'processing',
-                    FileQueue.started_at < timeout_threshold
+            now = self._utcnow()
+            expired = and_(
+                FileQueue.status == 'processing',
+                or_(
+                    FileQueue.lease_expires_at < now,
+                    and_(
+                        FileQueue.lease_expires_at.is_(None),
+                        FileQueue.started_at < now - timedelta(minutes=legacy_timeout_minutes)
+                    )
                 )
-            ).all()
+            )
+            exhausted = FileQueue.attempts >= self.max_attempts
             
-            reset_count = 0
-            for file_entry in stuck_files:
-                file_entry.status = 'pending'
-                file_entry.started_at = None
-                reset_count += 1
-                logger.info(f"Reset stuck file: {file_entry.filename} (ID: {file_entry.id})")
+            stmt = (
+                update(FileQueue)
+                .where(expired)
+                .values(
+                    status=case((exhausted, 'failed'), else_='pending'),
+                    error_message=case(
+                        (exhausted, f"Processing lease expired after {self.max_attempts} attempt(s)"),
+                        else_=FileQueue.error_message
+                    ),
+                    completed_at=case((exhausted, now), else_=None),
+                    started_at=None,
+                    worker_id=None,
+                    heartbeat_at=None,
+                    lease_expires_at=None,
+                    updated_at=now
+                )
+                .returning(FileQueue.id, FileQueue.filename, FileQueue.status)
+                .execution_options(synchronize_session=False)
+            )
+            reclaimed = db.execute(stmt).all()
+            db.commit()
             
-            if reset_count > 0:
-                db.commit()
-                logger.info(f"Reset {reset_count} stuck file(s)")
+            for queue_id, filename, status in reclaimed:
+                logger.info(f"Reclaimed expired lease: {filename} (ID: {queue_id}) -> {status}")
+            if reclaimed:
+                logger.info(f"Reclaimed {len(reclaimed)} expired lease(s)")
             
-            return reset_count
+            return len(reclaimed)
             
         except Exception as e:
             db.rollback()
-            logger.error(f"Error resetting stuck files: {e}")
+            logger.error(f"Error reclaiming expired leases: {e}")
             raise
         finally:
             db.close()
     
+    def reset_stuck_files(self, timeout_minutes: int = 30):
+        """
+        Reset files that have been in 'processing' status for too long
+        (likely due to a crashed or interrupted process)
+        
+        Kept for backwards compatibility - stuck files are now detected by their
+        expired lease rather than a fixed processing timeout.
+        
+        Args:
+            timeout_minutes: Timeout for rows claimed before leases were introduced
+        """
+        return self.reclaim_expired_leases(legacy_timeout_minutes=timeout_minutes)
+    
     def get_queue_status(self) -> Dict[str, Any]:
         """
         Get current queue status statistics
@@ -202,18 +514,31 @@ class FileQueueService:
         """
         db: Session = self.SessionLocal()
         try:
-            total = db.query(FileQueue).count()
-            pending = db.query(FileQueue).filter(FileQueue.status == 'pending').count()
-            processing = db.query(FileQueue).filter(FileQueue.status == 'processing').count()
-            completed = db.query(FileQueue).filter(FileQueue.status == 'completed').count()
-            failed = db.query(FileQueue).filter(FileQueue.status == 'failed').count()
+            counts = dict(
+                db.query(FileQueue.status, func.count(FileQueue.id))
+                .group_by(FileQueue.status)
+                .all()
+            )
+            active_workers = db.query(func.count(func.distinct(FileQueue.worker_id))).filter(
+                FileQueue.status == 'processing'
+            ).scalar()
+            candidates, scheduler_state = self._plan_candidates(db)
             
             return {
-                'total': total,
-                'pending': pending,
-                'processing': processing,
-                'completed': completed,
-                'failed': failed
+                'total': sum(counts.values()),
+                'pending': counts.get('pending', 0),
+                'processing': counts.get('processing', 0),
+                'completed': counts.get('completed', 0),
+                'failed': counts.get('failed', 0),
+                'active_workers': active_workers or 0,
+                'scheduler': {
+                    'policy': 'priority + weighted fair queuing by page cost',
+                    'short_jobs_first': scheduler_state['short_jobs_first'],
+                    'fair_window_minutes': FAIR_WINDOW_MINUTES,
+                    'aging_minutes': AGING_MINUTES,
+                    'clients': scheduler_state['clients'],
+                    'next_up': candidates[:10]
+                }
             }
             
         except Exception as e:
@@ -222,3 +547,68 @@ class FileQueueService:
         finally:
             db.close()
 
+class FileQueueListener:
+    """
+    Dedicated LISTEN connection that wakes queue workers as soon as a file is enqueued
+    
+    Only available on PostgreSQL with psycopg2; otherwise `available` is False and
+    callers should keep polling.
+    """
+    
+    def __init__(self, channel: str = QUEUE_NOTIFY_CHANNEL):
+        self.channel = channel
+        self.db_manager = DatabaseManager()
+        engine = self.db_manager.engine
+        self.available = engine is not None and engine.dialect.name == 'postgresql' and engine.dialect.driver == 'psycopg2'
+        self._connection = None
+    
+    def _connect(self):
+        """Open a connection outside the pool and LISTEN on the channel"""
+        pooled = self.db_manager.engine.raw_connection()
+        pooled.detach()
+        connection = pooled.driver_connection
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        self._connection = connection
+        logger.info(f"Listening for queue notifications on channel '{self.channel}'")
+    
+    def _drain(self) -> bool:
+        notified = bool(self._connection.notifies)
+        del self._connection.notifies[:]
+        return notified
+    
+    def wait(self, timeout: float) -> bool:
+        """
+        Block until a notification arrives or the timeout elapses
+        
+        Returns:
+            True if at least one file was enqueued since the last call
+        """
+        if not self.available:
+            time.sleep(timeout)
+            return False
+        try:
+            if self._connection is None:
+                self._connect()
+            if self._drain():
+                return True
+            readable, _, _ = select.select([self._connection], [], [], timeout)
+            if not readable:
+                return False
+            self._connection.poll()
+            return self._drain()
+        except Exception as e:
+            logger.warning(f"Queue listener connection failed, will reconnect: {e}")
+            self.close()
+            time.sleep(timeout)
+            return False
+    
+    def close(self):
+        """Close the LISTEN connection"""
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
@@ -1,143 +1,249 @@
 #!/usr/bin/env python3
 """
 Background Queue Processor for processing files from the queue in FIFO order
+
+Runs N workers (threads or processes). Each worker claims files atomically via
+FileQueueService, keeps the claim alive with lease heartbeats while processing,
+and periodically requeues files whose worker died. Idle workers block on a
+Postgres LISTEN connection and wake when a file is enqueued; polling is only
+a slow safety net.
 """
 
 import logging
+import multiprocessing
+import os
+import socket
 import threading
 import time
-from typing import Optional
-from server.APIServerUtils.file_queue_service import FileQueueService
+import uuid
+from typing import Optional, List, Tuple, Any
+from server.APIServerUtils.file_queue_service import FileQueueService, FileQueueListener
 from runner_frame import process_file_with_orchestrator
 
 logger = logging.getLogger(__name__)
 
+# Fallback poll interval while notifications are available (catches missed NOTIFYs)
+SAFETY_POLL_INTERVAL = int(os.getenv("QUEUE_SAFETY_POLL_INTERVAL", "60"))
+
+def _interpret_result(result: Any) -> Tuple[bool, Optional[str]]:
+    """Map the return value of process_file_with_orchestrator to (success, error_message)"""
+    if isinstance(result, dict):
+        # Expected format: {"status": "completed" | "error", "message": "...", ...}
+        success = result.get('status') == 'completed'
+        return success, (result.get('message') if not success else None)
+    if result is True:
+        # Handle case where function returns True (stub/placeholder)
+        # This means processing was skipped or not implemented yet
+        return True, None
+    if result is False or result is None:
+        # Explicit failure
+        return False, "Processing returned False or None"
+    # Unexpected return type - log warning but treat as success if truthy
+    logger.warning(f"Unexpected return type from process_file_with_orchestrator: {type(result)}")
+    success = bool(result)
+    return success, (None if success else "Processing returned unexpected result")
+
+class QueueWorker:
+    """Single worker loop: claims one file at a time and heartbeats its lease while processing"""
+
+    def __init__(self, worker_id: str, stop_event, poll_interval: int = 5, reset_stuck_interval: int = 300):
+        self.worker_id = worker_id
+        self.stop_event = stop_event
+        self.poll_interval = poll_interval
+        self.reset_stuck_interval = reset_stuck_interval
+        self.queue_service = FileQueueService()
+        self.listener = FileQueueListener()
+        self._last_reset_time = 0.0
+
+    def run(self):
+        """Main processing loop"""
+        logger.info(f"Queue worker {self.worker_id} started")
+
+        while not self.stop_event.is_set():
+            try:
+                # Requeue files whose worker stopped heartbeating
+                current_time = time.time()
+                if current_time - self._last_reset_time >= self.reset_stuck_interval:
+                    self._reclaim_expired_leases()
+                    self._last_reset_time = current_time
+
+                # Atomically claim next file from queue (FIFO)
+                queue_entry = self.queue_service.get_next_file_from_queue(worker_id=self.worker_id)
+
+                if queue_entry:
+                    self._process_entry(queue_entry)
+                else:
+                    # No files in queue, wait for a notification (or the safety poll)
+                    self._wait_for_work()
+
+            except Exception as e:
+                logger.error(f"Error in queue worker {self.worker_id} loop: {e}")
+                self.stop_event.wait(self.poll_interval)
+
+        self.listener.close()
+        logger.info(f"Queue worker {self.worker_id} stopped")
+
+    def _wait_for_work(self):
+        """Block until a file is enqueued, the safety poll is due, or the worker is stopped"""
+        if not self.listener.available:
+            self.stop_event.wait(self.poll_interval)
+            return
+
+        deadline = min(time.time() + SAFETY_POLL_INTERVAL, self._last_reset_time + self.reset_stuck_interval)
+        while not self.stop_event.is_set():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            # Short slices keep stop() responsive without touching the database
+            if self.listener.wait(min(remaining, 1.0)):
+                return
+
+    def _process_entry(self, queue_entry: dict):
+        """Process a claimed file, heartbeating its lease until processing finishes"""
+        queue_id = queue_entry['id']
+        file_path = queue_entry['file_path']
+        filename = queue_entry['filename']
+
+        logger.info(f"Worker {self.worker_id} processing file from queue: {filename} (ID: {queue_id})")
+
+        done = threading.Event()
+        heartbeat_thread = threading.Thread(
+            target=self._heartbeat_loop, args=(queue_id, done), daemon=True,
+            name=f"QueueHeartbeat-{queue_id}"
+        )
+        heartbeat_thread.start()
+
+        try:
+            result = process_file_with_orchestrator(file_path, filename)
+            success, error_message = _interpret_result(result)
+        except Exception as e:
+            # Mark as failed on exception
+            success, error_message = False, str(e)
+            logger.error(f"Error processing file {filename} (ID: {queue_id}): {e}")
+        finally:
+            done.set()
+            heartbeat_thread.join(timeout=5)
+
+        self.queue_service.mark_file_completed(
+            queue_id=queue_id,
+            success=success,
+            error_message=error_message,
+            worker_id=self.worker_id
+        )
+
+        if success:
+            logger.info(f"Successfully processed file: {filename} (ID: {queue_id})")
+        else:
+            logger.warning(f"Failed to process file: {filename} (ID: {queue_id}) - {error_message}")
+
+    def _heartbeat_loop(self, queue_id: int, done: threading.Event):
+        """Renew the lease at a third of its length until processing is done"""
+        interval = max(1.0, self.queue_service.lease_seconds / 3)
+        while not done.wait(interval):
+            try:
+                if not self.queue_service.heartbeat(queue_id, worker_id=self.worker_id):
+                    return
+            except Exception as e:
+                logger.error(f"Heartbeat failed for queue entry {queue_id}: {e}")
+
+    def _reclaim_expired_leases(self):
+        """Requeue files whose lease expired"""
+        try:
+            reset_count = self.queue_service.reclaim_expired_leases()
+            if reset_count > 0:
+                logger.info(f"Reclaimed {reset_count} file(s) with expired leases")
+        except Exception as e:
+            logger.error(f"Error reclaiming expired leases: {e}")
+
+def _run_worker_process(worker_id: str, stop_event, poll_interval: int, reset_stuck_interval: int):
+    """Entry point for worker processes"""
+    # Connections inherited through fork must not be shared with the parent
+    from database_models import DatabaseManager
+    engine = DatabaseManager().engine
+    if engine is not None:
+        engine.dispose(close=False)
+    QueueWorker(worker_id, stop_event, poll_interval, reset_stuck_interval).run()
+
 class QueueProcessor:
     """Background processor for file queue"""
-    
-    def __init__(self, poll_interval: int = 5, reset_stuck_interval: int = 300):
+
+    def __init__(
+        self,
+        poll_interval: int = 5,
+        reset_stuck_interval: int = 300,
+        num_workers: Optional[int] = None,
+        use_processes: Optional[bool] = None
+    ):
         """
         Initialize the queue processor
-        
+
         Args:
             poll_interval: Seconds between queue polls (default: 5)
-            reset_stuck_interval: Seconds between stuck file resets (default: 300 = 5 minutes)
+            reset_stuck_interval: Seconds between expired lease reclaims (default: 300 = 5 minutes)
+            num_workers: Number of concurrent workers (default: QUEUE_WORKERS env or 1)
+            use_processes: Run workers as processes instead of threads (default: QUEUE_WORKER_PROCESSES env or True)
         """
         self.queue_service = FileQueueService()
         self.poll_interval = poll_interval
         self.reset_stuck_interval = reset_stuck_interval
+        self.num_workers = num_workers or int(os.getenv("QUEUE_WORKERS", "1"))
+        if use_processes is None:
+            use_processes = os.getenv("QUEUE_WORKER_PROCESSES", "true").lower() == "true"
+        self.use_processes = use_processes
         self._running = False
-        self._thread: Optional[threading.Thread] = None
-        self._last_reset_time = time.time()
-    
+        self._workers: List[Any] = []
+        self._stop_event = None
+
+    def _worker_id(self, index: int) -> str:
+        return f"{socket.gethostname()}-{os.getpid()}-{index}-{uuid.uuid4().hex[:6]}"
+
     def start(self):
-        """Start the background processing thread"""
+        """Start the background workers"""
         if self._running:
             logger.warning("Queue processor is already running")
             return
-        
+
         self._running = True
-        self._thread = threading.Thread(target=self._process_loop, daemon=True)
-        self._thread.start()
-        logger.info("Queue processor started")
-    
+        if self.use_processes:
+            self._stop_event = multiprocessing.Event()
+            for index in range(self.num_workers):
+                worker = multiprocessing.Process(
+                    target=_run_worker_process,
+                    args=(self._worker_id(index), self._stop_event, self.poll_interval, self.reset_stuck_interval),
+                    daemon=True,
+                    name=f"QueueWorker-{index}"
+                )
+                worker.start()
+                self._workers.append(worker)
+        else:
+            self._stop_event = threading.Event()
+            for index in range(self.num_workers):
+                queue_worker = QueueWorker(self._worker_id(index), self._stop_event, self.poll_interval, self.reset_stuck_interval)
+                worker = threading.Thread(target=queue_worker.run, daemon=True, name=f"QueueWorker-{index}")
+                worker.start()
+                self._workers.append(worker)
+
+        logger.info(f"Queue processor started with {self.num_workers} {'process' if self.use_processes else 'thread'} worker(s)")
+
     def stop(self):
-        """Stop the background processing thread"""
+        """Stop the background workers"""
         self._running = False
-        if self._thread:
-            self._thread.join(timeout=10)
+        if self._stop_event is not None:
+            self._stop_event.set()
+        for worker in self._workers:
+            worker.join(timeout=10)
+        self._workers = []
         logger.info("Queue processor stopped")
-    
-    def _process_loop(self):
-        """Main processing loop that runs in background thread"""
-        logger.info("Queue processor loop started")
-        
-        while self._running:
-            try:
-                # Reset stuck files periodically
-                current_time = time.time()
-                if current_time - self._last_reset_time >= self.reset_stuck_interval:
-                    self._reset_stuck_files()
-                    self._last_reset_time = current_time
-                
-                # Get next file from queue (FIFO)
-                queue_entry = self.queue_service.get_next_file_from_queue()
-                
-                if queue_entry:
-                    queue_id = queue_entry['id']
-                    file_path = queue_entry['file_path']
-                    filename = queue_entry['filename']
-                    
-                    logger.info(f"Processing file from queue: {filename} (ID: {queue_id})")
-                    
-                    try:
-                        # Process the file
-                        result = process_file_with_orchestrator(file_path, filename)
-                        
-                        # Mark as completed or failed based on result
-                        if isinstance(result, dict):
-                            # Expected format: {"status": "completed" | "error", "message": "...", ...}
-                            success = result.get('status') == 'completed'
-                            error_message = result.get('message') if not success else None
-                        elif result is True:
-                            # Handle case where function returns True (stub/placeholder)
-                            # This means processing was skipped or not implemented yet
-                            success = True
-                            error_message = None
-                        elif result is False or result is None:
-                            # Explicit failure
-                            success = False
-                            error_message = "Processing returned False or None"
-                        else:
-                            # Unexpected return type - log warning but treat as success if truthy
-                            logger.warning(f"Unexpected return type from process_file_with_orchestrator: {type(result)}")
-                            success = bool(result)
-                            error_message = None if success else "Processing returned unexpected result"
-                        
-                        self.queue_service.mark_file_completed(
-                            queue_id=queue_id,
-                            success=success,
-                            error_message=error_message
-                        )
-                        
-                        if success:
-                            logger.info(f"Successfully processed file: {filename} (ID: {queue_id})")
-                        else:
-                            logger.warning(f"Failed to process file: {filename} (ID: {queue_id}) - {error_message}")
-                    
-                    except Exception as e:
-                        # Mark as failed on exception
-                        error_message = str(e)
-                        self.queue_service.mark_file_completed(
-                            queue_id=queue_id,
-                            success=False,
-                            error_message=error_message
-                        )
-                        logger.error(f"Error processing file {filename} (ID: {queue_id}): {e}")
-                
-                else:
-                    # No files in queue, sleep before next poll
-                    time.sleep(self.poll_interval)
-            
-            except Exception as e:
-                logger.error(f"Error in queue processor loop: {e}")
-                time.sleep(self.poll_interval)
-    
-    def _reset_stuck_files(self):
-        """Reset files that have been stuck in processing status"""
-        try:
-            reset_count = self.queue_service.reset_stuck_files(timeout_minutes=30)
-            if reset_count > 0:
-                logger.info(f"Reset {reset_count} stuck file(s) back to pending status")
-        except Exception as e:
-            logger.error(f"Error resetting stuck files: {e}")
-    
+
     def get_status(self) -> dict:
         """Get current processor status"""
         queue_status = self.queue_service.get_queue_status()
         return {
             'running': self._running,
             'poll_interval': self.poll_interval,
+            'num_workers': self.num_workers,
+            'alive_workers': sum(1 for worker in self._workers if worker.is_alive()),
+            'worker_mode': 'process' if self.use_processes else 'thread',
             'queue_status': queue_status
         }
 
@@ -161,4 +267,3 @@ def stop_queue_processor():
     global _processor
     if _processor:
         _processor.stop()
-
@@ -1,18 +1,33 @@
 #!/usr/bin/env python3
 """
 RabbitMQ Service for managing file processing queue
+
+Besides one-shot `get_next_file_from_queue`, the service offers `consume`, a
+push-based consumer (basic_consume + basic_qos prefetch) that dispatches
+deliveries to a bounded worker pool. Failed messages are republished with an
+attempt counter and moved to a dead-letter queue once they exceed
+`max_attempts`, so a poison document cannot block the queue.
 """
 
 import logging
 import json
 import os
-from typing import Optional, Dict, Any
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, Union, Tuple, List
 from datetime import datetime
 import pika
-from pika.exceptions import AMQPConnectionError, AMQPChannelError
+from pika.exceptions import AMQPConnectionError, AMQPChannelError, ChannelClosedByBroker
 
 logger = logging.getLogger(__name__)
 
+# Header carrying how many times a message has already failed processing
+ATTEMPTS_HEADER = "x-attempts"
+
+# Handler result: success flag, optionally with an error message
+HandlerResult = Union[bool, Tuple[bool, Optional[str]]]
+
 class RabbitMQService:
     """Service for managing file processing queue using RabbitMQ"""
     
@@ -23,7 +38,11 @@ class RabbitMQService:
         username: Optional[str] = None,
         password: Optional[str] = None,
         queue_name: str = "file_processing_queue",
-        virtual_host: str = "/"
+        virtual_host: str = "/",
+        dead_letter_queue: Optional[str] = None,
+        max_attempts: Optional[int] = None,
+        prefetch_count: Optional[int] = None,
+        connection_factory: Optional[Callable[[pika.ConnectionParameters], Any]] = None
     ):
         """
         Initialize the RabbitMQ service
@@ -35,6 +54,11 @@ class RabbitMQService:
             password: RabbitMQ password (default: from RABBITMQ_PASSWORD env var or guest)
             queue_name: Name of the queue (default: file_processing_queue)
             virtual_host: Virtual host (default: /)
+            dead_letter_queue: Queue for messages that keep failing (default: <queue_name>.dead_letter)
+            max_attempts: Failed attempts before dead-lettering (default: from RABBITMQ_MAX_ATTEMPTS env var or 3)
+            prefetch_count: Unacked deliveries per consumer (default: from RABBITMQ_PREFETCH env var or number of workers)
+            connection_factory: Callable building a blocking connection from ConnectionParameters
+                (default: pika.BlockingConnection); allows an in-memory AMQP stand-in in tests
         """
         self.host = host or os.getenv('RABBITMQ_HOST', 'localhost')
         self.port = int(os.getenv('RABBITMQ_PORT', str(port)))
@@ -42,6 +66,11 @@ class RabbitMQService:
         self.password = password or os.getenv('RABBITMQ_PASSWORD', 'guest')
         self.queue_name = queue_name
         self.virtual_host = virtual_host
+        self.dead_letter_queue = dead_letter_queue or f"{queue_name}.dead_letter"
+        self.max_attempts = max_attempts or int(os.getenv('RABBITMQ_MAX_ATTEMPTS', '3'))
+        self.prefetch_count = prefetch_count or (int(os.getenv('RABBITMQ_PREFETCH')) if os.getenv('RABBITMQ_PREFETCH') else None)
+        self.num_workers = int(os.getenv('RABBITMQ_WORKERS', '2'))
+        self._connection_factory = connection_factory or pika.BlockingConnection
         
         self._connection: Optional[pika.BlockingConnection] = None
         self._channel: Optional[pika.channel.Channel] = None
@@ -61,7 +90,7 @@ class RabbitMQService:
                 heartbeat=600,
                 blocked_connection_timeout=300
             )
-            self._connection = pika.BlockingConnection(parameters)
+            self._connection = self._connection_factory(parameters)
             logger.info(f"Connected to RabbitMQ at {self.host}:{self.port}")
         return self._connection
     
@@ -73,15 +102,16 @@ class RabbitMQService:
         return self._channel
     
     def _ensure_queue(self):
-        """Ensure the queue exists and is durable"""
+        """Ensure the queue and its dead-letter queue exist and are durable"""
         try:
             channel = self._get_channel()
-            channel.queue_declare(
-                queue=self.queue_name,
-                durable=True,  # Queue survives broker restarts
-                exclusive=False,
-                auto_delete=False
-            )
+            for queue in (self.queue_name, self.dead_letter_queue):
+                channel.queue_declare(
+                    queue=queue,
+                    durable=True,  # Queue survives broker restarts
+                    exclusive=False,
+                    auto_delete=False
+                )
             logger.debug(f"Queue '{self.queue_name}' ensured")
         except (AMQPConnectionError, AMQPChannelError) as e:
             logger.error(f"Error ensuring queue exists: {e}")
@@ -172,6 +202,61 @@ class RabbitMQService:
             logger.error(f"Unexpected error adding file to queue: {e}")
             raise
     
+    def add_files_to_queue(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Add several files to the processing queue in one AMQP transaction
+        
+        Args:
+            entries: One dict per file with the keyword arguments of add_file_to_queue
+            
+        Returns:
+            Queue entry details per file, in order. Either every message is
+            enqueued or none is.
+        """
+        if not entries:
+            return []
+        self._ensure_connection()
+        # Transactions are per channel; use a dedicated one so the shared channel stays non-transactional
+        channel = self._get_connection().channel()
+        try:
+            channel.tx_select()
+            created_at = datetime.utcnow().isoformat()
+            queued = []
+            for entry in entries:
+                message_data = {
+                    "filename": entry["filename"],
+                    "file_path": entry["file_path"],
+                    "file_hash": entry.get("file_hash"),
+                    "folder": entry.get("folder", "l0"),
+                    "storage_type": entry.get("storage_type", "local"),
+                    "source": entry.get("source", "api"),
+                    "file_classification": entry.get("file_classification", ""),
+                    "username": entry.get("username", ""),
+                    "status": "pending",
+                    "created_at": created_at
+                }
+                channel.basic_publish(
+                    exchange='',
+                    routing_key=self.queue_name,
+                    body=json.dumps(message_data),
+                    properties=pika.BasicProperties(
+                        delivery_mode=2,  # Make message persistent
+                        content_type='application/json'
+                    )
+                )
+                queued.append({"id": None, **message_data})
+            channel.tx_commit()
+            logger.info(f"Added {len(queued)} files to RabbitMQ queue '{self.queue_name}' in one transaction")
+            return queued
+        except (AMQPConnectionError, AMQPChannelError) as e:
+            logger.error(f"Error adding files to RabbitMQ queue: {e}")
+            if channel.is_open:
+                channel.tx_rollback()
+            raise
+        finally:
+            if channel.is_open:
+                channel.close()
+    
     def get_next_file_from_queue(self) -> Optional[Dict[str, Any]]:
         """
         Get the next file from the queue (consume one message)
@@ -198,6 +283,7 @@ class RabbitMQService:
             
             # Store delivery tag for acknowledgment later
             message_data['_delivery_tag'] = method_frame.delivery_tag
+            message_data['_attempts'] = self._get_attempts(header_frame)
             
             logger.info(f"Retrieved file {message_data.get('filename')} from RabbitMQ queue")
             return message_data
@@ -209,26 +295,167 @@ class RabbitMQService:
             logger.error(f"Unexpected error getting next file from queue: {e}")
             raise
     
-    def acknowledge_message(self, delivery_tag: int, success: bool = True):
+    def acknowledge_message(
+        self,
+        delivery_tag: int,
+        success: bool = True,
+        message_data: Optional[Dict[str, Any]] = None,
+        error_message: Optional[str] = None
+    ) -> str:
         """
         Acknowledge message processing
         
         Args:
             delivery_tag: Delivery tag from the message
-            success: True to ack (remove from queue), False to nack (requeue)
+            success: True to ack (remove from queue), False to retry
+            message_data: Message as returned by get_next_file_from_queue/consume. When given,
+                a failed message is republished with an incremented attempt count, or moved to
+                the dead-letter queue after max_attempts; otherwise it is nacked and requeued.
+            error_message: Failure reason recorded on dead-lettered messages
+            
+        Returns:
+            Outcome: 'processed', 'requeued' or 'dead_lettered'
         """
         try:
             channel = self._get_channel()
             if success:
                 channel.basic_ack(delivery_tag=delivery_tag)
                 logger.debug(f"Acknowledged message with delivery_tag {delivery_tag}")
-            else:
+                return 'processed'
+            
+            if message_data is None:
                 channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
                 logger.debug(f"Rejected and requeued message with delivery_tag {delivery_tag}")
+                return 'requeued'
+            
+            attempts = message_data.get('_attempts', 0) + 1
+            payload = {key: value for key, value in message_data.items() if not key.startswith('_')}
+            if attempts >= self.max_attempts:
+                self._publish(self.dead_letter_queue, payload, {ATTEMPTS_HEADER: attempts, "x-error": error_message or ""})
+                outcome = 'dead_lettered'
+                logger.warning(f"Moved {payload.get('filename')} to dead-letter queue '{self.dead_letter_queue}' after {attempts} attempt(s)")
+            else:
+                # Republish to the tail with the attempt count; nack/requeue cannot carry it
+                self._publish(self.queue_name, payload, {ATTEMPTS_HEADER: attempts})
+                outcome = 'requeued'
+                logger.debug(f"Requeued {payload.get('filename')} (attempt {attempts}/{self.max_attempts})")
+            # Ack only after the copy is published so the message is never lost
+            channel.basic_ack(delivery_tag=delivery_tag)
+            return outcome
         except (AMQPConnectionError, AMQPChannelError) as e:
             logger.error(f"Error acknowledging message: {e}")
             raise
     
+    def _publish(self, queue: str, payload: Dict[str, Any], headers: Optional[Dict[str, Any]] = None):
+        """Publish a persistent JSON message to a queue"""
+        self._get_channel().basic_publish(
+            exchange='',
+            routing_key=queue,
+            body=json.dumps(payload),
+            properties=pika.BasicProperties(
+                delivery_mode=2,  # Make message persistent
+                content_type='application/json',
+                headers=headers
+            )
+        )
+    
+    @staticmethod
+    def _get_attempts(properties) -> int:
+        headers = getattr(properties, 'headers', None) or {}
+        try:
+            return int(headers.get(ATTEMPTS_HEADER, 0))
+        except (TypeError, ValueError):
+            return 0
+    
+    def consume(
+        self,
+        handler: Callable[[Dict[str, Any]], HandlerResult],
+        num_workers: Optional[int] = None,
+        stop_event: Optional[threading.Event] = None,
+        stop_when_empty: bool = False
+    ) -> Dict[str, int]:
+        """
+        Consume messages with basic_consume and process them on a bounded worker pool
+        
+        The broker pushes up to `prefetch_count` unacked messages; each is handed to
+        `handler` on a worker thread. Acks are marshalled back to the connection
+        thread (pika connections are not thread-safe), which keeps servicing
+        heartbeats while documents are being processed.
+        
+        Args:
+            handler: Called with the message dict; returns success or (success, error_message)
+            num_workers: Size of the worker pool (default: from RABBITMQ_WORKERS env var or 2)
+            stop_event: Stop consuming once set
+            stop_when_empty: Stop once the queue is drained and no work is in flight
+            
+        Returns:
+            Counts of processed, requeued and dead-lettered messages
+        """
+        num_workers = num_workers or self.num_workers
+        stats = {'processed': 0, 'requeued': 0, 'dead_lettered': 0}
+        in_flight = set()  # delivery tags; only touched on the connection thread
+        
+        self._ensure_queue()
+        connection = self._get_connection()
+        channel = self._get_channel()
+        channel.basic_qos(prefetch_count=self.prefetch_count or num_workers)
+        executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="RabbitMQWorker")
+        
+        def finish(delivery_tag: int, message_data: Dict[str, Any], success: bool, error_message: Optional[str]):
+            in_flight.discard(delivery_tag)
+            outcome = self.acknowledge_message(delivery_tag, success=success, message_data=message_data, error_message=error_message)
+            stats[outcome] += 1
+        
+        def on_done(delivery_tag: int, message_data: Dict[str, Any], future):
+            try:
+                result = future.result()
+                success, error_message = result if isinstance(result, tuple) else (bool(result), None)
+            except Exception as e:
+                success, error_message = False, str(e)
+                logger.error(f"Error processing file {message_data.get('filename')}: {e}")
+            connection.add_callback_threadsafe(
+                functools.partial(finish, delivery_tag, message_data, success, error_message))
+        
+        def on_message(ch, method, properties, body):
+            try:
+                message_data = json.loads(body)
+            except (ValueError, UnicodeDecodeError) as e:
+                logger.error(f"Dead-lettering unparseable message: {e}")
+                ch.basic_publish(exchange='', routing_key=self.dead_letter_queue, body=body,
+                                 properties=pika.BasicProperties(delivery_mode=2, headers={"x-error": str(e)}))
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+                stats['dead_lettered'] += 1
+                return
+            message_data['_delivery_tag'] = method.delivery_tag
+            message_data['_attempts'] = self._get_attempts(properties)
+            in_flight.add(method.delivery_tag)
+            future = executor.submit(handler, message_data)
+            future.add_done_callback(functools.partial(on_done, method.delivery_tag, message_data))
+        
+        consumer_tag = channel.basic_consume(queue=self.queue_name, on_message_callback=on_message, auto_ack=False)
+        logger.info(f"Consuming '{self.queue_name}' with {num_workers} worker(s), prefetch {self.prefetch_count or num_workers}")
+        
+        try:
+            while not (stop_event is not None and stop_event.is_set()):
+                connection.process_data_events(time_limit=1)
+                if stop_when_empty and not in_flight and self._ready_count() == 0:
+                    break
+        finally:
+            # Deliveries not yet dispatched are requeued by the broker on cancel
+            channel.basic_cancel(consumer_tag)
+            executor.shutdown(wait=True)
+            # Run the acks scheduled by the last workers
+            while in_flight and connection.is_open:
+                connection.process_data_events(time_limit=1)
+        
+        logger.info(f"Consumer stopped. Processed: {stats['processed']}, Requeued: {stats['requeued']}, Dead-lettered: {stats['dead_lettered']}")
+        return stats
+    
+    def _ready_count(self) -> int:
+        """Messages ready for delivery (excludes unacked deliveries)"""
+        result = self._get_channel().queue_declare(queue=self.queue_name, durable=True, passive=True)
+        return result.method.message_count
+    
     def get_queue_status(self) -> Dict[str, Any]:
         """
         Get current queue status statistics
@@ -248,12 +475,25 @@ class RabbitMQService:
             message_count = queue_declare_result.method.message_count
             consumer_count = queue_declare_result.method.consumer_count
             
+            # The dead-letter queue is declared by the first publish/consume; before that nothing has failed.
+            # A failed passive declare closes the channel, _get_channel opens a fresh one next time
+            try:
+                dead_letter_count = channel.queue_declare(
+                    queue=self.dead_letter_queue,
+                    durable=True,
+                    passive=True
+                ).method.message_count
+            except ChannelClosedByBroker as e:
+                if e.reply_code != 404:
+                    raise
+                dead_letter_count = 0
+            
             return {
                 'total': message_count,  # Total messages in queue
                 'pending': message_count,  # All messages are pending
                 'processing': 0,  # RabbitMQ doesn't track processing state
                 'completed': 0,  # Not tracked in RabbitMQ
-                'failed': 0,  # Not tracked in RabbitMQ
+                'failed': dead_letter_count,  # Messages in the dead-letter queue
                 'consumer_count': consumer_count
             }
             
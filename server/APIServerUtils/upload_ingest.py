@@ -0,0 +1,192 @@
+"""
+Upload ingestion: one pass from the request body to its place in the layers
+
+The upload is copied to a temp file next to its destination in large chunks
+(off the event loop); the SHA-256 and the MIME sniff are computed from the same
+chunks, and the temp file is renamed into l0 atomically. The l1 copy is a
+hardlink (or a reflink, or as a last resort a copy) of the l0 file, so a large
+PDF is written to disk exactly once.
+"""
+
+import os
+import uuid
+import errno
+import shutil
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import BinaryIO, List, Optional
+
+import filetype
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# filetype only needs the first bytes of a file to recognise it
+_SNIFF_BYTES = 8192
+
+# Fallbacks when the content isn't recognised
+_EXTENSION_MIME_TYPES = {
+    '.txt': 'text/plain',
+    '.csv': 'text/csv',
+    '.json': 'application/json',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.xls': 'application/vnd.ms-excel',
+}
+
+# Linux FICLONE ioctl (_IOW(0x94, 9, int)): copy-on-write clone on btrfs/xfs
+_FICLONE = 0x40049409
+
+
+@dataclass
+class IngestedFile:
+    """An upload that has been written to its final l0 path"""
+    filename: str
+    path: str
+    sha256: str
+    size: int
+    mime_type: str
+
+
+@dataclass
+class StagedUpload:
+    """An upload written and hashed under a temp name next to its l0 path, not placed yet"""
+    ingested: IngestedFile
+    temp_path: str
+
+    def place(self) -> IngestedFile:
+        os.replace(self.temp_path, self.ingested.path)
+        return self.ingested
+
+    def discard(self):
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+def is_plain_filename(filename: Optional[str]) -> bool:
+    """True for a bare file name: no directories, so it can't point outside the target folder"""
+    return bool(filename) and os.path.basename(filename) == filename and filename not in ('.', '..')
+
+
+def guess_mime_type(head: bytes, filename: str) -> str:
+    """MIME type from the leading bytes, falling back to the file extension"""
+    kind = filetype.guess(head) if head else None
+    if kind is not None:
+        return kind.mime
+    return _EXTENSION_MIME_TYPES.get(os.path.splitext(filename)[1].lower(), 'application/octet-stream')
+
+
+def sniff_file(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> IngestedFile:
+    """Hash and sniff a file that is already on disk (single read pass)"""
+    sha256 = hashlib.sha256()
+    size = 0
+    head = b''
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            if len(head) < _SNIFF_BYTES:
+                head += chunk[:_SNIFF_BYTES - len(head)]
+            sha256.update(chunk)
+            size += len(chunk)
+    filename = os.path.basename(path)
+    return IngestedFile(filename, path, sha256.hexdigest(), size, guess_mime_type(head, filename))
+
+
+def stage_stream(source: BinaryIO, target_dir: str, filename: str,
+                 chunk_size: int = UPLOAD_CHUNK_SIZE) -> StagedUpload:
+    """Copy source to a temp file next to target_dir/filename, hashing and sniffing on the way"""
+    if not is_plain_filename(filename):
+        raise ValueError(f"A plain file name is required, got {filename!r}")
+    final_path = os.path.join(target_dir, filename)
+    os.makedirs(target_dir, exist_ok=True)
+    temp_path = os.path.join(target_dir, f".{filename}.upload-{uuid.uuid4().hex}")
+    sha256 = hashlib.sha256()
+    size = 0
+    head = b''
+    try:
+        with open(temp_path, 'wb') as out:
+            for chunk in iter(lambda: source.read(chunk_size), b''):
+                if len(head) < _SNIFF_BYTES:
+                    head += chunk[:_SNIFF_BYTES - len(head)]
+                sha256.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return StagedUpload(IngestedFile(filename, final_path, sha256.hexdigest(), size, guess_mime_type(head, filename)),
+                        temp_path)
+
+
+def ingest_stream(source: BinaryIO, target_dir: str, filename: str,
+                  chunk_size: int = UPLOAD_CHUNK_SIZE) -> IngestedFile:
+    """Copy source into target_dir/filename, hashing and sniffing on the way; the file appears atomically"""
+    return stage_stream(source, target_dir, filename, chunk_size).place()
+
+
+async def ingest_upload(upload: UploadFile, target_dir: str) -> IngestedFile:
+    """ingest_stream for a FastAPI upload, run in the threadpool so the event loop keeps serving"""
+    return await run_in_threadpool(ingest_stream, upload.file, target_dir, upload.filename)
+
+
+async def ingest_upload_batch(uploads: List[UploadFile], target_dir: str) -> List[IngestedFile]:
+    """
+    All-or-nothing ingest_upload for several files
+
+    Every upload is staged under a temp name first; only when all of them are
+    written are they renamed into target_dir. If one fails, the others are
+    discarded and target_dir is left as it was.
+    """
+    staged: List[StagedUpload] = []
+    try:
+        for upload in uploads:
+            staged.append(await run_in_threadpool(stage_stream, upload.file, target_dir, upload.filename))
+    except BaseException:
+        for item in staged:
+            item.discard()
+        raise
+    return [item.place() for item in staged]
+
+
+def _reflink(src: str, dst: str) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+            return True
+        except OSError:
+            pass
+    os.remove(dst)
+    return False
+
+
+def link_into_layer(src: str, dst: str) -> str:
+    """
+    Make dst a copy of src without rewriting the data where the filesystem allows it
+
+    Tries a hardlink, then a reflink, then falls back to a byte copy. Because l0
+    files are only ever replaced by rename (never rewritten in place), a hardlinked
+    l1 copy keeps its content when a newer upload takes over the l0 name. Returns
+    the method used ('exists', 'hardlink', 'reflink' or 'copy').
+    """
+    if os.path.exists(dst):
+        return 'exists'  # content-addressed: same hash, same bytes
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        os.link(src, dst)
+        return 'hardlink'
+    except FileExistsError:
+        return 'exists'
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP):
+            raise
+    if _reflink(src, dst):
+        return 'reflink'
+    shutil.copy2(src, dst)
+    return 'copy'
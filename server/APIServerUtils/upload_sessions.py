@@ -0,0 +1,139 @@
+"""
+Resumable upload sessions (tus-style)
+
+A client creates a session with the file name and total size, then sends the
+bytes in PATCH chunks, each tagged with the offset it starts at. The server
+persists every chunk before acknowledging the new offset, so an interrupted
+upload resumes from the last acknowledged offset (HEAD/GET the session)
+instead of starting over. Completed sessions are committed together as one
+batch, which moves each file into l0 with an atomic rename.
+"""
+
+import os
+import json
+import uuid
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from server.APIServerUtils.upload_ingest import IngestedFile, is_plain_filename, sniff_file
+
+UPLOAD_SESSIONS_DIR = Path(os.getenv(
+    "UPLOAD_SESSIONS_DIR",
+    str(Path(__file__).resolve().parent.parent.parent / "data" / "frameDemo" / "upload_sessions")))
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE_MB", "2048")) * 1024 * 1024
+
+
+class UploadSessionError(Exception):
+    """Raised for requests that don't fit the session state; `status_code` is the HTTP status to answer with"""
+
+    def __init__(self, message: str, status_code: int = 400, offset: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+class UploadSessionStore:
+    """Session state lives on disk (info.json + data.part) so uploads survive API restarts"""
+
+    def __init__(self, root: Path = UPLOAD_SESSIONS_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, upload_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _session_dir(self, upload_id: str) -> Path:
+        # upload ids are uuid hex strings; anything else can't name a session
+        if len(upload_id) != 32 or any(c not in "0123456789abcdef" for c in upload_id):
+            raise UploadSessionError(f"Unknown upload {upload_id}", 404)
+        return self.root / upload_id
+
+    def create(self, filename: str, size: int, username: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if not is_plain_filename(filename):
+            raise UploadSessionError("A plain file name is required")
+        if size < 0 or size > MAX_UPLOAD_SIZE:
+            raise UploadSessionError(f"Upload size must be between 0 and {MAX_UPLOAD_SIZE} bytes", 413)
+        upload_id = uuid.uuid4().hex
+        session_dir = self.root / upload_id
+        session_dir.mkdir()
+        (session_dir / "data.part").touch()
+        info = {"upload_id": upload_id, "filename": filename, "size": size,
+                "username": username, "metadata": metadata or {}}
+        with open(session_dir / "info.json", "w") as f:
+            json.dump(info, f)
+        return self.status(upload_id, username)
+
+    def _info(self, upload_id: str, username: Optional[str] = None) -> Dict[str, Any]:
+        """Session info; with a username, another user's session is reported as unknown (404, not 403)"""
+        try:
+            with open(self._session_dir(upload_id) / "info.json") as f:
+                info = json.load(f)
+        except FileNotFoundError:
+            raise UploadSessionError(f"Unknown upload {upload_id}", 404)
+        if username is not None and info.get("username") != username:
+            raise UploadSessionError(f"Unknown upload {upload_id}", 404)
+        return info
+
+    def status(self, upload_id: str, username: Optional[str] = None) -> Dict[str, Any]:
+        """Session info plus the committed offset (bytes received so far)"""
+        info = self._info(upload_id, username)
+        offset = os.path.getsize(self._session_dir(upload_id) / "data.part")
+        return {**info, "offset": offset, "complete": offset == info["size"]}
+
+    def append(self, upload_id: str, offset: int, chunk: bytes, username: Optional[str] = None) -> int:
+        """Write chunk at offset (which must equal the received size) and return the new offset"""
+        with self._lock(upload_id):
+            info = self._info(upload_id, username)
+            part_path = self._session_dir(upload_id) / "data.part"
+            current = os.path.getsize(part_path)
+            if offset != current:
+                raise UploadSessionError(f"Upload-Offset {offset} does not match received {current}", 409, current)
+            if current + len(chunk) > info["size"]:
+                raise UploadSessionError("Chunk goes past the declared upload size", 413, current)
+            with open(part_path, "ab") as f:
+                f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            return current + len(chunk)
+
+    def finalize(self, upload_id: str, target_dir: str, username: Optional[str] = None) -> IngestedFile:
+        """Move a complete upload into target_dir (atomic rename), hash it and drop the session"""
+        with self._lock(upload_id):
+            info = self.status(upload_id, username)
+            if not info["complete"]:
+                raise UploadSessionError(
+                    f"Upload {upload_id} is incomplete ({info['offset']}/{info['size']} bytes)", 409, info["offset"])
+            final_path = os.path.join(target_dir, info["filename"])
+            os.makedirs(target_dir, exist_ok=True)
+            os.replace(self._session_dir(upload_id) / "data.part", final_path)
+            shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+        return sniff_file(final_path)
+
+    def abort(self, upload_id: str, username: Optional[str] = None):
+        with self._lock(upload_id):
+            self._info(upload_id, username)
+            shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+
+
+# Global instance
+_global_upload_session_store = None
+_global_upload_session_store_lock = threading.Lock()
+
+
+def get_upload_session_store() -> UploadSessionStore:
+    """Get global upload session store instance"""
+    global _global_upload_session_store
+    if _global_upload_session_store is None:
+        with _global_upload_session_store_lock:
+            if _global_upload_session_store is None:
+                _global_upload_session_store = UploadSessionStore()
+    return _global_upload_session_store
@@ -0,0 +1,235 @@
+"""
+In-memory AMQP stand-in for RabbitMQService
+
+Implements the part of pika's BlockingConnection/channel API the service uses
+(queue_declare, basic_qos, basic_consume, basic_get, basic_publish, basic_ack,
+basic_nack, tx_*, add_callback_threadsafe, process_data_events) on top of
+in-process queues, so the consumer can be exercised without a broker:
+
+    broker = InMemoryBroker()
+    service = RabbitMQService(connection_factory=broker.connect)
+
+Like RabbitMQ, publishing to a queue that doesn't exist drops the message, a
+passive declare of a missing queue closes the channel with a 404, and unacked
+deliveries go back to the head of their queue when their channel closes.
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from pika.exceptions import AMQPChannelError, ChannelClosedByBroker
+
+Message = Tuple[bytes, Any]  # (body, properties)
+
+
+class InMemoryBroker:
+    """Queues shared by every connection made through `connect`"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self.queues: Dict[str, Deque[Message]] = {}
+        # Number of further publishes that succeed before one raises (None: never fail)
+        self.fail_publishes_after: Optional[int] = None
+
+    def connect(self, parameters=None) -> "InMemoryConnection":
+        """connection_factory for RabbitMQService"""
+        return InMemoryConnection(self)
+
+    def messages(self, queue: str) -> List[Message]:
+        with self.lock:
+            return list(self.queues.get(queue, ()))
+
+    def publish(self, queue: str, body, properties=None):
+        """Enqueue as a producer would (no channel, no transaction)"""
+        with self.lock:
+            if queue in self.queues:
+                self.queues[queue].append((body.encode() if isinstance(body, str) else body, properties))
+                self.changed.notify_all()
+
+
+class InMemoryConnection:
+    def __init__(self, broker: InMemoryBroker):
+        self.broker = broker
+        self.is_open = True
+        self._channels: List["InMemoryChannel"] = []
+        self._callbacks: Deque[Callable[[], None]] = deque()
+
+    @property
+    def is_closed(self) -> bool:
+        return not self.is_open
+
+    def channel(self) -> "InMemoryChannel":
+        channel = InMemoryChannel(self)
+        self._channels.append(channel)
+        return channel
+
+    def add_callback_threadsafe(self, callback: Callable[[], None]):
+        with self.broker.lock:
+            self._callbacks.append(callback)
+            self.broker.changed.notify_all()
+
+    def process_data_events(self, time_limit: float = 0):
+        """Run scheduled callbacks and dispatch deliveries; wait up to time_limit if there is nothing to do"""
+        deadline = time.monotonic() + (time_limit or 0)
+        while True:
+            with self.broker.lock:
+                callbacks = list(self._callbacks)
+                self._callbacks.clear()
+            for callback in callbacks:
+                callback()
+            deliveries = [delivery for channel in self._channels if channel.is_open
+                          for delivery in channel._take_deliveries()]
+            for callback, channel, method, properties, body in deliveries:
+                callback(channel, method, properties, body)
+            if callbacks or deliveries:
+                return
+            with self.broker.lock:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                if not self._callbacks:
+                    self.broker.changed.wait(min(remaining, 0.05))
+
+    def close(self):
+        for channel in list(self._channels):
+            if channel.is_open:
+                channel.close()
+        self.is_open = False
+
+
+class InMemoryChannel:
+    _tags = itertools.count(1)
+
+    def __init__(self, connection: InMemoryConnection):
+        self.connection = connection
+        self.broker = connection.broker
+        self.is_open = True
+        self.prefetch_count = 0
+        self._consumers: Dict[str, Tuple[str, Callable]] = {}
+        self._unacked: Dict[int, Tuple[str, Message]] = {}
+        self._tx: Optional[List[Tuple[str, Message]]] = None
+
+    @property
+    def is_closed(self) -> bool:
+        return not self.is_open
+
+    def _check_open(self):
+        if not self.is_open:
+            raise AMQPChannelError("Channel is closed")
+
+    def queue_declare(self, queue: str, durable: bool = False, passive: bool = False,
+                      exclusive: bool = False, auto_delete: bool = False, arguments=None):
+        self._check_open()
+        with self.broker.lock:
+            if queue not in self.broker.queues:
+                if passive:
+                    self.close()
+                    raise ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue}'")
+                self.broker.queues[queue] = deque()
+            consumers = sum(1 for channel in self.connection._channels if channel.is_open
+                            for name, _ in channel._consumers.values() if name == queue)
+            return SimpleNamespace(method=SimpleNamespace(
+                queue=queue, message_count=len(self.broker.queues[queue]), consumer_count=consumers))
+
+    def basic_qos(self, prefetch_count: int = 0, **kwargs):
+        self._check_open()
+        self.prefetch_count = prefetch_count
+
+    def basic_consume(self, queue: str, on_message_callback: Callable, auto_ack: bool = False, **kwargs) -> str:
+        self._check_open()
+        consumer_tag = f"ctag-{next(self._tags)}"
+        self._consumers[consumer_tag] = (queue, on_message_callback)
+        return consumer_tag
+
+    def basic_cancel(self, consumer_tag: str):
+        self._consumers.pop(consumer_tag, None)
+
+    def _deliver(self, queue: str, message: Message) -> Tuple[SimpleNamespace, Any, bytes]:
+        delivery_tag = next(self._tags)
+        self._unacked[delivery_tag] = (queue, message)
+        body, properties = message
+        return SimpleNamespace(delivery_tag=delivery_tag, routing_key=queue), properties, body
+
+    def _take_deliveries(self) -> list:
+        """Pop messages for this channel's consumers, respecting the prefetch window"""
+        deliveries = []
+        with self.broker.lock:
+            for queue, callback in list(self._consumers.values()):
+                pending = self.broker.queues.get(queue)
+                while pending and (not self.prefetch_count or len(self._unacked) < self.prefetch_count):
+                    method, properties, body = self._deliver(queue, pending.popleft())
+                    deliveries.append((callback, self, method, properties, body))
+        return deliveries
+
+    def basic_get(self, queue: str, auto_ack: bool = False):
+        self._check_open()
+        with self.broker.lock:
+            pending = self.broker.queues.get(queue)
+            if not pending:
+                return None, None, None
+            method, properties, body = self._deliver(queue, pending.popleft())
+            if auto_ack:
+                self._unacked.pop(method.delivery_tag)
+            return method, properties, body
+
+    def basic_publish(self, exchange: str, routing_key: str, body, properties=None, mandatory: bool = False):
+        self._check_open()
+        with self.broker.lock:
+            if self.broker.fail_publishes_after is not None:
+                if self.broker.fail_publishes_after <= 0:
+                    raise AMQPChannelError("Simulated publish failure")
+                self.broker.fail_publishes_after -= 1
+            message = (body.encode() if isinstance(body, str) else body, properties)
+            if self._tx is not None:
+                self._tx.append((routing_key, message))
+            elif routing_key in self.broker.queues:
+                self.broker.queues[routing_key].append(message)
+                self.broker.changed.notify_all()
+
+    def basic_ack(self, delivery_tag: int, multiple: bool = False):
+        self._check_open()
+        with self.broker.lock:
+            if self._unacked.pop(delivery_tag, None) is None:
+                raise AMQPChannelError(f"Unknown delivery tag {delivery_tag}")
+
+    def basic_nack(self, delivery_tag: int, multiple: bool = False, requeue: bool = True):
+        self._check_open()
+        with self.broker.lock:
+            queue, message = self._unacked.pop(delivery_tag)
+            if requeue:
+                self.broker.queues[queue].appendleft(message)
+                self.broker.changed.notify_all()
+
+    def tx_select(self):
+        self._check_open()
+        self._tx = []
+
+    def tx_commit(self):
+        self._check_open()
+        with self.broker.lock:
+            for routing_key, message in self._tx or []:
+                if routing_key in self.broker.queues:
+                    self.broker.queues[routing_key].append(message)
+            self._tx = []
+            self.broker.changed.notify_all()
+
+    def tx_rollback(self):
+        self._check_open()
+        self._tx = []
+
+    def close(self):
+        """Unacked deliveries go back to the head of their queues, as on a real channel close"""
+        with self.broker.lock:
+            for queue, message in reversed(list(self._unacked.values())):
+                if queue in self.broker.queues:
+                    self.broker.queues[queue].appendleft(message)
+            self._unacked.clear()
+            self._consumers.clear()
+            self._tx = None
+            self.is_open = False
+            self.broker.changed.notify_all()
@@ -0,0 +1,158 @@
+"""
+RabbitMQService consumer tests against the in-memory AMQP stand-in
+
+Usage:
+    python -m pytest server/test/test_rabbitmq_service.py
+"""
+
+import json
+
+import pika
+import pytest
+from pika.exceptions import AMQPChannelError
+
+from amqp_standin import InMemoryBroker
+from server.APIServerUtils.rabbitmq_service import ATTEMPTS_HEADER, RabbitMQService
+
+
+@pytest.fixture
+def broker():
+    return InMemoryBroker()
+
+
+@pytest.fixture
+def service(broker):
+    service = RabbitMQService(connection_factory=broker.connect, max_attempts=3)
+    yield service
+    service.close()
+
+
+def _entry(name):
+    return {"filename": name, "file_path": f"/data/l0/{name}"}
+
+
+def _headers(message):
+    _, properties = message
+    return (properties.headers or {}) if properties is not None else {}
+
+
+def test_consume_acks_processed_messages(broker, service):
+    service.add_files_to_queue([_entry("a.pdf"), _entry("b.pdf")])
+    seen = []
+
+    stats = service.consume(lambda message: seen.append(message["filename"]) or True,
+                            num_workers=2, stop_when_empty=True)
+
+    assert sorted(seen) == ["a.pdf", "b.pdf"]
+    assert stats == {"processed": 2, "requeued": 0, "dead_lettered": 0}
+    assert broker.messages(service.queue_name) == []
+    assert broker.messages(service.dead_letter_queue) == []
+
+
+def test_failed_message_is_retried_with_attempts_header(broker, service):
+    service.add_file_to_queue("a.pdf", "/data/l0/a.pdf")
+    attempts = []
+
+    def handler(message):
+        attempts.append(message["_attempts"])
+        return (False, "OCR failed") if len(attempts) == 1 else True
+
+    stats = service.consume(handler, num_workers=1, stop_when_empty=True)
+
+    # The retry is a republished copy carrying the attempt count in its headers
+    assert attempts == [0, 1]
+    assert stats == {"processed": 1, "requeued": 1, "dead_lettered": 0}
+    assert broker.messages(service.queue_name) == []
+
+
+def test_message_is_dead_lettered_after_max_attempts(broker, service):
+    service.add_file_to_queue("poison.pdf", "/data/l0/poison.pdf")
+    calls = []
+
+    stats = service.consume(lambda message: calls.append(message["_attempts"]) or (False, "boom"),
+                            num_workers=1, stop_when_empty=True)
+
+    assert calls == [0, 1, 2]
+    assert stats == {"processed": 0, "requeued": 2, "dead_lettered": 1}
+    assert broker.messages(service.queue_name) == []
+    [dead] = broker.messages(service.dead_letter_queue)
+    assert json.loads(dead[0])["filename"] == "poison.pdf"
+    assert _headers(dead) == {ATTEMPTS_HEADER: 3, "x-error": "boom"}
+
+
+def test_handler_exception_counts_as_failure(broker, service):
+    service.add_file_to_queue("a.pdf", "/data/l0/a.pdf")
+
+    def handler(message):
+        raise RuntimeError("crashed")
+
+    stats = service.consume(handler, num_workers=1, stop_when_empty=True)
+
+    assert stats["dead_lettered"] == 1
+    [dead] = broker.messages(service.dead_letter_queue)
+    assert _headers(dead)["x-error"] == "crashed"
+
+
+def test_unparseable_message_is_dead_lettered_without_calling_handler(broker, service):
+    service._ensure_queue()
+    broker.publish(service.queue_name, b"{not json")
+    calls = []
+
+    stats = service.consume(lambda message: calls.append(message) or True, stop_when_empty=True)
+
+    assert calls == []
+    assert stats == {"processed": 0, "requeued": 0, "dead_lettered": 1}
+    [dead] = broker.messages(service.dead_letter_queue)
+    assert dead[0] == b"{not json"
+    assert "x-error" in _headers(dead)
+
+
+def test_stop_when_empty_returns_on_an_empty_queue(service):
+    stats = service.consume(lambda message: True, stop_when_empty=True)
+
+    assert stats == {"processed": 0, "requeued": 0, "dead_lettered": 0}
+
+
+def test_stop_when_empty_drains_more_messages_than_the_prefetch_window(broker, service):
+    service.add_files_to_queue([_entry(f"{i}.pdf") for i in range(10)])
+    seen = []
+
+    stats = service.consume(lambda message: seen.append(message["filename"]) or True,
+                            num_workers=2, stop_when_empty=True)
+
+    assert len(seen) == 10
+    assert stats["processed"] == 10
+    assert broker.messages(service.queue_name) == []
+
+
+def test_add_files_to_queue_rolls_back_on_publish_failure(broker, service):
+    service._ensure_queue()
+    broker.fail_publishes_after = 2
+
+    with pytest.raises(AMQPChannelError):
+        service.add_files_to_queue([_entry("a.pdf"), _entry("b.pdf"), _entry("c.pdf")])
+
+    assert broker.messages(service.queue_name) == []
+
+    broker.fail_publishes_after = None
+    queued = service.add_files_to_queue([_entry("a.pdf"), _entry("b.pdf")])
+    assert [entry["filename"] for entry in queued] == ["a.pdf", "b.pdf"]
+    assert len(broker.messages(service.queue_name)) == 2
+
+
+def test_queue_status_reports_zero_failed_before_the_dead_letter_queue_exists(broker, service):
+    service.add_file_to_queue("a.pdf", "/data/l0/a.pdf")
+    del broker.queues[service.dead_letter_queue]
+
+    status = service.get_queue_status()
+
+    assert status["pending"] == 1
+    assert status["failed"] == 0
+
+
+def test_queue_status_counts_dead_lettered_messages(broker, service):
+    service._ensure_queue()
+    broker.publish(service.dead_letter_queue, json.dumps({"filename": "x.pdf"}),
+                   pika.BasicProperties(headers={ATTEMPTS_HEADER: 3}))
+
+    assert service.get_queue_status()["failed"] == 1
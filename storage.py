@@ -1,10 +1,14 @@
 import os
 import json
+from contextlib import ExitStack
 import pandas as pd
-from pathlib import Path
 from utils.jsonConversionHelper import getLambdaFromString
+from tabularFormats import getTableFormat, compileFilter, StagedWrite, SQLiteTableFormat, getTempPath
+from fileStorages import getFileStorage
+from variableDumps import writeVariableDump, readVariableDump
+from jsonArtifacts import isCompressionEnabled, writeJSONArtifact, findJSONArtifact, getCompressedPath, readCompressedBytes
+from utils.tableCache import get_table_cache, file_signature
 import utils.logger as _logger
-import pickle
 import shutil
 from PyPDF2 import PdfWriter
 logger=_logger.getLogger('dev')
@@ -13,98 +17,105 @@ class STORAGE():
     def __init__(self,aClient: str,aStorageConfig: dict):
         self.client=aClient
         self.storageConfig=aStorageConfig
+        self.fileStorage=getFileStorage(aStorageConfig)
+        self.tableFormat=getTableFormat(aStorageConfig)
+        self.tableCache=get_table_cache()
+        self.compressJSON=isCompressionEnabled(aStorageConfig)
+        if not self.fileStorage.isLocal and isinstance(self.tableFormat,SQLiteTableFormat):
+            raise Exception(f"sqlite tables need a local file storage, not {self.fileStorage.name}")
 
     def fileExists(self,aLocalFilePath: str):
-        return os.path.exists(aLocalFilePath)
+        # for object storage this also brings the file into the local cache, so it can be opened at aLocalFilePath
+        return self.fileStorage.exists(aLocalFilePath)
+    
+    def publishLocalFile(self,aLocalFilePath: str):
+        """Push a file written directly under getLocalFilePath (not via doDataOperation) to the file storage"""
+        self.fileStorage.publish(aLocalFilePath)
     
     def getAllLayerNFiles(self,aLayerName: str,subFolders: list=[]):
-        self.onlySupportedForOnPrem()
-        files=os.listdir(self.getDir(aLayerName,subFolders))
+        files=self.fileStorage.listDir(self.getDir(aLayerName,subFolders))
         if '.ipynb_checkpoints' in files:
             files.remove('.ipynb_checkpoints')
         return files
     
     def getDir(self,aLayerName: str,subFolders: list=[]):
-        self.onlySupportedForOnPrem()
         folderPath=os.path.join(self.getLayerNFolder(aLayerName),*subFolders)
         if not os.path.exists(folderPath):
             os.makedirs(folderPath, exist_ok=True)
         return folderPath
     
-    def _handleTabularOperation(self,aDataOperation: dict):
+    def _getRowsAsDF(self,aRows):
+        # boxes hand over DataFrames (or lists of records); JSON strings are still accepted from older boxes
+        if isinstance(aRows,pd.DataFrame):
+            return aRows
+        if isinstance(aRows,str):
+            aRows=json.loads(aRows)
+        return pd.DataFrame(aRows)
+
+    def _getTableOperation(self,aDataOperation: dict):
+        """Translate a tabular dataOp into (basePath, table format operation); operation is None when there is nothing to write"""
         myOpParams=aDataOperation['opParams']
+        myBasePath=self.getLocalFilePath(myOpParams['layerName'],myOpParams['tableName'])
 
         if myOpParams['operation']=='replaceOrAppendByKey':
-            myDF=pd.DataFrame(json.loads(aDataOperation['rows']))
-            myFilePath=self.getLocalFilePath(myOpParams['layerName'],myOpParams['tableName'])+'.csv'
-            if os.path.exists(myFilePath):
-                logger.info('%s already exists, appending %d rows to it' %(myOpParams['tableName'],len(myDF)))
-                myExistingDF=self.getFullTableAsDF(myOpParams['layerName'],myOpParams['tableName'])
-                assert myExistingDF.dtypes.equals(myDF.dtypes), 'dont know how to append unmatched schemas %s %s' %(str(myExistingDF.dtypes),str(myDF.dtypes))
-                
-                startingLen=len(myExistingDF)
-                myExistingDF=myExistingDF.merge(myDF[myOpParams['key']],on=myOpParams['key'], how='left', indicator=True).query('_merge == "left_only"').drop('_merge', axis=1)
-                endLen=len(myExistingDF)
-                if startingLen!=endLen:
-                    logger.info('removed %d rows in %s on key = %s'%(startingLen-endLen,myOpParams['tableName'],str(myOpParams['key'])))
-
-                assert myExistingDF.dtypes.equals(myDF.dtypes), 'schema changed? %s %s' %(str(myExistingDF.dtypes),str(myDF.dtypes))
-
-                myExistingDF=pd.concat([myExistingDF,myDF],ignore_index=True)
-                myExistingDF.to_csv(myFilePath,index=False)
-            else:
-                os.makedirs(self.getLayerNFolder(myOpParams['layerName']), exist_ok=True)
-                myDF.to_csv(myFilePath,index=False)
+            myDF=self._getRowsAsDF(aDataOperation['rows'])
+            if len(myDF)==0:
+                logger.info('no rows to write to %s'%(myOpParams['tableName']))
+                return myBasePath,None
+            return myBasePath,{'operation':'replaceOrAppendByKey','rows':myDF,'key':myOpParams['key']}
         elif myOpParams['operation']=='deleteByKey':
-            myFilePath=self.getLocalFilePath(myOpParams['layerName'],myOpParams['tableName'])+'.csv'
-            if os.path.exists(myFilePath):
-                myExistingDF=self.getFullTableAsDF(myOpParams['layerName'],myOpParams['tableName'])
-                startingLen=len(myExistingDF)
-                mask = pd.Series([True] * len(myExistingDF))
-                for col, val in aDataOperation['key'].items():
-                    mask &= myExistingDF[col] == val
-                myExistingDF=myExistingDF[~mask]
-                endLen=len(myExistingDF)
-                if startingLen!=endLen:
-                    logger.info('deleted %d rows in %s on key = %s'%(startingLen-endLen,myOpParams['tableName'],str(aDataOperation['key'])))
-
-                if len(myExistingDF)>0:
-                    myExistingDF.to_csv(myFilePath,index=False)
-                else:
-                    os.remove(myFilePath) # controversial
-            else:
-                logger.info('no table %s found in layer %s'%(myOpParams['tableName'],myOpParams['layerName']))
+            return myBasePath,{'operation':'deleteByKey','key':aDataOperation['key']}
         else:
             raise Exception(f"Only replaceOrAppendByKey and deleteByKey are supported for now not {myOpParams['operation']}")
 
-    def _handleStatusUpdateOperation(self,aDataOperation: dict):
+    def _logTableOperation(self,aDataOperation: dict,aRowCount):
         myOpParams=aDataOperation['opParams']
-        
+        if myOpParams['operation']=='replaceOrAppendByKey' and aRowCount:
+            logger.info('removed %d rows in %s on key = %s'%(aRowCount,myOpParams['tableName'],str(myOpParams['key'])))
+        elif myOpParams['operation']=='deleteByKey':
+            if aRowCount is None:
+                logger.info('no table %s found in layer %s'%(myOpParams['tableName'],myOpParams['layerName']))
+            elif aRowCount:
+                logger.info('deleted %d rows in %s on key = %s'%(aRowCount,myOpParams['tableName'],str(aDataOperation['key'])))
+
+    def _handleTabularOperation(self,aDataOperation: dict):
+        self.doDataOperations([aDataOperation])
+
+    def _applyStatusUpdate(self,aState: dict,aDataOperation: dict):
+        myOpParams=aDataOperation['opParams']
+
         if myOpParams['operation']=='replaceOrAppendByKey':
-            currentStatus=self.getState(myOpParams['layerName'])
-            currentTracker=currentStatus.get(myOpParams['trackerName'],[])
+            currentTracker=aState.get(myOpParams['trackerName'],[])
             currentTracker=currentTracker+myOpParams['key']
             currentTracker=list(set(currentTracker))
-            currentStatus[myOpParams['trackerName']]=currentTracker
-            self.updateState(myOpParams['layerName'],currentStatus)
+            aState[myOpParams['trackerName']]=currentTracker
         elif myOpParams['operation']=='replaceOrAppendKeyValue':
-            currentStatus=self.getState(myOpParams['layerName'])
-            if myOpParams['trackerName'] not in currentStatus:
-                currentStatus[myOpParams['trackerName']]={}
+            if myOpParams['trackerName'] not in aState:
+                aState[myOpParams['trackerName']]={}
 
-            currentStatus[myOpParams['trackerName']][myOpParams['key']]=myOpParams['value']
-            self.updateState(myOpParams['layerName'],currentStatus)
+            aState[myOpParams['trackerName']][myOpParams['key']]=myOpParams['value']
         else:
             raise Exception(f"Only replaceOrAppendByKey and replaceOrAppendKeyValue are supported for now not {myOpParams['operation']}")
 
+    def _handleStatusUpdateOperation(self,aDataOperation: dict):
+        self.doDataOperations([aDataOperation])
+
     def _handleJSONDumpOperation(self,aDataOperation: dict):
         myOpParams=aDataOperation['opParams']
         myFolderArray=myOpParams['folderArray']
         myFilePath=self.getLocalFilePath(myOpParams['layerName'],myFolderArray+[aDataOperation['key']+'.json'])
         self.getDir(myOpParams['layerName'],myFolderArray) # this makes sure that the folder exists
         if myOpParams['operation']=='replace':
-            with open(myFilePath,'w') as f:
-                json.dump(aDataOperation['data'],f,indent=2)
+            if self.compressJSON:
+                writeJSONArtifact(myFilePath,aDataOperation['data'],self.getLayerNFolder(myOpParams['layerName']))
+            else:
+                with open(myFilePath,'w') as f:
+                    json.dump(aDataOperation['data'],f,indent=2)
+                if os.path.exists(getCompressedPath(myFilePath)):
+                    os.remove(getCompressedPath(myFilePath)) # it would shadow the new content
+            self.fileStorage.publishPrefix(myFilePath)
+            self.tableCache.invalidate(myFilePath)
+            self.tableCache.invalidate(getCompressedPath(myFilePath))
         else:
             raise Exception(f"Only replace is supported for now not {myOpParams['operation']}")
 
@@ -113,8 +124,8 @@ class STORAGE():
         myFolderArray=myOpParams['folderArray']
         myFilePath=self.getLocalFilePath(myOpParams['layerName'],myFolderArray+[aDataOperation['key']])
         self.getDir(myOpParams['layerName'],myFolderArray) # this makes sure that the folder exists
-        with open(myFilePath+'.pkl', 'wb') as f:
-            pickle.dump(aDataOperation['data'], f)
+        writeVariableDump(myFilePath,aDataOperation['data'])
+        self.fileStorage.publishPrefix(myFilePath)
 
     def _handleTextDumpOperation(self,aDataOperation: dict):
         myOpParams=aDataOperation['opParams']
@@ -123,6 +134,7 @@ class STORAGE():
         self.getDir(myOpParams['layerName'],myFolderArray) # this makes sure that the folder exists
         with open(myFilePath+'.txt', 'w') as f:
             f.write(aDataOperation['data'])
+        self.fileStorage.publish(myFilePath+'.txt')
 
     def _handleTableDumpOperation(self,aDataOperation: dict):
         myOpParams=aDataOperation['opParams']
@@ -140,6 +152,7 @@ class STORAGE():
         for idx,table in enumerate(aDataOperation['data']):
             myFilePath=self.getLocalFilePath(myOpParams['layerName'],myFolderArray+[f'_{idx}.csv'])
             table.to_csv(myFilePath,index=False)
+        self.fileStorage.publishPrefix(myFolderPath)
       
     def _handleCopyFileOperation(self,aDataOperation: dict):
         myOpParams=aDataOperation['opParams']
@@ -147,6 +160,7 @@ class STORAGE():
         if not os.path.exists(newPath):
             os.makedirs(os.path.join(self.getLayerNFolder(myOpParams['layerName']),myOpParams['folderName']), exist_ok=True)
         shutil.copy(aDataOperation['oldPath'],newPath)
+        self.fileStorage.publish(newPath)
 
     def _handlePDFDumpOperation(self,aDataOperation: dict):
         myOpParams=aDataOperation['opParams']
@@ -162,10 +176,76 @@ class STORAGE():
 
         with open(myFilePath, 'wb') as f:
             writer.write(f)
+        self.fileStorage.publish(myFilePath)
 
-    def doDataOperation(self,aDataOperation: dict):
-        self.onlySupportedForOnPrem()
+    def doDataOperations(self,aDataOperations: list):
+        """
+        Apply a box's dataOps as one batch
+
+        Tabular ops are grouped per table and statusUpdate ops per state file, so each
+        target gets a single read-modify-write however many ops hit it. Nothing in those
+        targets changes unless every op was applied successfully: the new contents are
+        staged first and published together at the end.
+
+        Other op types (JSON/variable/text/table/PDF dumps, file copies) are not staged:
+        they are written in order while the batch is prepared, i.e. before the commit. If
+        preparing or committing the tabular/state changes fails, dumps already written
+        stay in place; they are keyed outputs that the retried run overwrites.
+        """
+        myTableOperations={}
+        myTabularDataOps=[]
+        myStateDataOps={}
+        myOtherDataOps=[]
+        for myDataOp in aDataOperations:
+            if myDataOp['dataTypeToSaveAs']=='tabular':
+                myBasePath,myOperation=self._getTableOperation(myDataOp)
+                if myOperation is not None:
+                    myTableOperations.setdefault(myBasePath,[]).append(myOperation)
+                    myTabularDataOps.append((myBasePath,len(myTableOperations[myBasePath])-1,myDataOp))
+            elif myDataOp['dataTypeToSaveAs']=='statusUpdate':
+                myStateDataOps.setdefault(myDataOp['opParams']['layerName'],[]).append(myDataOp)
+            else:
+                myOtherDataOps.append(myDataOp)
+
+        # Tables and states are read-modify-write: hold their locks from the read to the
+        # publish so concurrent workers serialize instead of losing each other's rows
+        myLockPaths=sorted(set(myTableOperations)|{self.getStateFilePath(n) for n in myStateDataOps})
+        with ExitStack() as myLocks:
+            for myLockPath in myLockPaths:
+                myLocks.enter_context(self.fileStorage.lock(myLockPath))
+            for myBasePath in myTableOperations:
+                self.fileStorage.fetchPrefix(myBasePath)
+            myStates={}
+            for myStateName,myDataOps in myStateDataOps.items():
+                myStates[myStateName]=self.getState(myStateName)
+                for myDataOp in myDataOps:
+                    self._applyStatusUpdate(myStates[myStateName],myDataOp)
+
+            myStaged=StagedWrite()
+            try:
+                myCounts=self.tableFormat.stageOperations(myTableOperations,myStaged)
+                for myStateName,myState in myStates.items():
+                    myStaged.stageFile(self.getStateFilePath(myStateName),lambda aPath,aState=myState: self._writeJSON(aPath,aState))
+                # Not staged: written now and kept even if the commit below fails
+                for myDataOp in myOtherDataOps:
+                    self.doDataOperation(myDataOp)
+            except Exception:
+                myStaged.abort()
+                raise
+            try:
+                myStaged.commit()
+            finally:
+                for myBasePath in myTableOperations:
+                    self.tableCache.invalidate(myBasePath)
+            for myBasePath in myTableOperations:
+                self.fileStorage.publishPrefix(myBasePath)
+            for myStateName in myStates:
+                self.fileStorage.publish(self.getStateFilePath(myStateName))
 
+        for myBasePath,myIndex,myDataOp in myTabularDataOps:
+            self._logTableOperation(myDataOp,myCounts[myBasePath][myIndex])
+
+    def doDataOperation(self,aDataOperation: dict):
         if aDataOperation['dataTypeToSaveAs']=='tabular':
             self._handleTabularOperation(aDataOperation)
         elif aDataOperation['dataTypeToSaveAs']=='statusUpdate':
@@ -192,51 +272,107 @@ class STORAGE():
         else:
             myPaths=aFolderName
 
-        myFilePath=self.getLocalFilePath(aLayerName,myPaths+[aKey+'.json'])
-        with open(myFilePath,'r') as f:
-            return json.load(f)
+        myFilePath=self.getJSONDumpPath(aLayerName,myPaths,aKey)
+        if myFilePath is None:
+            raise FileNotFoundError(self.getLocalFilePath(aLayerName,myPaths+[aKey+'.json']))
+        mySignature=file_signature(myFilePath)
+        # The raw (decompressed) document is cached and parsed per read: a deep copy of
+        # the parsed objects would cost more than the parse, and bytes are sized exactly
+        myRaw=self.tableCache.get(('json',myFilePath),mySignature)
+        if myRaw is None:
+            if myFilePath.endswith('.json'):
+                with open(myFilePath,'rb') as f:
+                    myRaw=f.read()
+            else:
+                myRaw=readCompressedBytes(myFilePath)
+            self.tableCache.put(('json',myFilePath),myFilePath,mySignature,myRaw)
+        return json.loads(myRaw)
+
+    def getJSONDumpPath(self,aLayerName: str,aFolderName: any,aKey: str):
+        """Local file holding a JSON dump, <key>.json.zst or a plain <key>.json; None if there is none"""
+        if isinstance(aFolderName,str):
+            aFolderName=[aFolderName]
+        myFilePath=self.getLocalFilePath(aLayerName,list(aFolderName)+[aKey+'.json'])
+        self.fileStorage.fetchPrefix(myFilePath)
+        return findJSONArtifact(myFilePath)
 
-    def getFullTableAsDF(self,aLayerName: str,aTableName: str):
-        return pd.read_csv(self.getLocalFilePath(aLayerName,aTableName)+'.csv')
+    def tableExists(self,aLayerName: str,aTableName: str):
+        myBasePath=self.getLocalFilePath(aLayerName,aTableName)
+        self.fileStorage.fetchPrefix(myBasePath)
+        return self.tableFormat.exists(myBasePath)
+
+    def getVariableDump(self,aLayerName: str,aFolderName: any,aKey: str,asArrow: bool=False):
+        if isinstance(aFolderName,str):
+            myPaths=[aFolderName]
+        else:
+            myPaths=aFolderName
+
+        myFilePath=self.getLocalFilePath(aLayerName,myPaths+[aKey])
+        self.fileStorage.fetchPrefix(myFilePath)
+        return readVariableDump(myFilePath,asArrow=asArrow)
+
+    def _readTable(self,aBasePath: str,columns: list=None,filters: list=None):
+        """Read through the process-wide table cache, validated against the table files' mtime/size"""
+        myKey=('table',aBasePath,None if columns is None else tuple(columns),repr(filters) if filters else None)
+        self.fileStorage.fetchPrefix(aBasePath)
+        mySignature=self.tableFormat.signature(aBasePath)
+        myDF=self.tableCache.get(myKey,mySignature)
+        if myDF is None:
+            myDF=self.tableFormat.read(aBasePath,columns=columns,filters=filters)
+            self.tableCache.put(myKey,aBasePath,mySignature,myDF)
+        return myDF
+
+    def getFullTableAsDF(self,aLayerName: str,aTableName: str,columns: list=None):
+        return self._readTable(self.getLocalFilePath(aLayerName,aTableName),columns=columns)
     
-    def getFilteredTableAsDF(self,aLayerName: str,aTableName: str,aFilter: dict):
-        self.onlySupportedForOnPrem()
-        myDF=self.getFullTableAsDF(aLayerName,aTableName)
-        for colName,myLambda in aFilter.items():
+    def getFilteredTableAsDF(self,aLayerName: str,aTableName: str,aFilter: dict,columns: list=None):
+        """
+        aFilter maps column -> predicate. Spec dicts ({'eq':v}, {'in':[...]}, {'between':[lo,hi]}, ...)
+        are evaluated vectorized inside the table reader; lambdas/lambda strings are applied per row afterwards
+        """
+        myFilters,myResidual=compileFilter(aFilter)
+        myReadColumns=None if columns is None or myResidual else columns
+        myDF=self._readTable(self.getLocalFilePath(aLayerName,aTableName),columns=myReadColumns,filters=myFilters)
+        for colName,myLambda in myResidual.items():
             myDF=myDF.loc[myDF[colName].apply(getLambdaFromString(self.client,myLambda))]
-        return myDF
+        return myDF if columns is None or myReadColumns is not None else myDF[list(columns)]
 
     def getLayerNFolder(self,aLayerName: str):
-        # Get absolute path to validusBoxes directory
-        current_file = Path(__file__).resolve()
-        validus_boxes_dir = current_file.parent
-        data_dir = validus_boxes_dir / "data" / self.client / aLayerName
-        return str(data_dir)
+        return self.fileStorage.getLayerNFolder(self.client,aLayerName)
     
     def getState(self,aStateName: str):
         filename=self.getStateFilePath(aStateName)
-        if os.path.exists(filename):
+        if self.fileStorage.exists(filename):
             with open(filename,'r') as f:
                 return json.load(f)
         else:
             return {}
         
     def updateState(self,aStateName: str,aState: dict):
+        """Overwrite a state; to change part of one concurrently use statusUpdate dataOps (they lock it)"""
         filename=self.getStateFilePath(aStateName)
         os.makedirs(self.getStateFolder(), exist_ok=True)
-        with open(filename,'w') as f:
-            json.dump(aState,f,indent=2)
+        myTmpPath=getTempPath(filename)
+        try:
+            self._writeJSON(myTmpPath,aState)
+            os.replace(myTmpPath,filename)
+        finally:
+            if os.path.exists(myTmpPath):
+                os.remove(myTmpPath)
+        self.fileStorage.publish(filename)
+
+    def _writeJSON(self,aFilePath: str,aData: dict):
+        with open(aFilePath,'w') as f:
+            json.dump(aData,f,indent=2)
 
     def clearState(self,aStateName: str):
-        filename=self.getStateFilePath(aStateName)
-        if os.path.exists(filename):
-            os.remove(filename)
+        self.fileStorage.remove(self.getStateFilePath(aStateName))
     
     def getStateFilePath(self,aStateName: str):
         return os.path.join(self.getStateFolder(),aStateName+'.json')
     
     def getStateFolder(self):
-        return os.path.join('data',self.client,'states')
+        return self.fileStorage.getStateFolder(self.client)
     
     def getTaskConfig(self,aTaskName: str):
         taskFilename=os.path.join('clients',self.client,'tasks',aTaskName+'.json')
@@ -244,7 +380,6 @@ class STORAGE():
             return json.load(f)
         
     def getLocalFilePath(self,aLayerName: str,aFileName: any):
-        self.onlySupportedForOnPrem()
         if isinstance(aFileName,str):
             myPaths=[aFileName]
         else:
@@ -253,4 +388,4 @@ class STORAGE():
         return os.path.join(self.getLayerNFolder(aLayerName),*myPaths)
     
     def onlySupportedForOnPrem(self):
-        assert self.storageConfig['defaultFileStorage']=='onPrem', f"Only onPrem is supported for now not {self.storageConfig['defaultFileStorage']}"
+        assert self.fileStorage.isLocal, f"Only onPrem is supported for this not {self.storageConfig['defaultFileStorage']}"
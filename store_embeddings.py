@@ -10,6 +10,7 @@ from dotenv import load_dotenv
 from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores.pgvector import PGVector
+from utils.llm_governor import GovernedEmbeddings
  
  
 # Load environment variables
@@ -277,10 +278,11 @@ def store_embeddings(fund_data: Dict[str, pd.DataFrame], force_overwrite: bool =
         print("GENERATING EMBEDDINGS")
         print("="*80)
         
-        embeddings = OpenAIEmbeddings(
+        # Embedding batches are admitted through the shared LLM rate governor
+        embeddings = GovernedEmbeddings(OpenAIEmbeddings(
             model="text-embedding-3-small",
             api_key=openai_api_key,
-        )
+        ))
         
         connection_string = get_connection_string()
         catalog = load_table_catalog()
@@ -0,0 +1,748 @@
+import os
+import shutil
+import sqlite3
+import threading
+import urllib.parse
+import numpy as np
+import pandas as pd
+import utils.logger as _logger
+from utils.tableCache import file_signature
+logger=_logger.getLogger('dev')
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.dataset as ds
+    import pyarrow.compute as pc
+    PARQUET_AVAILABLE=True
+except ImportError:
+    PARQUET_AVAILABLE=False
+
+# Filters are a list of (column, op, value) tuples, ANDed together (pyarrow DNF style)
+SUPPORTED_FILTER_OPS=('==','!=','<','<=','>','>=','in','not in','startswith')
+
+# Filter spec keys accepted by getFilteredTableAsDF, e.g. {'processDate':{'gte':'2024-01-01','lt':'2024-02-01'}}
+FILTER_SPEC_OPS={
+    'eq':'==',
+    'ne':'!=',
+    'lt':'<',
+    'lte':'<=',
+    'gt':'>',
+    'gte':'>=',
+    'in':'in',
+    'notIn':'not in',
+    'startswith':'startswith',
+}
+
+def compileFilter(aFilter: dict):
+    """
+    Split a {column: predicate} filter into pushdown tuples and residual lambdas
+
+    A predicate is either a spec dict (keys from FILTER_SPEC_OPS plus 'between':[lo,hi]),
+    or anything getLambdaFromString understands, which is kept as a per-row fallback.
+    """
+    myFilters=[]
+    myResidual={}
+    for colName,myPredicate in aFilter.items():
+        if not isinstance(myPredicate,dict):
+            myResidual[colName]=myPredicate
+            continue
+        for myOp,myValue in myPredicate.items():
+            if myOp=='between':
+                myLow,myHigh=myValue
+                myFilters.append((colName,'>=',myLow))
+                myFilters.append((colName,'<=',myHigh))
+            elif myOp in FILTER_SPEC_OPS:
+                if FILTER_SPEC_OPS[myOp] in ('in','not in'):
+                    myValue=list(myValue)
+                myFilters.append((colName,FILTER_SPEC_OPS[myOp],myValue))
+            else:
+                raise Exception(f"Unsupported filter {myOp} on {colName}, expected one of {list(FILTER_SPEC_OPS)+['between']}")
+    return myFilters,myResidual
+
+def applyFiltersToDF(aDF: pd.DataFrame,aFilters: list):
+    """Vectorized evaluation of (column, op, value) filters on an in-memory DataFrame"""
+    if not aFilters:
+        return aDF
+    myMask=np.ones(len(aDF),dtype=bool)
+    for colName,op,value in aFilters:
+        myCol=aDF[colName]
+        if op=='==':
+            myMask&=(myCol==value).to_numpy()
+        elif op=='!=':
+            myMask&=(myCol!=value).to_numpy()
+        elif op=='<':
+            myMask&=(myCol<value).to_numpy()
+        elif op=='<=':
+            myMask&=(myCol<=value).to_numpy()
+        elif op=='>':
+            myMask&=(myCol>value).to_numpy()
+        elif op=='>=':
+            myMask&=(myCol>=value).to_numpy()
+        elif op=='in':
+            myMask&=myCol.isin(list(value)).to_numpy()
+        elif op=='not in':
+            myMask&=~myCol.isin(list(value)).to_numpy()
+        elif op=='startswith':
+            myMask&=myCol.str.startswith(value,na=False).to_numpy(dtype=bool)
+        else:
+            raise Exception(f"Unsupported filter operator {op}, expected one of {SUPPORTED_FILTER_OPS}")
+    return aDF.loc[myMask]
+
+def _keyMask(aExistingDF: pd.DataFrame,aNewDF: pd.DataFrame,aKey: list):
+    """True for existing rows whose key appears in the new rows"""
+    if len(aKey)==1:
+        return aExistingDF[aKey[0]].isin(aNewDF[aKey[0]]).to_numpy()
+    return pd.MultiIndex.from_frame(aExistingDF[aKey]).isin(pd.MultiIndex.from_frame(aNewDF[aKey]))
+
+def _alignDtypes(aExistingDF: pd.DataFrame,aNewDF: pd.DataFrame):
+    """Cast incoming columns to the stored dtypes where that is lossless, instead of asserting equality"""
+    for colName in aNewDF.columns.intersection(aExistingDF.columns):
+        if aNewDF[colName].dtype!=aExistingDF[colName].dtype:
+            try:
+                aNewDF[colName]=aNewDF[colName].astype(aExistingDF[colName].dtype)
+            except (ValueError,TypeError):
+                pass # leave it to concat to upcast
+    return aNewDF
+
+def getTempPath(aFinalPath: str):
+    """Private temp name next to aFinalPath (unique per process and thread)"""
+    return aFinalPath+'.tmp-%d-%d'%(os.getpid(),threading.get_ident())
+
+class StagedWrite():
+    """
+    Changes prepared by a batch of table operations, published together by commit()
+
+    Files are written to <target>.tmp-<pid>-<thread> and open transactions register
+    commit/rollback callbacks, so nothing a batch changes becomes visible unless every
+    target was prepared successfully. commit() renames the files over their targets
+    first (each rename is atomic, the previous content is kept aside as a hard link)
+    and then commits the transactions: if a rename or the first COMMIT fails, the
+    renamed files are put back and the transactions rolled back, so tables and states
+    stay as they were. Not covered: a crash between the renames and the COMMIT, and a
+    batch spanning several SQLite databases whose second COMMIT fails after the first
+    succeeded (WAL databases don't commit atomically together).
+    """
+    def __init__(self):
+        self.transactions=[]
+        self.files=[]
+        self.afterCommitCallbacks=[]
+
+    def addTransaction(self,aCommit,aRollback):
+        self.transactions.append((aCommit,aRollback))
+
+    def afterCommit(self,aCallback):
+        self.afterCommitCallbacks.append(aCallback)
+
+    def stageFile(self,aFinalPath: str,aWriter):
+        """aWriter(tmpPath) writes the new content; it replaces aFinalPath on commit"""
+        os.makedirs(os.path.dirname(aFinalPath), exist_ok=True)
+        myTmpPath=getTempPath(aFinalPath)
+        self.files.append((myTmpPath,aFinalPath))
+        aWriter(myTmpPath)
+
+    def stageRemove(self,aFinalPath: str):
+        self.files.append((None,aFinalPath))
+
+    def commit(self):
+        try:
+            myBackups=self._publishFiles()
+        except Exception:
+            self.abort()
+            raise
+        myCommitted=0
+        try:
+            for myCommit,_ in self.transactions:
+                myCommit()
+                myCommitted+=1
+        except Exception:
+            self._rollback(self.transactions[myCommitted+1:])
+            if myCommitted==0:
+                self._restoreFiles(myBackups)
+            raise
+        finally:
+            self._dropBackups(myBackups)
+        for myCallback in self.afterCommitCallbacks:
+            myCallback()
+
+    def abort(self):
+        self._rollback(self.transactions)
+
+    def _publishFiles(self):
+        """Rename staged files over their targets; returns [(backupPath or None, finalPath),...]"""
+        myBackups=[]
+        try:
+            for myTmpPath,myFinalPath in self.files:
+                myBackupPath=None
+                if os.path.exists(myFinalPath):
+                    myBackupPath=getTempPath(myFinalPath)+'.bak'
+                    try:
+                        os.link(myFinalPath,myBackupPath)
+                    except OSError:
+                        shutil.copy2(myFinalPath,myBackupPath) # no hard links on this filesystem
+                myBackups.append((myBackupPath,myFinalPath))
+                if myTmpPath is not None:
+                    os.replace(myTmpPath,myFinalPath)
+                elif myBackupPath is not None:
+                    os.remove(myFinalPath)
+        except Exception:
+            self._restoreFiles(myBackups)
+            self._dropBackups(myBackups)
+            raise
+        return myBackups
+
+    @staticmethod
+    def _restoreFiles(aBackups: list):
+        for myBackupPath,myFinalPath in reversed(aBackups):
+            try:
+                if myBackupPath is not None:
+                    os.replace(myBackupPath,myFinalPath)
+                elif os.path.exists(myFinalPath):
+                    os.remove(myFinalPath)
+            except Exception as e:
+                logger.error('restoring %s failed: %s'%(myFinalPath,str(e)))
+
+    @staticmethod
+    def _dropBackups(aBackups: list):
+        for myBackupPath,_ in aBackups:
+            if myBackupPath is not None and os.path.exists(myBackupPath):
+                os.remove(myBackupPath)
+
+    def _rollback(self,aTransactions: list):
+        for _,myRollback in aTransactions:
+            try:
+                myRollback()
+            except Exception as e:
+                logger.error('rollback failed: %s'%str(e))
+        for myTmpPath,_ in self.files:
+            if myTmpPath is not None and os.path.exists(myTmpPath):
+                os.remove(myTmpPath)
+
+class TableFormat():
+    """
+    Batch plumbing shared by the layouts
+
+    An operation is {'operation':'replaceOrAppendByKey','rows':DataFrame,'key':[columns]}
+    or {'operation':'deleteByKey','key':{column:value}}. Each operation reports the
+    number of existing rows it removed (None for a delete on a missing table).
+    """
+    def stageOperations(self,aOperationsByTable: dict,aStaged: StagedWrite):
+        """Prepare {basePath:[operation,...]} with one read-modify-write per table; returns {basePath:[rowCount,...]}"""
+        return {myBasePath:self._stageTable(myBasePath,myOperations,aStaged) for myBasePath,myOperations in aOperationsByTable.items()}
+
+    def applyOperations(self,aOperationsByTable: dict):
+        myStaged=StagedWrite()
+        try:
+            myCounts=self.stageOperations(aOperationsByTable,myStaged)
+        except Exception:
+            myStaged.abort()
+            raise
+        myStaged.commit()
+        return myCounts
+
+    def replaceOrAppendByKey(self,aBasePath: str,aDF: pd.DataFrame,aKey: list):
+        return self.applyOperations({aBasePath:[{'operation':'replaceOrAppendByKey','rows':aDF,'key':aKey}]})[aBasePath][0]
+
+    def deleteByKey(self,aBasePath: str,aKeyDict: dict):
+        return self.applyOperations({aBasePath:[{'operation':'deleteByKey','key':aKeyDict}]})[aBasePath][0]
+
+def _unsupportedOperation(aOperation: dict):
+    return Exception(f"Only replaceOrAppendByKey and deleteByKey are supported for now not {aOperation['operation']}")
+
+class CSVTableFormat(TableFormat):
+    """Legacy layout: one <table>.csv per table, rewritten in full on every change"""
+    name='csv'
+
+    def __init__(self,aStorageConfig: dict):
+        self.storageConfig=aStorageConfig
+
+    def getPath(self,aBasePath: str):
+        return aBasePath+'.csv'
+
+    def exists(self,aBasePath: str):
+        return os.path.exists(self.getPath(aBasePath))
+
+    def signature(self,aBasePath: str):
+        """Changes whenever the table's content may have changed (None if the table doesn't exist)"""
+        return file_signature(self.getPath(aBasePath))
+
+    def read(self,aBasePath: str,columns: list=None,filters: list=None):
+        myFilterCols=[f[0] for f in (filters or [])]
+        myUseCols=None if columns is None else list(dict.fromkeys(list(columns)+myFilterCols))
+        myDF=pd.read_csv(self.getPath(aBasePath),usecols=myUseCols)
+        myDF=applyFiltersToDF(myDF,filters)
+        return myDF if columns is None else myDF[list(columns)]
+
+    def _stageTable(self,aBasePath: str,aOperations: list,aStaged: StagedWrite):
+        myFilePath=self.getPath(aBasePath)
+        myExistingDF=self.read(aBasePath) if os.path.exists(myFilePath) else None
+        myExisted=myExistingDF is not None
+        myDirty=False
+        myCounts=[]
+        for myOperation in aOperations:
+            if myOperation['operation']=='replaceOrAppendByKey':
+                myDF=myOperation['rows']
+                aKey=myOperation['key']
+                myDirty=True
+                if myExistingDF is None:
+                    myExistingDF=myDF
+                    myCounts.append(0)
+                    continue
+                assert myExistingDF.dtypes.equals(myDF.dtypes), 'dont know how to append unmatched schemas %s %s' %(str(myExistingDF.dtypes),str(myDF.dtypes))
+
+                startingLen=len(myExistingDF)
+                myExistingDF=myExistingDF.merge(myDF[aKey],on=aKey, how='left', indicator=True).query('_merge == "left_only"').drop('_merge', axis=1)
+                myCounts.append(startingLen-len(myExistingDF))
+
+                assert myExistingDF.dtypes.equals(myDF.dtypes), 'schema changed? %s %s' %(str(myExistingDF.dtypes),str(myDF.dtypes))
+
+                myExistingDF=pd.concat([myExistingDF,myDF],ignore_index=True)
+            elif myOperation['operation']=='deleteByKey':
+                if myExistingDF is None:
+                    myCounts.append(None)
+                    continue
+                mask=np.ones(len(myExistingDF),dtype=bool)
+                for col, val in myOperation['key'].items():
+                    mask &= (myExistingDF[col] == val).to_numpy()
+                myCounts.append(int(mask.sum()))
+                if mask.any():
+                    myDirty=True
+                    myExistingDF=myExistingDF.loc[~mask]
+                    if len(myExistingDF)==0:
+                        myExistingDF=None # controversial: an emptied table is removed
+            else:
+                raise _unsupportedOperation(myOperation)
+
+        if myDirty and myExistingDF is not None:
+            aStaged.stageFile(myFilePath,lambda aPath,aDF=myExistingDF: aDF.to_csv(aPath,index=False))
+        elif myDirty and myExisted:
+            aStaged.stageRemove(myFilePath)
+        return myCounts
+
+class ParquetTableFormat(TableFormat):
+    """
+    Columnar layout: <table>.parquet/ directory holding one data.parquet per partition
+
+    Tables listed in storageConfig['tablePartitionKeys'] ({tableName: column}) are
+    split into <column>=<value>/ subfolders, so a write rewrites only the partitions
+    its rows fall into and a filter on the partition column opens only matching
+    files. Reads project columns and push filters down to row-group statistics.
+    Partition columns are also stored inside the files, so dtypes round-trip.
+    Tables still in the legacy CSV layout are read as-is and converted on first write.
+    """
+    name='parquet'
+    dataFileName='data.parquet'
+    rowGroupSize=65536
+
+    def __init__(self,aStorageConfig: dict):
+        self.storageConfig=aStorageConfig
+        self.partitionKeys=aStorageConfig.get('tablePartitionKeys',{})
+        self.legacyFormat=CSVTableFormat(aStorageConfig)
+
+    def getPath(self,aBasePath: str):
+        return aBasePath+'.parquet'
+
+    def getPartitionKey(self,aBasePath: str):
+        return self.partitionKeys.get(os.path.basename(aBasePath),self.partitionKeys.get('*'))
+
+    def exists(self,aBasePath: str):
+        return os.path.isdir(self.getPath(aBasePath)) or self.legacyFormat.exists(aBasePath)
+
+    def signature(self,aBasePath: str):
+        if not os.path.isdir(self.getPath(aBasePath)):
+            return self.legacyFormat.signature(aBasePath)
+        return tuple((f,file_signature(f)) for f in self._allFiles(aBasePath))
+
+    @staticmethod
+    def _encodePartitionValue(aValue):
+        if aValue is None or (isinstance(aValue,float) and np.isnan(aValue)):
+            return '__null__'
+        return urllib.parse.quote(str(aValue),safe='')
+
+    def _partitionFilePath(self,aBasePath: str,aPartitionKey: str,aValue):
+        if aPartitionKey is None:
+            return os.path.join(self.getPath(aBasePath),self.dataFileName)
+        return os.path.join(self.getPath(aBasePath),'%s=%s'%(aPartitionKey,self._encodePartitionValue(aValue)),self.dataFileName)
+
+    def _allFiles(self,aBasePath: str):
+        myFiles=[]
+        for root,_,files in os.walk(self.getPath(aBasePath)):
+            if self.dataFileName in files:
+                myFiles.append(os.path.join(root,self.dataFileName))
+        return sorted(myFiles)
+
+    def _prunedFiles(self,aBasePath: str,filters: list):
+        """Partition pruning: equality/in filters on the partition column select folders directly (None if they don't)"""
+        myPartitionKey=self.getPartitionKey(aBasePath)
+        if myPartitionKey is not None:
+            for colName,op,value in filters or []:
+                if colName==myPartitionKey and op in ('==','in'):
+                    myValues=[value] if op=='==' else list(value)
+                    return list(dict.fromkeys(self._partitionFilePath(aBasePath,myPartitionKey,v) for v in myValues))
+        return None
+
+    def _filesForFilters(self,aBasePath: str,filters: list):
+        myFiles=self._prunedFiles(aBasePath,filters)
+        if myFiles is None:
+            return self._allFiles(aBasePath)
+        return [f for f in myFiles if os.path.exists(f)]
+
+    @staticmethod
+    def _toExpression(filters: list):
+        myExpression=None
+        for colName,op,value in filters or []:
+            myField=ds.field(colName)
+            if op=='==':
+                myTerm=myField==value
+            elif op=='!=':
+                myTerm=myField!=value
+            elif op=='<':
+                myTerm=myField<value
+            elif op=='<=':
+                myTerm=myField<=value
+            elif op=='>':
+                myTerm=myField>value
+            elif op=='>=':
+                myTerm=myField>=value
+            elif op=='in':
+                myTerm=myField.isin(list(value))
+            elif op=='not in':
+                myTerm=~myField.isin(list(value))
+            elif op=='startswith':
+                myTerm=pc.starts_with(myField,pattern=value)
+            else:
+                raise Exception(f"Unsupported filter operator {op}, expected one of {SUPPORTED_FILTER_OPS}")
+            myExpression=myTerm if myExpression is None else myExpression&myTerm
+        return myExpression
+
+    def read(self,aBasePath: str,columns: list=None,filters: list=None):
+        if not os.path.isdir(self.getPath(aBasePath)):
+            if self.legacyFormat.exists(aBasePath):
+                return self.legacyFormat.read(aBasePath,columns,filters)
+            raise FileNotFoundError(self.getPath(aBasePath))
+
+        myFiles=self._filesForFilters(aBasePath,filters)
+        if not myFiles:
+            # keep the schema of an empty selection
+            myAllFiles=self._allFiles(aBasePath)
+            mySchema=pq.read_schema(myAllFiles[0]) if myAllFiles else pa.schema([])
+            myDF=mySchema.empty_table().to_pandas()
+            return myDF if columns is None else myDF[list(columns)]
+
+        try:
+            myTable=ds.dataset(myFiles,format='parquet').to_table(columns=columns,filter=self._toExpression(filters))
+            return myTable.to_pandas()
+        except pa.ArrowException:
+            # drifting schemas across partitions or a filter value arrow can't compare against the
+            # column type: read file by file and let pandas upcast/compare like the csv path does
+            myDFs=[applyFiltersToDF(pq.read_table(f).to_pandas(),filters) for f in myFiles]
+            myDF=pd.concat(myDFs,ignore_index=True)
+            return myDF if columns is None else myDF[list(columns)]
+
+    def _readFile(self,aFilePath: str):
+        return pq.read_table(aFilePath).to_pandas() if os.path.exists(aFilePath) else None
+
+    def _writeFile(self,aFilePath: str,aDF: pd.DataFrame):
+        pq.write_table(pa.Table.from_pandas(aDF.reset_index(drop=True),preserve_index=False),aFilePath,row_group_size=self.rowGroupSize)
+
+    def _groupByPartition(self,aBasePath: str,aDF: pd.DataFrame):
+        myPartitionKey=self.getPartitionKey(aBasePath)
+        if myPartitionKey is None:
+            return [(self._partitionFilePath(aBasePath,None,None),aDF)]
+        if myPartitionKey not in aDF.columns:
+            raise Exception(f"rows for {os.path.basename(aBasePath)} are missing partition column {myPartitionKey}")
+        return [(self._partitionFilePath(aBasePath,myPartitionKey,value),group)
+                for value,group in aDF.groupby(myPartitionKey,dropna=False,sort=False)]
+
+    def _cleanupTable(self,aBasePath: str,aMigratedCSV: str):
+        """After commit: retire a migrated legacy CSV and drop empty partition folders"""
+        if aMigratedCSV is not None and os.path.exists(aMigratedCSV):
+            os.replace(aMigratedCSV,aMigratedCSV+'.migrated')
+        myTablePath=self.getPath(aBasePath)
+        for root,dirs,files in os.walk(myTablePath,topdown=False):
+            if root!=myTablePath and not os.listdir(root):
+                os.rmdir(root)
+        if os.path.isdir(myTablePath) and not self._allFiles(aBasePath):
+            shutil.rmtree(myTablePath,ignore_errors=True) # same as the csv layout: empty tables disappear
+
+    def _stageTable(self,aBasePath: str,aOperations: list,aStaged: StagedWrite):
+        myPartitions={} # partition file -> rows, loaded only for partitions an operation touches
+        myDirty=set()
+        myMigratedCSV=None
+        if not os.path.isdir(self.getPath(aBasePath)) and self.legacyFormat.exists(aBasePath):
+            myLegacyDF=self.legacyFormat.read(aBasePath)
+            logger.info('migrating %s from csv to parquet (%d rows)'%(os.path.basename(aBasePath),len(myLegacyDF)))
+            for myFilePath,myGroup in self._groupByPartition(aBasePath,myLegacyDF):
+                myPartitions[myFilePath]=myGroup
+                myDirty.add(myFilePath)
+            myMigratedCSV=self.legacyFormat.getPath(aBasePath)
+
+        def getPartition(aFilePath):
+            if aFilePath not in myPartitions:
+                myPartitions[aFilePath]=self._readFile(aFilePath)
+            return myPartitions[aFilePath]
+
+        myCounts=[]
+        for myOperation in aOperations:
+            if myOperation['operation']=='replaceOrAppendByKey':
+                removed=0
+                for myFilePath,myNewRows in self._groupByPartition(aBasePath,myOperation['rows']):
+                    myExistingDF=getPartition(myFilePath)
+                    if myExistingDF is None or len(myExistingDF)==0:
+                        myPartitions[myFilePath]=myNewRows
+                    else:
+                        myMask=_keyMask(myExistingDF,myNewRows,myOperation['key'])
+                        removed+=int(myMask.sum())
+                        myNewRows=_alignDtypes(myExistingDF,myNewRows.copy())
+                        myPartitions[myFilePath]=pd.concat([myExistingDF.loc[~myMask],myNewRows],ignore_index=True)
+                    myDirty.add(myFilePath)
+                myCounts.append(removed)
+            elif myOperation['operation']=='deleteByKey':
+                if not os.path.isdir(self.getPath(aBasePath)) and not myPartitions:
+                    myCounts.append(None)
+                    continue
+                aKeyDict=myOperation['key']
+                myFiles=self._prunedFiles(aBasePath,[(col,'==',val) for col,val in aKeyDict.items()])
+                if myFiles is None:
+                    myFiles=self._allFiles(aBasePath)+list(myPartitions)
+                deleted=0
+                for myFilePath in dict.fromkeys(myFiles):
+                    myExistingDF=getPartition(myFilePath)
+                    if myExistingDF is None:
+                        continue
+                    mask=np.ones(len(myExistingDF),dtype=bool)
+                    for col, val in aKeyDict.items():
+                        mask &= (myExistingDF[col] == val).to_numpy()
+                    if mask.any():
+                        deleted+=int(mask.sum())
+                        myPartitions[myFilePath]=myExistingDF.loc[~mask]
+                        myDirty.add(myFilePath)
+                myCounts.append(deleted)
+            else:
+                raise _unsupportedOperation(myOperation)
+
+        for myFilePath in sorted(myDirty):
+            myDF=myPartitions[myFilePath]
+            if myDF is None or len(myDF)==0:
+                aStaged.stageRemove(myFilePath)
+            else:
+                aStaged.stageFile(myFilePath,lambda aPath,aDF=myDF: self._writeFile(aPath,aDF))
+        if myDirty:
+            aStaged.afterCommit(lambda: self._cleanupTable(aBasePath,myMigratedCSV))
+        return myCounts
+
+class SQLiteTableFormat(TableFormat):
+    """
+    Keyed layout: every table of a layer lives in <layer>/_tables.sqlite
+
+    replaceOrAppendByKey deletes the incoming keys through an index on the key
+    columns and inserts the new rows in one transaction, and deleteByKey is a
+    single indexed DELETE, so write cost follows the batch size instead of the
+    table size. Filters become a WHERE clause. Column dtypes are kept in
+    _tabular_schema so reads hand back the frame that was written.
+    """
+    name='sqlite'
+    dbFileName='_tables.sqlite'
+    schemaTable='_tabular_schema'
+
+    def __init__(self,aStorageConfig: dict):
+        self.storageConfig=aStorageConfig
+        self.legacyFormat=CSVTableFormat(aStorageConfig)
+
+    def getDBPath(self,aBasePath: str):
+        return os.path.join(os.path.dirname(aBasePath),self.dbFileName)
+
+    @staticmethod
+    def _quote(aIdentifier: str):
+        return '"%s"'%str(aIdentifier).replace('"','""')
+
+    @staticmethod
+    def _sqlType(aDtype):
+        if pd.api.types.is_bool_dtype(aDtype) or pd.api.types.is_integer_dtype(aDtype):
+            return 'INTEGER'
+        if pd.api.types.is_float_dtype(aDtype):
+            return 'REAL'
+        return 'TEXT'
+
+    @staticmethod
+    def _toSQLiteValue(aValue):
+        if aValue is None or (not isinstance(aValue,(list,dict,str)) and pd.isna(aValue)):
+            return None
+        if isinstance(aValue,(pd.Timestamp,np.datetime64)):
+            return str(aValue)
+        if isinstance(aValue,np.generic):
+            return aValue.item()
+        return aValue
+
+    def _connect(self,aBasePath: str):
+        os.makedirs(os.path.dirname(aBasePath), exist_ok=True)
+        myConn=sqlite3.connect(self.getDBPath(aBasePath),timeout=30,isolation_level=None)
+        myConn.execute('PRAGMA journal_mode=WAL')
+        myConn.execute('PRAGMA synchronous=NORMAL')
+        myConn.execute('CREATE TABLE IF NOT EXISTS %s (table_name TEXT NOT NULL, column_name TEXT NOT NULL, dtype TEXT NOT NULL, position INTEGER NOT NULL, PRIMARY KEY (table_name, column_name))'%self.schemaTable)
+        return myConn
+
+    def _getSchema(self,aConn,aTableName: str):
+        myRows=aConn.execute('SELECT column_name, dtype FROM %s WHERE table_name = ? ORDER BY position'%self.schemaTable,(aTableName,)).fetchall()
+        return {colName:dtype for colName,dtype in myRows}
+
+    def _tableExists(self,aBasePath: str):
+        if not os.path.exists(self.getDBPath(aBasePath)):
+            return False
+        myConn=self._connect(aBasePath)
+        try:
+            return len(self._getSchema(myConn,os.path.basename(aBasePath)))>0
+        finally:
+            myConn.close()
+
+    def exists(self,aBasePath: str):
+        return self._tableExists(aBasePath) or self.legacyFormat.exists(aBasePath)
+
+    def signature(self,aBasePath: str):
+        # any commit to the layer database touches the db or its WAL file
+        myDBPath=self.getDBPath(aBasePath)
+        myDBSignature=file_signature(myDBPath)
+        if myDBSignature is None:
+            return self.legacyFormat.signature(aBasePath)
+        return (myDBSignature,file_signature(myDBPath+'-wal'),self.legacyFormat.signature(aBasePath))
+
+    def _whereClause(self,filters: list):
+        myClauses=[]
+        myParams=[]
+        for colName,op,value in filters or []:
+            myCol=self._quote(colName)
+            if op in ('==','!='):
+                myClauses.append('%s %s ?'%(myCol,'IS' if op=='==' else 'IS NOT'))
+                myParams.append(self._toSQLiteValue(value))
+            elif op in ('<','<=','>','>='):
+                myClauses.append('%s %s ?'%(myCol,op))
+                myParams.append(self._toSQLiteValue(value))
+            elif op in ('in','not in'):
+                myValues=[self._toSQLiteValue(v) for v in value]
+                if not myValues:
+                    myClauses.append('0' if op=='in' else '1')
+                    continue
+                myClauses.append('%s %s (%s)'%(myCol,op.upper(),','.join('?'*len(myValues))))
+                myParams.extend(myValues)
+            elif op=='startswith':
+                myClauses.append('substr(%s, 1, ?) = ?'%myCol)
+                myParams.extend([len(value),value])
+            else:
+                raise Exception(f"Unsupported filter operator {op}, expected one of {SUPPORTED_FILTER_OPS}")
+        return (' WHERE '+' AND '.join(myClauses) if myClauses else ''),myParams
+
+    def read(self,aBasePath: str,columns: list=None,filters: list=None):
+        if not self._tableExists(aBasePath):
+            if self.legacyFormat.exists(aBasePath):
+                return self.legacyFormat.read(aBasePath,columns,filters)
+            raise FileNotFoundError(self.getDBPath(aBasePath))
+
+        myTableName=os.path.basename(aBasePath)
+        myConn=self._connect(aBasePath)
+        try:
+            mySchema=self._getSchema(myConn,myTableName)
+            myColumns=list(mySchema) if columns is None else list(columns)
+            myWhere,myParams=self._whereClause(filters)
+            myCursor=myConn.execute('SELECT %s FROM %s%s'%(','.join(self._quote(c) for c in myColumns),self._quote(myTableName),myWhere),myParams)
+            myDF=pd.DataFrame.from_records(myCursor.fetchall(),columns=myColumns)
+        finally:
+            myConn.close()
+        for colName in myColumns:
+            try:
+                if mySchema[colName]=='bool' and myDF[colName].isna().any():
+                    continue
+                myDF[colName]=myDF[colName].astype(mySchema[colName])
+            except (ValueError,TypeError):
+                pass
+        return myDF
+
+    def _ensureTable(self,aConn,aTableName: str,aDF: pd.DataFrame,aKey: list=None):
+        mySchema=self._getSchema(aConn,aTableName)
+        if not mySchema:
+            aConn.execute('CREATE TABLE IF NOT EXISTS %s (%s)'%(self._quote(aTableName),','.join('%s %s'%(self._quote(c),self._sqlType(aDF[c].dtype)) for c in aDF.columns)))
+        myNewColumns=[c for c in aDF.columns if c not in mySchema]
+        for myPosition,colName in enumerate(myNewColumns,start=len(mySchema)):
+            if mySchema:
+                aConn.execute('ALTER TABLE %s ADD COLUMN %s %s'%(self._quote(aTableName),self._quote(colName),self._sqlType(aDF[colName].dtype)))
+            aConn.execute('INSERT INTO %s (table_name, column_name, dtype, position) VALUES (?, ?, ?, ?)'%self.schemaTable,(aTableName,colName,str(aDF[colName].dtype),myPosition))
+        if aKey:
+            myIndexName='ix_%s_%s'%(aTableName,'_'.join(aKey))
+            aConn.execute('CREATE INDEX IF NOT EXISTS %s ON %s (%s)'%(self._quote(myIndexName),self._quote(aTableName),','.join(self._quote(c) for c in aKey)))
+
+    def _insertRows(self,aConn,aTableName: str,aDF: pd.DataFrame):
+        if len(aDF)==0:
+            return
+        myRows=[tuple(self._toSQLiteValue(v) for v in row) for row in aDF.itertuples(index=False,name=None)]
+        aConn.executemany('INSERT INTO %s (%s) VALUES (%s)'%(self._quote(aTableName),','.join(self._quote(c) for c in aDF.columns),','.join('?'*len(aDF.columns))),myRows)
+
+    def _migrateLegacyTable(self,aConn,aBasePath: str):
+        """Load a legacy CSV table into the database; caller holds the write transaction"""
+        myTableName=os.path.basename(aBasePath)
+        if self._getSchema(aConn,myTableName) or not self.legacyFormat.exists(aBasePath):
+            return None
+        myDF=self.legacyFormat.read(aBasePath)
+        logger.info('migrating %s from csv to sqlite (%d rows)'%(myTableName,len(myDF)))
+        self._ensureTable(aConn,myTableName,myDF)
+        self._insertRows(aConn,myTableName,myDF)
+        return self.legacyFormat.getPath(aBasePath)
+
+    @staticmethod
+    def _finish(aConn,aStatement: str):
+        try:
+            if aConn.in_transaction:
+                aConn.execute(aStatement)
+        finally:
+            aConn.close()
+
+    def _applyOperation(self,aConn,aTableName: str,aOperation: dict):
+        if aOperation['operation']=='replaceOrAppendByKey':
+            myDF=aOperation['rows']
+            aKey=aOperation['key']
+            self._ensureTable(aConn,aTableName,myDF,aKey)
+            myDelete='DELETE FROM %s WHERE %s'%(self._quote(aTableName),' AND '.join('%s IS ?'%self._quote(c) for c in aKey))
+            removed=0
+            for myKeyValues in myDF[aKey].drop_duplicates().itertuples(index=False,name=None):
+                removed+=aConn.execute(myDelete,tuple(self._toSQLiteValue(v) for v in myKeyValues)).rowcount
+            self._insertRows(aConn,aTableName,myDF)
+            return removed
+        elif aOperation['operation']=='deleteByKey':
+            if not self._getSchema(aConn,aTableName):
+                return None
+            myWhere,myParams=self._whereClause([(col,'==',val) for col,val in aOperation['key'].items()])
+            return aConn.execute('DELETE FROM %s%s'%(self._quote(aTableName),myWhere),myParams).rowcount
+        else:
+            raise _unsupportedOperation(aOperation)
+
+    def stageOperations(self,aOperationsByTable: dict,aStaged: StagedWrite):
+        """One write transaction per layer database, committed with the rest of the batch"""
+        myConnections={}
+        myCounts={}
+        for myBasePath,myOperations in aOperationsByTable.items():
+            myDBPath=self.getDBPath(myBasePath)
+            if myDBPath not in myConnections:
+                myConn=self._connect(myBasePath)
+                aStaged.addTransaction(lambda aConn=myConn: self._finish(aConn,'COMMIT'),lambda aConn=myConn: self._finish(aConn,'ROLLBACK'))
+                myConn.execute('BEGIN IMMEDIATE')
+                myConnections[myDBPath]=myConn
+            myConn=myConnections[myDBPath]
+            myMigratedCSV=self._migrateLegacyTable(myConn,myBasePath)
+            if myMigratedCSV is not None:
+                aStaged.afterCommit(lambda aPath=myMigratedCSV: os.replace(aPath,aPath+'.migrated'))
+            myCounts[myBasePath]=[self._applyOperation(myConn,os.path.basename(myBasePath),myOperation) for myOperation in myOperations]
+        return myCounts
+
+TABLE_FORMATS={
+    'csv':CSVTableFormat,
+    'parquet':ParquetTableFormat,
+    'sqlite':SQLiteTableFormat,
+}
+
+def getTableFormat(aStorageConfig: dict):
+    """Tabular layout for l0/l1 tables: storageConfig['tabularFormat'] or STORAGE_TABULAR_FORMAT (default csv)"""
+    myFormatName=aStorageConfig.get('tabularFormat',os.getenv('STORAGE_TABULAR_FORMAT','csv'))
+    if myFormatName not in TABLE_FORMATS:
+        raise Exception(f"Unknown tabular format {myFormatName}, expected one of {list(TABLE_FORMATS)}")
+    if myFormatName=='parquet' and not PARQUET_AVAILABLE:
+        logger.warning('pyarrow is not installed, falling back to csv tables')
+        myFormatName='csv'
+    return TABLE_FORMATS[myFormatName](aStorageConfig)
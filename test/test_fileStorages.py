@@ -0,0 +1,101 @@
+"""
+File storage tests: which files belong to an entry, on disk and in the bucket
+
+The s3 backend runs against moto's in-process S3 mock.
+
+Usage:
+    python -m pytest test/test_fileStorages.py
+"""
+
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from fileStorages import S3FileStorage, isEntryMember
+
+BUCKET = 'frame-test'
+
+
+def _touch(aPath: str, aContent: bytes = b'x'):
+    os.makedirs(os.path.dirname(aPath), exist_ok=True)
+    with open(aPath, 'wb') as f:
+        f.write(aContent)
+
+
+@pytest.mark.parametrize('aRest', ['', '.csv', '.csv.migrated', '.parquet', '.parquet/fund=A/data.parquet',
+                                   '.arrow', '.npy', '.pkl', '.zst', '/child.csv'])
+def test_format_siblings_belong_to_the_entry(aRest):
+    assert isEntryMember(aRest)
+
+
+@pytest.mark.parametrize('aRest', ['.v2.pkl', '.v2', '_old.csv', '.json', '.txt', '.parquetx', '2.csv'])
+def test_other_entries_do_not_belong_to_the_entry(aRest):
+    assert not isEntryMember(aRest)
+
+
+def test_local_prefix_files_skip_other_entries(tmp_path):
+    myBase = str(tmp_path / 'l1' / 'key')
+    for mySuffix in ('.pkl', '.v2.pkl', '.csv', '.parquet/data.parquet', 'suffix.pkl', '.pkl.tmp-1-2'):
+        _touch(myBase + mySuffix)
+
+    myFiles = S3FileStorage._localPrefixFiles(myBase)
+
+    assert sorted(os.path.relpath(f, tmp_path / 'l1') for f in myFiles) == \
+        ['key.csv', os.path.join('key.parquet', 'data.parquet'), 'key.pkl']
+
+
+@pytest.fixture
+def s3Storage(tmp_path, monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    with mock_aws():
+        boto3.client('s3', region_name='us-east-1').create_bucket(Bucket=BUCKET)
+        yield S3FileStorage({'defaultFileStorage': 's3', 's3Bucket': BUCKET, 's3Region': 'us-east-1',
+                             'localCacheDir': str(tmp_path / 'cache')})
+
+
+def _keys(aStorage):
+    myPages = aStorage.client.get_paginator('list_objects_v2').paginate(Bucket=BUCKET)
+    return sorted(o['Key'] for p in myPages for o in p.get('Contents', []))
+
+
+def test_publish_prefix_keeps_other_entries_written_by_other_workers(s3Storage):
+    myBase = os.path.join(s3Storage.getLayerNFolder('client', 'l1'), 'key')
+    # another worker's entry key.v2, not in this worker's cache
+    s3Storage.client.put_object(Bucket=BUCKET, Key='client/l1/key.v2.pkl', Body=b'other')
+    # a stale sibling of this entry: the dump changed type from arrow to pickle
+    s3Storage.client.put_object(Bucket=BUCKET, Key='client/l1/key.arrow', Body=b'old')
+    _touch(myBase + '.pkl', b'new')
+
+    s3Storage.publishPrefix(myBase)
+
+    assert _keys(s3Storage) == ['client/l1/key.pkl', 'client/l1/key.v2.pkl']
+
+
+def test_fetch_prefix_downloads_only_the_entry(s3Storage):
+    myBase = os.path.join(s3Storage.getLayerNFolder('client', 'l1'), 'key')
+    s3Storage.client.put_object(Bucket=BUCKET, Key='client/l1/key.pkl', Body=b'mine')
+    s3Storage.client.put_object(Bucket=BUCKET, Key='client/l1/key.v2.pkl', Body=b'other')
+
+    s3Storage.fetchPrefix(myBase)
+
+    assert os.path.exists(myBase + '.pkl')
+    assert not os.path.exists(myBase + '.v2.pkl')
+
+
+def test_lock_is_exclusive_and_released(s3Storage, monkeypatch):
+    import fileStorages
+    monkeypatch.setattr(fileStorages, 'LOCK_TIMEOUT_SECONDS', 0.5)
+    myPath = os.path.join(s3Storage.getLayerNFolder('client', 'l1'), 'table')
+
+    with s3Storage.lock(myPath):
+        assert _keys(s3Storage) == ['_locks/client/l1/table.lock']
+        with pytest.raises(TimeoutError):
+            with s3Storage.lock(myPath):
+                pass
+
+    assert _keys(s3Storage) == []
+    with s3Storage.lock(myPath):
+        pass
@@ -0,0 +1,143 @@
+"""
+STORAGE.doDataOperations tests: coalesced batches and all-or-nothing commits
+
+Each test runs against the csv, parquet and sqlite table formats on an onPrem
+storage rooted in a temporary directory.
+
+Usage:
+    python -m pytest test/test_storage.py
+"""
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import tabularFormats
+from storage import STORAGE
+from tabularFormats import SQLiteTableFormat, StagedWrite
+
+CLIENT = 'testClient'
+STATE = 'processState'
+
+
+@pytest.fixture(params=['csv', 'parquet', 'sqlite'])
+def storage(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the onPrem state folder is relative to the working directory
+    myStorage = STORAGE(CLIENT, {'defaultFileStorage': 'onPrem', 'tabularFormat': request.param})
+    monkeypatch.setattr(myStorage.fileStorage, 'localRoot', str(tmp_path / 'data'))
+    return myStorage
+
+
+def _upsert(aTableName: str, aRows: list, aKey: list = ['id']):
+    return {'dataTypeToSaveAs': 'tabular', 'rows': pd.DataFrame(aRows),
+            'opParams': {'layerName': 'l1', 'tableName': aTableName, 'operation': 'replaceOrAppendByKey', 'key': aKey}}
+
+
+def _delete(aTableName: str, aKey: dict):
+    return {'dataTypeToSaveAs': 'tabular', 'key': aKey,
+            'opParams': {'layerName': 'l1', 'tableName': aTableName, 'operation': 'deleteByKey'}}
+
+
+def _status(aFileName: str, aValue: str):
+    return {'dataTypeToSaveAs': 'statusUpdate',
+            'opParams': {'layerName': STATE, 'operation': 'replaceOrAppendKeyValue', 'trackerName': 'files',
+                         'key': aFileName, 'value': aValue}}
+
+
+def _rows(aStorage: STORAGE, aTableName: str):
+    return aStorage.getFullTableAsDF('l1', aTableName).sort_values('id').to_dict('records')
+
+
+def _leftovers(aRoot):
+    return [os.path.join(root, f) for root, _, files in os.walk(aRoot) for f in files if '.tmp-' in f]
+
+
+def _seed(aStorage: STORAGE):
+    aStorage.doDataOperations([_upsert('docs', [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]),
+                               _status('a.pdf', 'done')])
+
+
+def test_batch_is_coalesced_into_one_write_per_target(storage, monkeypatch):
+    _seed(storage)
+    myStaged = []
+    myStageFile = StagedWrite.stageFile
+    monkeypatch.setattr(StagedWrite, 'stageFile',
+                        lambda self, aFinalPath, aWriter: myStaged.append(aFinalPath) or myStageFile(self, aFinalPath, aWriter))
+
+    storage.doDataOperations([_upsert('docs', [{'id': 2, 'name': 'b2'}, {'id': 3, 'name': 'c'}]),
+                              _status('b.pdf', 'done'),
+                              _delete('docs', {'id': 1}),
+                              _upsert('docs', [{'id': 4, 'name': 'd'}]),
+                              _status('c.pdf', 'failed')])
+
+    assert _rows(storage, 'docs') == [{'id': 2, 'name': 'b2'}, {'id': 3, 'name': 'c'}, {'id': 4, 'name': 'd'}]
+    assert storage.getState(STATE) == {'files': {'a.pdf': 'done', 'b.pdf': 'done', 'c.pdf': 'failed'}}
+    # One staged file per target: the state file once, and each table file at most once
+    assert len(myStaged) == len(set(myStaged))
+    assert myStaged.count(storage.getStateFilePath(STATE)) == 1
+    assert _leftovers(storage.fileStorage.localRoot) == []
+
+
+def test_failing_op_leaves_tables_and_states_untouched(storage):
+    _seed(storage)
+    storage.doDataOperations([_upsert('events', [{'id': 1, 'kind': 'x'}])])
+
+    with pytest.raises(KeyError):
+        storage.doDataOperations([_upsert('docs', [{'id': 3, 'name': 'c'}]),
+                                  _status('b.pdf', 'done'),
+                                  # the key column is missing from the rows
+                                  _upsert('events', [{'id': 2, 'kind': 'y'}], aKey=['eventId'])])
+
+    assert _rows(storage, 'docs') == [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]
+    assert _rows(storage, 'events') == [{'id': 1, 'kind': 'x'}]
+    assert storage.getState(STATE) == {'files': {'a.pdf': 'done'}}
+    assert _leftovers(storage.fileStorage.localRoot) == []
+
+
+def test_failing_file_publish_rolls_back_the_whole_batch(storage, monkeypatch):
+    _seed(storage)
+    myStatePath = storage.getStateFilePath(STATE)
+    myReplace = os.replace
+
+    def failingReplace(aSource, aTarget):
+        if aTarget == myStatePath:
+            raise OSError('disk full')
+        return myReplace(aSource, aTarget)
+
+    # Table files and transactions are staged before the state file, so they are ahead of it in the commit
+    monkeypatch.setattr(tabularFormats.os, 'replace', failingReplace)
+    with pytest.raises(OSError):
+        storage.doDataOperations([_upsert('docs', [{'id': 2, 'name': 'b2'}, {'id': 3, 'name': 'c'}]),
+                                  _status('b.pdf', 'done')])
+    monkeypatch.setattr(tabularFormats.os, 'replace', myReplace)
+
+    assert _rows(storage, 'docs') == [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]
+    assert storage.getState(STATE) == {'files': {'a.pdf': 'done'}}
+    assert _leftovers(storage.fileStorage.localRoot) == []
+    assert _leftovers(os.path.dirname(myStatePath)) == []
+
+
+def test_failing_sqlite_commit_puts_the_state_files_back(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    myStorage = STORAGE(CLIENT, {'defaultFileStorage': 'onPrem', 'tabularFormat': 'sqlite'})
+    monkeypatch.setattr(myStorage.fileStorage, 'localRoot', str(tmp_path / 'data'))
+    _seed(myStorage)
+    myFinish = SQLiteTableFormat._finish
+
+    def failingFinish(aConn, aStatement):
+        if aStatement == 'COMMIT':
+            myFinish(aConn, 'ROLLBACK')
+            raise tabularFormats.sqlite3.OperationalError('database is locked')
+        return myFinish(aConn, aStatement)
+
+    monkeypatch.setattr(SQLiteTableFormat, '_finish', staticmethod(failingFinish))
+    with pytest.raises(tabularFormats.sqlite3.OperationalError):
+        myStorage.doDataOperations([_upsert('docs', [{'id': 3, 'name': 'c'}]), _status('b.pdf', 'done')])
+    monkeypatch.setattr(SQLiteTableFormat, '_finish', staticmethod(myFinish))
+
+    assert _rows(myStorage, 'docs') == [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]
+    with open(myStorage.getStateFilePath(STATE)) as f:
+        assert json.load(f) == {'files': {'a.pdf': 'done'}}
+    assert _leftovers(tmp_path) == []
@@ -1,4 +1,4 @@
-from utils.unclassified import getStructToFilterLambda
+from utils.unclassified import getStructToFilter
 from storage import STORAGE
 import pandas as pd
 import numpy as np
@@ -50,7 +50,7 @@ def getCapitalChangeDF(storage:STORAGE,fundName:str,sourceA:dict,sourceB:dict):
     return mergedDF
 
 def getEnrichedCapitalSummary(storage:STORAGE,fundName:str,source:dict,nameToAppendToNonStrColumns=''):
-    myFilter=getStructToFilterLambda({'fundName':fundName,'source':source['source'],'processDate':source['processDate']})
+    myFilter=getStructToFilter({'fundName':fundName,'source':source['source'],'processDate':source['processDate']})
     myCapitalSummary=storage.getFilteredTableAsDF('l1','capitalSummary',myFilter)
 
     if myCapitalSummary is None or len(myCapitalSummary) == 0:
@@ -63,7 +63,7 @@ def getEnrichedCapitalSummary(storage:STORAGE,fundName:str,source:dict,nameToApp
     return myCapitalSummary
 
 def getEnrichedTB(storage:STORAGE,fundName:str,source:dict,nameToAppendToNonStrColumns=''):
-    myFilter=getStructToFilterLambda({'fundName':fundName,'source':source['source'],'processDate':source['processDate']})
+    myFilter=getStructToFilter({'fundName':fundName,'source':source['source'],'processDate':source['processDate']})
     myTB=storage.getFilteredTableAsDF('l1','trail_balance',myFilter)
 
     if myTB is None or len(myTB) == 0:
@@ -91,7 +91,7 @@ def getExpenseAndRevenueChangeDF(storage:STORAGE,fundName:str,sourceA:dict,sourc
     return mergedDF
 
 def _getEnrichedRevenueAndExpense(storage:STORAGE,fundName:str,source:dict,nameToAppendToNonStrColumns=''):
-    myFilter=getStructToFilterLambda({'fundName':fundName,'source':source['source'],'processDate':source['processDate']})
+    myFilter=getStructToFilter({'fundName':fundName,'source':source['source'],'processDate':source['processDate']})
     myRows=storage.getFilteredTableAsDF('l1','revenueAndExpense',myFilter)
 
     if nameToAppendToNonStrColumns != '':
@@ -143,7 +143,7 @@ def getPositionsChangeDF(storage:STORAGE,fundName:str,sourceA:dict,sourceB:dict)
 nonStrColSeperator='___'
 
 def getEnrichedPositions(storage:STORAGE,fundName:str,source:dict,nameToAppendToNonStrColumns=''):
-    myFilter=getStructToFilterLambda({'fundName':fundName,'source':source['source'],'processDate':source['processDate']})
+    myFilter=getStructToFilter({'fundName':fundName,'source':source['source'],'processDate':source['processDate']})
     myPositions=storage.getFilteredTableAsDF('l1','positions_with_fx',myFilter)
 
     if myPositions is None or len(myPositions) == 0:
@@ -0,0 +1,240 @@
+"""
+Uploaded-file metadata store backed by SQLite (WAL mode)
+
+System of record for what used to live in data/frameDemo/ldummy/allFileMeta.json.
+Each file is one row keyed by file name, so a status change is a single-row
+update instead of a rewrite of every file's metadata, concurrent writers from
+the API and the runner no longer clobber each other, and dashboard queries by
+status/fund/date run on secondary indexes. The legacy JSON is imported once on
+first use; export_json() writes the same shape back for tools that still read it.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+LDUMMY_DIR = Path(__file__).resolve().parent.parent / "data" / "frameDemo" / "ldummy"
+FILE_META_DB_PATH = Path(os.getenv("FILE_META_DB", str(LDUMMY_DIR / "fileMeta.db")))
+
+# Legacy JSON imported into an empty store, and the default target of export_json
+LEGACY_FILE_META_PATH = LDUMMY_DIR / "allFileMeta.json"
+
+# JSON record key -> column; any other keys are kept in `extra`
+_FIELD_COLUMNS = {
+    "fileHash": "file_hash",
+    "fileType": "file_type",
+    "status": "status",
+    "fundName": "fund_name",
+    "fileDate": "file_date",
+    "error": "error",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_meta (
+    file_name TEXT PRIMARY KEY,
+    file_hash TEXT,
+    file_type TEXT,
+    status TEXT,
+    fund_name TEXT,
+    file_date TEXT,
+    error TEXT,
+    extra TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_file_meta_status ON file_meta (status);
+CREATE INDEX IF NOT EXISTS ix_file_meta_fund_name ON file_meta (fund_name);
+CREATE INDEX IF NOT EXISTS ix_file_meta_file_date ON file_meta (file_date);
+CREATE INDEX IF NOT EXISTS ix_file_meta_file_hash ON file_meta (file_hash);
+"""
+
+
+class FileMetaStore:
+    """Per-file metadata rows with the allFileMeta.json record shape at the API"""
+
+    def __init__(self, db_path: Path = FILE_META_DB_PATH, legacy_file: Optional[Path] = LEGACY_FILE_META_PATH):
+        self.db_path = Path(db_path)
+        self.legacy_file = legacy_file
+        self._local = threading.local()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._initialize()
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite3 connections must not be shared across threads"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _initialize(self):
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        self._import_legacy_json(conn)
+
+    def _import_legacy_json(self, conn: sqlite3.Connection):
+        """Seed an empty store from allFileMeta.json"""
+        if self.legacy_file is None or not self.legacy_file.exists():
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM file_meta LIMIT 1").fetchone() is not None:
+                conn.execute("COMMIT")
+                return
+            with open(self.legacy_file, 'r') as f:
+                records = json.load(f)
+            rows = [self._to_row(name, record) for name, record in records.items() if isinstance(record, dict)]
+            self._write_rows(conn, rows)
+            conn.execute("COMMIT")
+        except (OSError, ValueError, AttributeError) as e:
+            conn.execute("ROLLBACK")
+            print(f"⚠️  Could not import legacy file metadata {self.legacy_file}: {e}")
+            return
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        print(f"[FILE META] Imported {len(rows)} files from {self.legacy_file.name}")
+
+    @staticmethod
+    def _to_row(file_name: str, record: Dict[str, Any]) -> Tuple:
+        extra = {k: v for k, v in record.items() if k not in _FIELD_COLUMNS and k != "fileName"}
+        return (file_name, record.get("fileHash"), record.get("fileType"), record.get("status"),
+                record.get("fundName"), record.get("fileDate"), record.get("error"),
+                json.dumps(extra) if extra else None, time.time())
+
+    @staticmethod
+    def _to_record(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        """Row -> allFileMeta.json record (unset optional fields are omitted, as before)"""
+        if row is None:
+            return None
+        record = {"fileHash": row["file_hash"], "fileType": row["file_type"],
+                  "status": row["status"], "fileName": row["file_name"]}
+        for key in ("fundName", "fileDate", "error"):
+            if row[_FIELD_COLUMNS[key]] is not None:
+                record[key] = row[_FIELD_COLUMNS[key]]
+        if row["extra"]:
+            record.update(json.loads(row["extra"]))
+        return record
+
+    @staticmethod
+    def _write_rows(conn: sqlite3.Connection, rows: List[Tuple]):
+        conn.executemany(
+            "INSERT OR REPLACE INTO file_meta (file_name, file_hash, file_type, status, fund_name, file_date, "
+            "error, extra, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def put(self, file_name: str, record: Dict[str, Any]):
+        """Replace the whole record for a file"""
+        self._write_rows(self._connect(), [self._to_row(file_name, record)])
+
+    def put_many(self, records: Dict[str, Dict[str, Any]]):
+        """Replace several records in one transaction"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_rows(conn, [self._to_row(name, record) for name, record in records.items()])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def update(self, file_name: str, **fields) -> bool:
+        """Change individual fields of an existing record; returns False if the file is unknown"""
+        unknown = [k for k in fields if k not in _FIELD_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown file metadata fields {unknown}, expected {list(_FIELD_COLUMNS)}")
+        if not fields:
+            return self.get(file_name) is not None
+        assignments = ", ".join(f"{_FIELD_COLUMNS[k]} = ?" for k in fields)
+        cursor = self._connect().execute(
+            f"UPDATE file_meta SET {assignments}, updated_at = ? WHERE file_name = ?",
+            list(fields.values()) + [time.time(), file_name])
+        return cursor.rowcount > 0
+
+    def update_status(self, file_name: str, status: str) -> bool:
+        return self.update(file_name, status=status)
+
+    def get(self, file_name: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM file_meta WHERE file_name = ?", (file_name,)).fetchone()
+        return self._to_record(row)
+
+    def query(self, status: Optional[Iterable[str]] = None, fund_name: Optional[str] = None,
+              file_type: Optional[str] = None, date_from: Optional[str] = None,
+              date_to: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Records matching all given conditions, keyed by file name (status may be one value or several)"""
+        clauses, params = self._where(status, fund_name, file_type, date_from, date_to)
+        rows = self._connect().execute(f"SELECT * FROM file_meta{clauses} ORDER BY file_name", params).fetchall()
+        return {row["file_name"]: self._to_record(row) for row in rows}
+
+    def count(self, status: Optional[Iterable[str]] = None, fund_name: Optional[str] = None,
+              file_type: Optional[str] = None, date_from: Optional[str] = None,
+              date_to: Optional[str] = None) -> int:
+        clauses, params = self._where(status, fund_name, file_type, date_from, date_to)
+        return self._connect().execute(f"SELECT COUNT(*) FROM file_meta{clauses}", params).fetchone()[0]
+
+    def counts_by_status(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT status, COUNT(*) AS n FROM file_meta GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    @staticmethod
+    def _where(status, fund_name, file_type, date_from, date_to) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        if status is not None:
+            statuses = [status] if isinstance(status, str) else list(status)
+            clauses.append(f"status IN ({', '.join('?' * len(statuses))})" if statuses else "0")
+            params.extend(statuses)
+        for column, value in (("fund_name", fund_name), ("file_type", file_type)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if date_from is not None:
+            clauses.append("file_date >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            clauses.append("file_date <= ?")
+            params.append(date_to)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        """Every record in the allFileMeta.json shape"""
+        return self.query()
+
+    def export_json(self, path: Optional[Path] = None) -> Path:
+        """Write the store as allFileMeta.json (atomically) for consumers of the legacy file"""
+        path = Path(path or self.legacy_file)
+        tmp_path = path.with_name(path.name + f".tmp-{os.getpid()}")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.all(), f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+
+# Global instance
+_global_file_meta_store = None
+_global_file_meta_store_lock = threading.Lock()
+
+
+def get_file_meta_store() -> FileMetaStore:
+    """Get global file metadata store instance"""
+    global _global_file_meta_store
+    if _global_file_meta_store is None:
+        with _global_file_meta_store_lock:
+            if _global_file_meta_store is None:
+                _global_file_meta_store = FileMetaStore()
+    return _global_file_meta_store
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "export":
+        target = get_file_meta_store().export_json(Path(sys.argv[2]) if len(sys.argv) > 2 else None)
+        print(f"Exported file metadata to {target}")
+    else:
+        print("Usage: python -m utils.fileMetaStore export [path]")
@@ -0,0 +1,399 @@
+"""
+Process-wide LLM rate governor
+
+Every OpenAI call reserves its estimated tokens against per-model
+requests-per-minute and tokens-per-minute token buckets before it is sent, and
+reconciles the reservation with the reported usage afterwards. Callers queue in
+priority lanes, so an interactive Athena question is admitted ahead of batch
+extraction waiting on the same model. Throughput stays just under the provider
+limit instead of discovering it through 429s.
+
+Limits are configured per model with LLM_RATE_LIMITS, e.g.
+"gpt-4o=500/30000,gpt-4o-mini=500/200000" (requests/tokens per minute), with
+LLM_DEFAULT_RPM / LLM_DEFAULT_TPM for unlisted models (default 0: not limited,
+only listed models are governed) and LLM_RATE_HEADROOM as the fraction of each
+limit actually used. Budgets are per process; when several
+worker processes share one API key, divide the limits between them.
+
+The OpenAI clients honour OPENAI_BASE_URL, so tests and offline runs can point
+them at the fake OpenAI-compatible server in utils/test/fake_llm_server.py
+(usage blocks and 429 + retry-after on demand).
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, Optional, Tuple, List
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes (lower is admitted first)
+INTERACTIVE = 0
+BATCH = 10
+
+# 0 means unlimited: models missing from LLM_RATE_LIMITS are admitted immediately
+DEFAULT_RPM = int(os.getenv("LLM_DEFAULT_RPM", "0"))
+DEFAULT_TPM = int(os.getenv("LLM_DEFAULT_TPM", "0"))
+DEFAULT_HEADROOM = float(os.getenv("LLM_RATE_HEADROOM", "0.9"))
+
+# Rough token costs used for estimates before the provider reports usage
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 800
+
+
+def _parse_limits(value: str) -> Dict[str, Tuple[int, int]]:
+    """Parse "model=rpm/tpm,..." into {model: (rpm, tpm)}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        model, _, rates = item.partition('=')
+        rpm, _, tpm = rates.partition('/')
+        try:
+            limits[model.strip()] = (int(rpm), int(tpm))
+        except ValueError:
+            logger.warning(f"Ignoring invalid LLM rate limit '{item}'")
+    return limits
+
+
+def estimate_tokens(messages: Any = None, max_tokens: int = 0, text: str = "") -> int:
+    """
+    Estimate the tokens a request counts against the TPM limit
+
+    Providers charge prompt tokens plus max_tokens at admission time, so both
+    are included. Image parts are counted at a flat IMAGE_TOKENS each.
+    """
+    chars = len(text)
+    images = 0
+    for message in messages or []:
+        content = message.get("content", "") if isinstance(message, dict) else message
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if isinstance(part, dict) and part.get("type") == "image_url":
+                    images += 1
+                elif isinstance(part, dict):
+                    chars += len(part.get("text", ""))
+    return chars // CHARS_PER_TOKEN + images * IMAGE_TOKENS + (max_tokens or 0)
+
+
+def retry_after_from_error(error: Exception) -> Optional[float]:
+    """Seconds to back off from a provider rate-limit error, if it says so"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header in ("retry-after-ms", "retry-after"):
+        value = headers.get(header)
+        if value:
+            try:
+                seconds = float(value)
+                return seconds / 1000 if header.endswith("-ms") else seconds
+            except ValueError:
+                continue
+    return None
+
+
+class TokenBucket:
+    """Continuously refilling bucket; the level may go negative to carry usage debt"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = max(per_minute, 1.0)
+        self.refill_per_second = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(missing / self.refill_per_second, 0.0)
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= amount
+
+    def give(self, amount: float, now: float):
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+
+class UnlimitedBucket:
+    """Bucket for a limit that is not configured: never waits, never runs dry"""
+
+    capacity = float("inf")
+    level = float("inf")
+
+    def wait_time(self, amount: float, now: float) -> float:
+        return 0.0
+
+    def take(self, amount: float, now: float):
+        pass
+
+    def give(self, amount: float, now: float):
+        pass
+
+
+def _bucket(per_minute: float):
+    return TokenBucket(per_minute) if per_minute > 0 else UnlimitedBucket()
+
+
+class ModelBudget:
+    """Request and token buckets for one model, plus a provider-imposed pause"""
+
+    def __init__(self, model: str, rpm: int, tpm: int, headroom: float):
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = _bucket(rpm * headroom)
+        self.tokens = _bucket(tpm * headroom)
+        self.paused_until = 0.0
+        self.waiters: List[Tuple[int, int]] = []  # heap of (priority, ticket)
+        self.stats = {"admitted": 0, "reserved_tokens": 0, "used_tokens": 0, "rate_limited": 0, "wait_seconds": 0.0}
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        return max(self.paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+
+
+class Reservation:
+    """Tokens admitted for one request; reconcile with the actual usage when it completes"""
+
+    def __init__(self, governor: "LLMGovernor", model: str, tokens: int):
+        self.governor = governor
+        self.model = model
+        self.tokens = tokens
+        self.settled = False
+
+    def reconcile(self, actual_tokens: Optional[int]):
+        """Replace the estimate with the provider-reported usage"""
+        if self.settled or actual_tokens is None:
+            return
+        self.settled = True
+        self.governor._adjust(self.model, actual_tokens - self.tokens, used=actual_tokens)
+
+    def release(self):
+        """Return the reserved tokens (request failed before consuming them)"""
+        if self.settled:
+            return
+        self.settled = True
+        self.governor._adjust(self.model, -self.tokens, used=0)
+
+
+class LLMGovernor:
+    """Admission control for LLM calls shared by every box, Athena and embedding jobs"""
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[int, int]]] = None,
+                 default_rpm: int = DEFAULT_RPM, default_tpm: int = DEFAULT_TPM,
+                 headroom: float = DEFAULT_HEADROOM):
+        self.limits = limits if limits is not None else _parse_limits(os.getenv("LLM_RATE_LIMITS", ""))
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.headroom = headroom
+        self._budgets: Dict[str, ModelBudget] = {}
+        self._tickets = itertools.count()
+        self._cond = threading.Condition()
+
+    def _budget(self, model: str) -> ModelBudget:
+        budget = self._budgets.get(model)
+        if budget is None:
+            rpm, tpm = self.limits.get(model, (self.default_rpm, self.default_tpm))
+            budget = self._budgets[model] = ModelBudget(model, rpm, tpm, self.headroom)
+        return budget
+
+    def acquire(self, model: str, tokens: int, priority: int = BATCH, timeout: Optional[float] = None) -> Reservation:
+        """
+        Block until the model's budget admits a request of `tokens` tokens
+
+        Waiters are admitted strictly by (priority, arrival), so a batch caller
+        never takes capacity an interactive caller is waiting for.
+
+        Raises:
+            TimeoutError: if not admitted within `timeout` seconds
+        """
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._cond:
+            budget = self._budget(model)
+            tokens = int(min(max(tokens, 1), budget.tokens.capacity))
+            ticket = (priority, next(self._tickets))
+            heapq.heappush(budget.waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = budget.wait_time(tokens, now) if budget.waiters[0] == ticket else None
+                    if wait is not None and wait <= 0:
+                        heapq.heappop(budget.waiters)
+                        budget.requests.take(1, now)
+                        budget.tokens.take(tokens, now)
+                        budget.stats["admitted"] += 1
+                        budget.stats["reserved_tokens"] += tokens
+                        budget.stats["wait_seconds"] += now - start
+                        self._cond.notify_all()
+                        return Reservation(self, model, tokens)
+                    if deadline is not None and now >= deadline:
+                        raise TimeoutError(f"LLM budget for {model} did not admit {tokens} tokens within {timeout}s")
+                    # Non-head waiters sleep until notified; the head sleeps until its tokens refill
+                    sleep_for = wait if wait is not None else 1.0
+                    if deadline is not None:
+                        sleep_for = min(sleep_for, deadline - now)
+                    self._cond.wait(timeout=sleep_for)
+            except BaseException:
+                if ticket in budget.waiters:
+                    budget.waiters.remove(ticket)
+                    heapq.heapify(budget.waiters)
+                    self._cond.notify_all()
+                raise
+
+    async def acquire_async(self, model: str, tokens: int, priority: int = BATCH,
+                            timeout: Optional[float] = None) -> Reservation:
+        """Async variant of `acquire` (waits on a worker thread, never blocks the event loop)"""
+        return await asyncio.to_thread(self.acquire, model, tokens, priority, timeout)
+
+    @contextmanager
+    def reserve(self, model: str, tokens: int, priority: int = BATCH, timeout: Optional[float] = None):
+        """
+        Reserve budget around a request:
+
+            with governor.reserve(model, estimate) as reservation:
+                response = client.chat.completions.create(...)
+                reservation.reconcile(response.usage.total_tokens)
+
+        Unreconciled reservations are released if the request raises, and a
+        provider rate-limit error pauses the model for its retry-after.
+        """
+        reservation = self.acquire(model, tokens, priority, timeout)
+        try:
+            yield reservation
+        except Exception as e:
+            self._on_error(model, e)
+            reservation.release()
+            raise
+
+    @asynccontextmanager
+    async def reserve_async(self, model: str, tokens: int, priority: int = BATCH, timeout: Optional[float] = None):
+        """Async variant of `reserve`"""
+        reservation = await self.acquire_async(model, tokens, priority, timeout)
+        try:
+            yield reservation
+        except Exception as e:
+            self._on_error(model, e)
+            reservation.release()
+            raise
+
+    def _on_error(self, model: str, error: Exception):
+        status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+        if status == 429 or type(error).__name__ == "RateLimitError":
+            self.penalize(model, retry_after_from_error(error))
+
+    def penalize(self, model: str, retry_after: Optional[float] = None):
+        """Pause admissions for a model after the provider rate-limited us"""
+        with self._cond:
+            budget = self._budget(model)
+            budget.paused_until = max(budget.paused_until, time.monotonic() + (retry_after or 1.0))
+            budget.stats["rate_limited"] += 1
+            self._cond.notify_all()
+        logger.warning(f"LLM rate limit hit for {model}; pausing admissions for {retry_after or 1.0:.1f}s")
+
+    def _adjust(self, model: str, delta_tokens: int, used: int):
+        with self._cond:
+            budget = self._budget(model)
+            now = time.monotonic()
+            if delta_tokens > 0:
+                budget.tokens.take(delta_tokens, now)
+            elif delta_tokens < 0:
+                budget.tokens.give(-delta_tokens, now)
+            budget.stats["used_tokens"] += used
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                model: {
+                    **budget.stats,
+                    "rpm_limit": budget.rpm,
+                    "tpm_limit": budget.tpm,
+                    "waiting": len(budget.waiters),
+                    "tokens_available": round(budget.tokens.level) if budget.tokens.level != float("inf") else None,
+                }
+                for model, budget in self._budgets.items()
+            }
+
+
+class GovernedEmbeddings:
+    """
+    Wraps a LangChain embeddings object so every embedding call goes through the governor
+
+    Documents are embedded in batches of `batch_size`, each reserving its own
+    budget, so a large corpus trickles in under the limit instead of one burst.
+    LangChain does not return the usage the embeddings endpoint reports, so each
+    reservation is reconciled with the input tokens counted by tiktoken (the
+    number the provider bills); without tiktoken the estimate stands.
+    """
+
+    def __init__(self, embeddings: Any, model: Optional[str] = None, priority: int = BATCH, batch_size: int = 100):
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, "model", "embeddings")
+        self.priority = priority
+        self.batch_size = batch_size
+        self._encoding = None
+
+    def _count_tokens(self, texts: List[str]) -> Optional[int]:
+        """Input tokens of texts, or None when tiktoken is not available"""
+        if self._encoding is None:
+            try:
+                import tiktoken
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                return None
+        return sum(len(self._encoding.encode(text)) for text in texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            estimate = sum(estimate_tokens(text=text) for text in batch)
+            with get_llm_governor().reserve(self.model, estimate, self.priority) as reservation:
+                vectors.extend(self.embeddings.embed_documents(batch))
+                reservation.reconcile(self._count_tokens(batch))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        estimate = estimate_tokens(text=text)
+        with get_llm_governor().reserve(self.model, estimate, self.priority) as reservation:
+            vector = self.embeddings.embed_query(text)
+            reservation.reconcile(self._count_tokens([text]))
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self.embed_query, text)
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+
+# Global instance
+_global_llm_governor = None
+_global_llm_governor_lock = threading.Lock()
+
+
+def get_llm_governor() -> LLMGovernor:
+    """Get global LLM governor instance"""
+    global _global_llm_governor
+    if _global_llm_governor is None:
+        with _global_llm_governor_lock:
+            if _global_llm_governor is None:
+                _global_llm_governor = LLMGovernor()
+    return _global_llm_governor
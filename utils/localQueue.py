@@ -0,0 +1,233 @@
+"""
+Local file processing queue backed by SQLite (WAL mode)
+
+Replaces the whole-file JSON rewrites of queue/queue.json and
+queue/file_queue.json. Every state change is a single indexed row update in
+its own transaction, so enqueue/claim cost O(log n) regardless of history
+size, a crash never leaves a half-written queue, and claiming is atomic across
+the API and runner processes (BEGIN IMMEDIATE takes the database write lock).
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable
+
+QUEUE_DIR = Path(__file__).resolve().parent.parent / "queue"
+QUEUE_DB_PATH = Path(os.getenv("LOCAL_QUEUE_DB", str(QUEUE_DIR / "queue.db")))
+
+# Legacy JSON queues imported (once) into the database
+LEGACY_QUEUE_FILES = [QUEUE_DIR / "queue.json", QUEUE_DIR / "file_queue.json"]
+
+_COLUMNS = ("id", "file_path", "filename", "timestamp", "status",
+            "processing_started_at", "completed_at", "error_message")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_path TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    processing_started_at REAL,
+    completed_at REAL,
+    error_message TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_queue_entries_status_id ON queue_entries (status, id);
+CREATE INDEX IF NOT EXISTS ix_queue_entries_filename_id ON queue_entries (filename, id);
+"""
+
+# Called as listener(filename, queue_status) after every committed state change
+_transition_listeners: List[Callable[[str, str], None]] = []
+
+
+def add_transition_listener(listener: Callable[[str, str], None]):
+    """Subscribe to queue state transitions in this process (registering twice is a no-op)"""
+    if listener not in _transition_listeners:
+        _transition_listeners.append(listener)
+
+
+def _emit_transition(filename: str, status: str):
+    for listener in list(_transition_listeners):
+        try:
+            listener(filename, status)
+        except Exception as e:
+            # a listener failing must not undo or fail the queue change itself
+            print(f"⚠️  Queue transition listener failed for {filename} ({status}): {e}")
+
+
+class LocalQueue:
+    """Crash-safe, cross-process FIFO queue of uploaded files"""
+
+    def __init__(self, db_path: Path = QUEUE_DB_PATH, legacy_files: Optional[List[Path]] = None):
+        self.db_path = Path(db_path)
+        self.legacy_files = LEGACY_QUEUE_FILES if legacy_files is None else legacy_files
+        self._local = threading.local()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._initialize()
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite3 connections must not be shared across threads"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: transactions are managed explicitly below
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _initialize(self):
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        self._import_legacy_queues(conn)
+
+    def _import_legacy_queues(self, conn: sqlite3.Connection):
+        """Move entries from the old JSON queue files into the table, then retire the files"""
+        for legacy_file in self.legacy_files:
+            if not legacy_file.exists():
+                continue
+            # The write lock makes the import happen exactly once across processes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not legacy_file.exists():
+                    conn.execute("COMMIT")
+                    continue
+                with open(legacy_file, 'r') as f:
+                    entries = json.load(f)
+                rows = [
+                    (item.get("file_path", ""), item.get("filename", ""), item.get("timestamp", time.time()),
+                     item.get("status", "pending"), item.get("processing_started_at"),
+                     item.get("completed_at"), item.get("error_message"))
+                    for item in entries if isinstance(item, dict) and item.get("filename")
+                ]
+                conn.executemany(
+                    "INSERT INTO queue_entries (file_path, filename, timestamp, status, "
+                    "processing_started_at, completed_at, error_message) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows)
+                migrated_file = legacy_file.with_name(legacy_file.name + ".migrated")
+                legacy_file.rename(migrated_file)
+                try:
+                    conn.execute("COMMIT")
+                except Exception:
+                    migrated_file.rename(legacy_file)
+                    raise
+            except (OSError, ValueError) as e:
+                conn.execute("ROLLBACK")
+                print(f"⚠️  Could not import legacy queue {legacy_file}: {e}")
+                continue
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            print(f"[QUEUE] Imported {len(rows)} entries from {legacy_file.name}")
+
+    @staticmethod
+    def _to_dict(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        return {key: row[key] for key in _COLUMNS} if row is not None else None
+
+    def enqueue(self, file_path: str, filename: str) -> Dict[str, Any]:
+        """Append a pending entry"""
+        conn = self._connect()
+        cursor = conn.execute(
+            "INSERT INTO queue_entries (file_path, filename, timestamp, status) VALUES (?, ?, ?, 'pending')",
+            (file_path, filename, time.time()))
+        entry = self._to_dict(conn.execute("SELECT * FROM queue_entries WHERE id = ?", (cursor.lastrowid,)).fetchone())
+        _emit_transition(filename, "pending")
+        return entry
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest pending entry to processing and return it"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM queue_entries WHERE status = 'pending' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            started_at = time.time()
+            conn.execute(
+                "UPDATE queue_entries SET status = 'processing', processing_started_at = ? WHERE id = ?",
+                (started_at, row["id"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        entry = self._to_dict(row)
+        entry.update(status="processing", processing_started_at=started_at)
+        _emit_transition(entry["filename"], "processing")
+        return entry
+
+    def mark_completed(self, filename: str, status: str = "completed", error_message: Optional[str] = None,
+                       file_path: Optional[str] = None) -> bool:
+        """Finish the oldest processing entry for a file; returns False if none was found"""
+        query = "SELECT id FROM queue_entries WHERE filename = ? AND status = 'processing'"
+        params: List[Any] = [filename]
+        if file_path is not None:
+            query += " AND file_path = ?"
+            params.append(file_path)
+        conn = self._connect()
+        cursor = conn.execute(
+            f"UPDATE queue_entries SET status = ?, completed_at = ?, error_message = COALESCE(?, error_message) "
+            f"WHERE id = ({query} ORDER BY id LIMIT 1)",
+            [status, time.time(), error_message] + params)
+        if cursor.rowcount > 0:
+            _emit_transition(filename, status)
+        return cursor.rowcount > 0
+
+    def latest_entry(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Most recent entry for a file"""
+        row = self._connect().execute(
+            "SELECT * FROM queue_entries WHERE filename = ? ORDER BY id DESC LIMIT 1", (filename,)).fetchone()
+        return self._to_dict(row)
+
+    def latest_entries(self) -> Dict[str, Dict[str, Any]]:
+        """Most recent entry for every file, keyed by filename"""
+        rows = self._connect().execute(
+            "SELECT * FROM queue_entries WHERE id IN (SELECT MAX(id) FROM queue_entries GROUP BY filename)").fetchall()
+        return {row["filename"]: self._to_dict(row) for row in rows}
+
+    def reset_stuck(self, timeout: float) -> List[str]:
+        """Return entries processing for longer than `timeout` seconds to pending"""
+        conn = self._connect()
+        cutoff = time.time() - timeout
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, filename FROM queue_entries WHERE status = 'processing' "
+                "AND processing_started_at IS NOT NULL AND processing_started_at < ?", (cutoff,)).fetchall()
+            conn.executemany(
+                "UPDATE queue_entries SET status = 'pending', processing_started_at = NULL WHERE id = ?",
+                [(row["id"],) for row in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        for row in rows:
+            _emit_transition(row["filename"], "pending")
+        return [row["filename"] for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of entries per status"""
+        rows = self._connect().execute("SELECT status, COUNT(*) AS n FROM queue_entries GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+# Global instance
+_global_local_queue = None
+_global_local_queue_lock = threading.Lock()
+
+
+def get_local_queue() -> LocalQueue:
+    """Get global local queue instance"""
+    global _global_local_queue
+    if _global_local_queue is None:
+        with _global_local_queue_lock:
+            if _global_local_queue is None:
+                _global_local_queue = LocalQueue()
+    return _global_local_queue
@@ -3,6 +3,8 @@ import os
 import glob
 import re
 from datetime import datetime
+from utils.fileMetaStore import get_file_meta_store
+from jsonArtifacts import removeCompressedArtifact
 
 def extractDataFromContent(content):
     """Extract all data types from content in one pass"""
@@ -183,6 +185,7 @@ def processLongFormDoc():
     # Write files
     with open(f"{long_form_dir}/forFrontend.json", "w") as f:
         json.dump(frontend_data, f, indent=2)
+    removeCompressedArtifact(f"{long_form_dir}/forFrontend.json")
     
     with open(f"{long_form_dir}/fileMetaData.json", "w") as f:
         json.dump({
@@ -191,19 +194,19 @@ def processLongFormDoc():
             "totalPages": len(page_files), "extractedHoldings": len(all_holdings), "extractedTransactions": len(all_transactions)
         }, f, indent=2)
     
-    # Update allFileMeta.json and l2.json
+    # Update file metadata store and l2.json
+    try:
+        get_file_meta_store().put("013.pdf", {"fileHash": "1a4f7efda18d50621d318d6f4ae479f5275f090d3658d5d419ac4e6c45c9a84b", "fileType": "Fund Statement", "status": "Processed", "fileName": "013.pdf"})
+    except Exception as e:
+        print(f"Warning: Could not update file metadata - {e}")
     for file_path, data_key, data_value in [
-        ("data/frameDemo/ldummy/allFileMeta.json", "013.pdf", {"fileHash": "1a4f7efda18d50621d318d6f4ae479f5275f090d3658d5d419ac4e6c45c9a84b", "fileType": "Fund Statement", "status": "Processed", "fileName": "013.pdf"}),
         ("data/frameDemo/states/l2.json", "processedFiles", "013.pdf")
     ]:
         try:
             with open(file_path, "r") as f:
                 data = json.load(f)
-            if file_path.endswith("allFileMeta.json"):
-                data[data_key] = data_value
-            else:
-                if data_value not in data.get(data_key, []):
-                    data.setdefault(data_key, []).append(data_value)
+            if data_value not in data.get(data_key, []):
+                data.setdefault(data_key, []).append(data_value)
             with open(file_path, "w") as f:
                 json.dump(data, f, indent=2)
         except Exception as e:
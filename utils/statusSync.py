@@ -1,106 +1,105 @@
-import json
+import os
 import time
+import threading
 from pathlib import Path
 
+from utils.localQueue import get_local_queue, add_transition_listener
+from utils.fileMetaStore import get_file_meta_store
+
 # Get absolute path to validusBoxes directory
 VALIDUS_BOXES_DIR = Path(__file__).resolve().parent.parent
 
-# File paths (now using absolute paths)
-QUEUE_FILE = VALIDUS_BOXES_DIR / "queue" / "queue.json"
-ALL_FILE_META_PATH = VALIDUS_BOXES_DIR / "data" / "frameDemo" / "ldummy" / "allFileMeta.json"
+# Statuses follow queue transitions as they happen (see enable_event_sync); the full
+# reconciliation only repairs what events missed, e.g. changes made by another process
+REPAIR_INTERVAL = int(os.getenv("STATUS_REPAIR_INTERVAL", "600"))
+
+_last_repair_time = 0.0
+_repair_lock = threading.Lock()
 
 def map_queue_status_to_display_status(queue_status):
     """Map queue status to user-friendly display status"""
     status_mapping = {
         "pending": "Queued",
-        "processing": "Processing", 
+        "processing": "Processing",
         "completed": "Processed",
         "failed": "Failed"
     }
     return status_mapping.get(queue_status, "Unknown")
 
+def on_queue_transition(filename, queue_status):
+    """Queue listener: update just this file's record (files without a record are left alone)"""
+    get_file_meta_store().update_status(filename, map_queue_status_to_display_status(queue_status))
+
+def enable_event_sync():
+    """Propagate queue transitions made in this process to the file metadata store"""
+    add_transition_listener(on_queue_transition)
+
 def get_latest_file_status():
-    """Get the latest status for each file from queue.json"""
-    if not QUEUE_FILE.exists():
-        print("⚠️  Queue file not found, using default 'Processed' status")
-        return {}
-    
+    """Get the latest status for each file from the queue store"""
     try:
-        with open(QUEUE_FILE, 'r') as f:
-            queue_data = json.load(f)
-        
-        # Get latest status for each file (in case of duplicates, use most recent)
-        file_status_map = {}
-        for entry in queue_data:
-            filename = entry.get("filename")
-            status = entry.get("status")
-            timestamp = entry.get("timestamp", 0)
-            
-            if filename and status:
-                # Keep latest entry for each file
-                if filename not in file_status_map or timestamp > file_status_map[filename]["timestamp"]:
-                    file_status_map[filename] = {
-                        "status": map_queue_status_to_display_status(status),
-                        "timestamp": timestamp
-                    }
-        
-        # Extract just the status for each file
-        return {filename: data["status"] for filename, data in file_status_map.items()}
-        
+        # Latest entry per file (one indexed query instead of scanning the whole history)
+        latest_entries = get_local_queue().latest_entries()
+        return {filename: map_queue_status_to_display_status(entry["status"])
+                for filename, entry in latest_entries.items() if entry.get("status")}
+
     except Exception as e:
-        print(f"  Error reading queue file: {e}")
+        print(f"  Error reading queue: {e}")
         return {}
 
 def sync_file_statuses(verbose=True):
-    """Sync file statuses from queue to allFileMeta.json"""
-    
+    """Repair pass: set the status of every queued file whose record disagrees with the queue"""
+    global _last_repair_time
+
     # Get real-time statuses from queue
     queue_statuses = get_latest_file_status()
-    
-    # Read current allFileMeta.json
-    if not ALL_FILE_META_PATH.exists():
-        if verbose:
-            print("⚠️  allFileMeta.json not found")
-        return False
-    
+
     try:
-        with open(ALL_FILE_META_PATH, 'r') as f:
-            all_file_meta = json.load(f)
-        
+        file_meta_store = get_file_meta_store()
+        all_file_meta = file_meta_store.all()
+
         updated_count = 0
-        
-        # Update status for each file
-        for filename, file_data in all_file_meta.items():
-            current_status = file_data.get("status", "Processed")
-            
-            # Get real status from queue
-            real_status = queue_statuses.get(filename, "Processed")  # Default to "Processed" if not in queue
-            
-            # Update if status changed
-            # if current_status != real_status:
-            #     file_data["status"] = real_status
-            #     updated_count += 1
-            #     if verbose:
-            #         print(f"📄 Updated {filename}: {current_status} → {real_status}")
-        
-        # Write back updated allFileMeta.json
-        with open(ALL_FILE_META_PATH, 'w') as f:
-            json.dump(all_file_meta, f, indent=2)
-        
-        # if verbose:
-        #     print(f"✅ Status sync completed! Updated {updated_count} files")
-        # return True
-        
+
+        # Only files the queue knows about; others keep the status set by upload/processing
+        for filename, real_status in queue_statuses.items():
+            file_data = all_file_meta.get(filename)
+            if file_data is None:
+                continue
+            current_status = file_data.get("status")
+
+            # Update if status changed (single-row update, no full rewrite)
+            if current_status != real_status:
+                file_meta_store.update_status(filename, real_status)
+                updated_count += 1
+                if verbose:
+                    print(f"📄 Updated {filename}: {current_status} → {real_status}")
+
+        _last_repair_time = time.time()
+        if verbose and updated_count:
+            print(f"✅ Status repair completed! Updated {updated_count} files")
+        return True
+
     except Exception as e:
         if verbose:
-            print(f"❌ Error updating allFileMeta.json: {e}")
+            print(f"❌ Error syncing file metadata: {e}")
         return False
 
-def watch_and_sync(interval=10):
-    """Continuously watch and sync statuses at specified interval (seconds)"""
-    print(f"🔄 Starting real-time status sync (every {interval}s)")
+def repair_file_statuses_if_due(interval=REPAIR_INTERVAL):
+    """Run the repair pass if it hasn't run in this process for `interval` seconds"""
+    if time.time() - _last_repair_time < interval:
+        return False
+    if not _repair_lock.acquire(blocking=False):
+        return False  # another request is already repairing
+    try:
+        return sync_file_statuses(verbose=False)
+    finally:
+        _repair_lock.release()
+
+def watch_and_sync(interval=REPAIR_INTERVAL):
+    """Run the repair pass every `interval` seconds (statuses themselves are event driven)"""
+    enable_event_sync()
+    print(f"🔄 Starting status repair (every {interval}s)")
     print("Press Ctrl+C to stop")
-    
+
     try:
         while True:
             sync_file_statuses()
@@ -110,10 +109,10 @@ def watch_and_sync(interval=10):
 
 if __name__ == "__main__":
     import sys
-    
+
     if len(sys.argv) > 1 and sys.argv[1] == "watch":
         # Run in watch mode
         watch_and_sync()
     else:
         # Run once
-        sync_file_statuses() 
\ No newline at end of file
+        sync_file_statuses()
@@ -0,0 +1,149 @@
+"""
+Process-wide read-through cache for STORAGE reads
+
+Entries are validated against a signature of the backing file(s) (mtime_ns and
+size) on every lookup, so a change made by another process is picked up on the
+next read. Writes going through STORAGE.doDataOperations also drop the affected
+entries straight away. Memory is bounded by an LRU over estimated entry sizes.
+DataFrames are copied on the way out, so callers can mutate what they get;
+immutable values (bytes, str) are handed out as they are. Parsed JSON is not
+cached as objects: deep-copying it costs more than parsing it again, so JSON
+readers cache the raw document bytes and parse per read.
+"""
+
+import os
+import sys
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+
+TABLE_CACHE_MAX_BYTES = int(os.getenv("TABLE_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of a file, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def estimate_size(value: Any) -> int:
+    if isinstance(value, (bytes, str)):
+        return sys.getsizeof(value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return sys.getsizeof(value)
+
+
+class TableCache:
+    """Byte-bounded LRU of (key -> value) entries guarded by a file signature"""
+
+    def __init__(self, max_bytes: int = TABLE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (path, signature, value, size)
+        self._entries: "OrderedDict[Hashable, Tuple[str, Any, Any, int]]" = OrderedDict()
+        self._keys_by_path: Dict[str, set] = {}
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "invalidations": 0, "uncacheable": 0}
+
+    @staticmethod
+    def _copy(value: Any) -> Any:
+        if isinstance(value, (bytes, str)):
+            return value
+        if isinstance(value, pd.DataFrame):
+            return value.copy(deep=True)
+        return copy.deepcopy(value)
+
+    def get(self, key: Hashable, signature: Any) -> Optional[Any]:
+        """Cached value for key if it was stored under the same signature, else None"""
+        if signature is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry[1] != signature:
+                self.stats["stale"] += 1
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            value = entry[2]
+        return self._copy(value)
+
+    def put(self, key: Hashable, path: str, signature: Any, value: Any, size: Optional[int] = None):
+        """Store a private copy of value; values larger than a quarter of the budget are not cached"""
+        if signature is None:
+            return
+        size = estimate_size(value) if size is None else size
+        if size > self.max_bytes // 4:
+            with self._lock:
+                self.stats["uncacheable"] += 1
+            return
+        value = self._copy(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (path, signature, value, size)
+            self._keys_by_path.setdefault(path, set()).add(key)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, path: str):
+        """Drop every entry read from path"""
+        with self._lock:
+            keys = self._keys_by_path.pop(path, set())
+            for key in keys:
+                self._remove(key)
+            self.stats["invalidations"] += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_path.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable):
+        path, _, _, size = self._entries.pop(key)
+        self._bytes -= size
+        keys = self._keys_by_path.get(path)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_path[path]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["stale"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Global instance
+_global_table_cache = None
+_global_table_cache_lock = threading.Lock()
+
+
+def get_table_cache() -> TableCache:
+    """Get global table cache instance"""
+    global _global_table_cache
+    if _global_table_cache is None:
+        with _global_table_cache_lock:
+            if _global_table_cache is None:
+                _global_table_cache = TableCache()
+    return _global_table_cache
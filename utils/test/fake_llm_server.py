@@ -0,0 +1,173 @@
+"""
+Fake OpenAI-compatible LLM server for tests and offline runs
+
+Answers POST /v1/chat/completions and /v1/embeddings with canned content and a
+`usage` block, and can be told to answer the next requests with 429 and a
+retry-after header, so rate-limit handling can be exercised without calling the
+provider. The OpenAI clients honour OPENAI_BASE_URL:
+
+    python utils/test/fake_llm_server.py --port 8089
+    export OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=test
+
+In tests, run it in-process:
+
+    with FakeLLMServer() as server:
+        client = OpenAI(base_url=server.base_url, api_key="test", max_retries=0)
+        server.rate_limit_next(1, retry_after=2)
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+CHARS_PER_TOKEN = 4
+
+
+def _count_tokens(value: Any) -> int:
+    """Rough prompt size of a request field (4 characters per token, at least 1)"""
+    if isinstance(value, str):
+        return max(len(value) // CHARS_PER_TOKEN, 1)
+    if isinstance(value, list):
+        return sum(_count_tokens(item) for item in value)
+    if isinstance(value, dict):
+        return _count_tokens(value.get("content", "") or value.get("text", ""))
+    return 0
+
+
+class FakeLLMServer:
+    """In-process server; `requests` records every request body received"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, reply: str = "{}", completion_tokens: int = 10,
+                 embedding_dimensions: int = 8):
+        self.reply = reply
+        self.completion_tokens = completion_tokens
+        self.embedding_dimensions = embedding_dimensions
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._rate_limited = 0
+        self._retry_after: Optional[float] = None
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def rate_limit_next(self, count: int = 1, retry_after: Optional[float] = 1.0):
+        """Answer the next `count` requests with 429 (and a retry-after header unless None)"""
+        with self._lock:
+            self._rate_limited = count
+            self._retry_after = retry_after
+
+    def _take_rate_limit(self) -> Optional[Dict[str, str]]:
+        with self._lock:
+            if self._rate_limited <= 0:
+                return None
+            self._rate_limited -= 1
+            return {} if self._retry_after is None else {"retry-after": f"{self._retry_after:g}"}
+
+    def _respond(self, path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        model = body.get("model", "fake-model")
+        if path.endswith("/embeddings"):
+            inputs = body.get("input", [])
+            inputs = inputs if isinstance(inputs, list) else [inputs]
+            prompt_tokens = _count_tokens(inputs)
+            return {
+                "object": "list",
+                "model": model,
+                "data": [{"object": "embedding", "index": i, "embedding": [0.1] * self.embedding_dimensions}
+                         for i in range(len(inputs))],
+                "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+            }
+        prompt_tokens = _count_tokens(body.get("messages", []))
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": self.reply}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": self.completion_tokens,
+                      "total_tokens": prompt_tokens + self.completion_tokens},
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return self._send(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+                with server._lock:
+                    server.requests.append(body)
+                if not self.path.endswith(("/chat/completions", "/embeddings")):
+                    return self._send(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+                headers = server._take_rate_limit()
+                if headers is not None:
+                    return self._send(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error",
+                                                      "code": "rate_limit_exceeded"}}, headers)
+                self._send(200, server._respond(self.path, body))
+
+        return Handler
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True, name="FakeLLMServer")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--reply", default="{}", help="Content of every chat completion")
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.host, args.port, reply=args.reply).start()
+    print("Fake LLM server running, use it with:")
+    print(f"  export OPENAI_BASE_URL={server.base_url}")
+    print("  export OPENAI_API_KEY=test")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+LLM governor tests: priority lanes, reservation refunds and 429 handling
+
+The 429 and usage tests call the fake OpenAI-compatible server in
+fake_llm_server.py through the real OpenAI client.
+
+Usage:
+    python -m pytest utils/test/test_llm_governor.py
+"""
+
+import threading
+import time
+
+import pytest
+from openai import OpenAI, RateLimitError
+
+from fake_llm_server import FakeLLMServer
+from utils.llm_governor import BATCH, INTERACTIVE, LLMGovernor
+
+MODEL = "gpt-test"
+
+
+def _governor(rpm=1000, tpm=6000):
+    # headroom 1.0 so the bucket sizes are exactly the limits
+    return LLMGovernor(limits={MODEL: (rpm, tpm)}, headroom=1.0)
+
+
+def _tokens_available(governor):
+    return governor.get_stats()[MODEL]["tokens_available"]
+
+
+@pytest.fixture
+def server():
+    with FakeLLMServer(reply='{"ok": true}', completion_tokens=7) as server:
+        yield server
+
+
+@pytest.fixture
+def client(server):
+    return OpenAI(base_url=server.base_url, api_key="test", max_retries=0)
+
+
+def _wait_for_waiters(governor, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while governor.get_stats()[MODEL]["waiting"] < count:
+        assert time.monotonic() < deadline, "waiter never queued"
+        time.sleep(0.01)
+
+
+def test_interactive_lane_overtakes_waiting_batch():
+    governor = _governor(tpm=6000)  # refills 100 tokens/s
+    governor.acquire(MODEL, 6000)  # drain the bucket
+    admitted = []
+
+    def request(name, priority):
+        governor.acquire(MODEL, 50, priority=priority, timeout=10)
+        admitted.append(name)
+
+    batch = threading.Thread(target=request, args=("batch", BATCH))
+    batch.start()
+    _wait_for_waiters(governor, 1)
+    interactive = threading.Thread(target=request, args=("interactive", INTERACTIVE))
+    interactive.start()
+    _wait_for_waiters(governor, 2)
+
+    batch.join(10)
+    interactive.join(10)
+    # The batch caller arrived first but the interactive one was admitted ahead of it
+    assert admitted == ["interactive", "batch"]
+
+
+def test_unlisted_models_are_not_throttled():
+    governor = LLMGovernor(limits={}, headroom=1.0)
+    start = time.monotonic()
+    for _ in range(100):
+        governor.acquire("unlisted-model", 100_000, timeout=1).release()
+    assert time.monotonic() - start < 1.0
+    assert governor.get_stats()["unlisted-model"]["tokens_available"] is None
+
+
+def test_reconcile_refunds_unused_estimate():
+    governor = _governor(tpm=6000)
+    reservation = governor.acquire(MODEL, 1000)
+    assert _tokens_available(governor) == pytest.approx(5000, abs=5)
+
+    reservation.reconcile(200)
+
+    assert _tokens_available(governor) == pytest.approx(5800, abs=5)
+    assert governor.get_stats()[MODEL]["used_tokens"] == 200
+    # Settled once: a second reconcile or a release changes nothing
+    reservation.reconcile(50)
+    reservation.release()
+    assert _tokens_available(governor) == pytest.approx(5800, abs=5)
+
+
+def test_reconcile_charges_usage_above_the_estimate():
+    governor = _governor(tpm=6000)
+    governor.acquire(MODEL, 1000).reconcile(1500)
+
+    assert _tokens_available(governor) == pytest.approx(4500, abs=5)
+
+
+def test_failed_request_releases_its_reservation():
+    governor = _governor(tpm=6000)
+
+    with pytest.raises(RuntimeError):
+        with governor.reserve(MODEL, 1000):
+            raise RuntimeError("connection reset")
+
+    assert _tokens_available(governor) == pytest.approx(6000, abs=5)
+    assert governor.get_stats()[MODEL]["used_tokens"] == 0
+
+
+def test_reconcile_with_usage_reported_by_the_server(server, client):
+    governor = _governor(tpm=6000)
+    messages = [{"role": "user", "content": "x" * 400}]
+
+    start = time.monotonic()
+    with governor.reserve(MODEL, 1000) as reservation:
+        response = client.chat.completions.create(model=MODEL, messages=messages, max_tokens=500)
+        reservation.reconcile(response.usage.total_tokens)
+    refilled = (time.monotonic() - start) * 6000 / 60
+
+    assert response.usage.total_tokens == 100 + 7
+    assert governor.get_stats()[MODEL]["used_tokens"] == 107
+    # Only the reported usage stays charged (plus whatever refilled during the call)
+    assert 6000 - 107 - 5 <= _tokens_available(governor) <= 6000 - 107 + refilled + 5
+
+
+def test_rate_limit_response_pauses_the_model_for_its_retry_after(server, client):
+    governor = _governor(tpm=6000)
+    server.rate_limit_next(1, retry_after=2)
+
+    with pytest.raises(RateLimitError):
+        with governor.reserve(MODEL, 1000):
+            client.chat.completions.create(model=MODEL, messages=[{"role": "user", "content": "hi"}])
+
+    stats = governor.get_stats()[MODEL]
+    assert stats["rate_limited"] == 1
+    # The 429 consumed no tokens
+    assert stats["tokens_available"] == pytest.approx(6000, abs=5)
+    # Admissions are paused for the retry-after, even though the buckets are full
+    with pytest.raises(TimeoutError):
+        governor.acquire(MODEL, 10, timeout=0.5)
+    assert governor._budgets[MODEL].paused_until - time.monotonic() == pytest.approx(1.5, abs=0.5)
+
+
+def test_penalize_without_retry_after_pauses_one_second():
+    governor = _governor()
+    governor.penalize(MODEL)
+
+    start = time.monotonic()
+    governor.acquire(MODEL, 10, timeout=5)
+
+    assert time.monotonic() - start == pytest.approx(1.0, abs=0.3)
+    assert governor.get_stats()[MODEL]["rate_limited"] == 1
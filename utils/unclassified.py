@@ -7,6 +7,10 @@ from datetime import datetime, timedelta, timezone
 def getStructToFilterLambda(aStruct: dict):
     return {k: lambda x,v=v: x == v for k,v in aStruct.items()}
 
+def getStructToFilter(aStruct: dict):
+    # equality filter spec, evaluated vectorized (and pushed down) by STORAGE.getFilteredTableAsDF
+    return {k: {'eq': v} for k,v in aStruct.items()}
+
 def getArrayOfStructFromDF(aDF:pd.DataFrame):
     dataAsStruct=json.loads(aDF.to_json(orient='records')) # this convers np.nan to None
     return dataAsStruct
@@ -0,0 +1,103 @@
+"""
+Upload directory watcher
+
+Uses Linux inotify (via ctypes, no extra dependency) to report files as soon as
+they are fully written to or moved into the upload directory. On platforms
+without inotify, `available` is False and `wait` simply sleeps, so callers fall
+back to periodic directory scans.
+"""
+
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# inotify event masks (see <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+
+class UploadWatcher:
+    """Blocks until new files land in a directory instead of re-scanning it"""
+
+    def __init__(self, directory: Path, suffixes: Tuple[str, ...] = (".pdf",)):
+        self.directory = Path(directory)
+        self.suffixes = suffixes
+        self.available = False
+        self.overflowed = False
+        self._fd: Optional[int] = None
+        self._start()
+
+    def _start(self):
+        if not sys.platform.startswith("linux"):
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            # IN_NONBLOCK / IN_CLOEXEC share their values with O_NONBLOCK / O_CLOEXEC
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            wd = libc.inotify_add_watch(fd, os.fsencode(str(self.directory)), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(errno, f"inotify_add_watch failed for {self.directory}")
+            self._fd = fd
+            self.available = True
+        except (OSError, AttributeError) as e:
+            print(f"⚠️  inotify unavailable ({e}) - falling back to directory polling")
+
+    def wait(self, timeout: float) -> List[Path]:
+        """
+        Block until files arrive or the timeout elapses
+
+        Returns:
+            Paths of completed files matching `suffixes` (empty on timeout).
+            If the kernel queue overflowed, `overflowed` is set and the caller
+            should rescan the directory.
+        """
+        if not self.available:
+            time.sleep(max(0.0, timeout))
+            return []
+        readable, _, _ = select.select([self._fd], [], [], max(0.0, timeout))
+        if not readable:
+            return []
+        return self._read_events()
+
+    def _read_events(self) -> List[Path]:
+        try:
+            data = os.read(self._fd, _READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        paths = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", errors="replace")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+            elif name.endswith(self.suffixes):
+                path = self.directory / name
+                if path not in paths:
+                    paths.append(path)
+        return paths
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self.available = False
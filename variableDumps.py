@@ -0,0 +1,94 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+import utils.logger as _logger
+from tabularFormats import getTempPath
+logger=_logger.getLogger('dev')
+
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE=True
+except ImportError:
+    ARROW_AVAILABLE=False
+
+# Typed on-disk formats for variableDump, in lookup order
+ARROW_SUFFIX='.arrow' # DataFrames: uncompressed Arrow IPC file (Feather v2), memory-mapped on read
+NUMPY_SUFFIX='.npy'   # numpy arrays: .npy, memory-mapped on read
+PICKLE_SUFFIX='.pkl'  # anything else
+VARIABLE_DUMP_SUFFIXES=(ARROW_SUFFIX,NUMPY_SUFFIX,PICKLE_SUFFIX)
+
+def _getSuffixFor(aData):
+    if isinstance(aData,pd.DataFrame) and ARROW_AVAILABLE:
+        return ARROW_SUFFIX
+    if isinstance(aData,np.ndarray) and aData.dtype!=object:
+        return NUMPY_SUFFIX
+    return PICKLE_SUFFIX
+
+def _writeArrow(aFilePath: str,aDF: pd.DataFrame):
+    myTable=pa.Table.from_pandas(aDF)
+    with pa.OSFile(aFilePath,'wb') as mySink:
+        with pa.ipc.new_file(mySink,myTable.schema) as myWriter:
+            myWriter.write_table(myTable)
+
+def _writeNumpy(aFilePath: str,aArray: np.ndarray):
+    with open(aFilePath,'wb') as f:
+        np.save(f,aArray,allow_pickle=False)
+
+def _writePickle(aFilePath: str,aData):
+    with open(aFilePath,'wb') as f:
+        pickle.dump(aData,f)
+
+def writeVariableDump(aBasePath: str,aData):
+    """Write aData next to aBasePath in the best format for its type; returns the file written"""
+    mySuffix=_getSuffixFor(aData)
+    myFilePath=aBasePath+mySuffix
+    myTmpPath=getTempPath(myFilePath)
+    try:
+        if mySuffix==ARROW_SUFFIX:
+            try:
+                _writeArrow(myTmpPath,aData)
+            except (pa.ArrowInvalid,pa.ArrowTypeError,pa.ArrowNotImplementedError) as e:
+                # object columns holding mixed python values: arrow can't type them
+                logger.info('%s is not arrow-compatible (%s), pickling it'%(os.path.basename(aBasePath),str(e)))
+                mySuffix=PICKLE_SUFFIX
+                myFilePath=aBasePath+mySuffix
+                _writePickle(myTmpPath,aData)
+        elif mySuffix==NUMPY_SUFFIX:
+            _writeNumpy(myTmpPath,aData)
+        else:
+            _writePickle(myTmpPath,aData)
+        os.replace(myTmpPath,myFilePath)
+    finally:
+        if os.path.exists(myTmpPath):
+            os.remove(myTmpPath)
+
+    # a key that changed type must not be shadowed by its previous dump
+    for myOtherSuffix in VARIABLE_DUMP_SUFFIXES:
+        if myOtherSuffix!=mySuffix and os.path.exists(aBasePath+myOtherSuffix):
+            os.remove(aBasePath+myOtherSuffix)
+    return myFilePath
+
+def readVariableDump(aBasePath: str,asArrow: bool=False):
+    """
+    Read a variableDump written by writeVariableDump
+
+    Arrow and numpy dumps are memory-mapped, so only the pages actually touched
+    are read and they are shared between processes through the OS page cache.
+    asArrow=True returns the pyarrow Table itself (zero-copy) instead of converting
+    it to pandas. numpy arrays come back read-only.
+    """
+    if os.path.exists(aBasePath+ARROW_SUFFIX):
+        if not ARROW_AVAILABLE:
+            raise ImportError(f"{aBasePath+ARROW_SUFFIX} is an Arrow dump and pyarrow is not installed; install pyarrow to read it")
+        myTable=pa.ipc.open_file(pa.memory_map(aBasePath+ARROW_SUFFIX,'r')).read_all()
+        if asArrow:
+            return myTable
+        # split_blocks avoids consolidating columns, so numeric columns can stay zero-copy views
+        return myTable.to_pandas(split_blocks=True)
+    if os.path.exists(aBasePath+NUMPY_SUFFIX):
+        return np.load(aBasePath+NUMPY_SUFFIX,mmap_mode='r',allow_pickle=False)
+    if os.path.exists(aBasePath+PICKLE_SUFFIX):
+        with open(aBasePath+PICKLE_SUFFIX,'rb') as f:
+            return pickle.load(f)
+    raise FileNotFoundError(aBasePath+PICKLE_SUFFIX)